@@ -1,12 +1,16 @@
 # app/auth.py
 import streamlit as st
 import hashlib
-from common import run_query
+from startup import lazy_import
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 def check_credentials(usuario: str, password: str):
+    # common trae pandas y el backend: se carga al enviar el formulario,
+    # no para pintar el login
+    with lazy_import('common'):
+        from common import run_query
     sql = """
     SELECT u.user_id,
            u.rol_id,
@@ -17,7 +21,7 @@ def check_credentials(usuario: str, password: str):
         ON u.rol_id = r.rol_id
      WHERE u.usuario = %s
     """
-    df = run_query(sql, (usuario,))
+    df = run_query(sql, (usuario,), cache=False)
     if df.empty:
         return None
     row = df.iloc[0]
@@ -30,7 +34,9 @@ def check_credentials(usuario: str, password: str):
         "rol_nombre": rol_nombre
     }
 
-def login_page():
+def login_page(on_render=None):
+    # on_render: se llama con el formulario ya pintado (p.ej. para
+    # calentar conexiones mientras el usuario escribe)
     # Si ya estamos autenticados no mostramos nada
     if st.session_state.get("authenticated"):
         return
@@ -41,6 +47,8 @@ def login_page():
         usuario  = st.text_input("Usuario", key="login_user")
         password = st.text_input("Contraseña", type="password", key="login_pass")
         send     = st.form_submit_button("Ingresar")
+    if on_render:
+        on_render()
 
     # Sólo procesamos cuando se envía el form
     if send:
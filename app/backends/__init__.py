@@ -0,0 +1,25 @@
+# app/backends/__init__.py
+"""
+Backends de base de datos intercambiables.
+
+    snowflake  producción (snowflake-connector-python)
+    sqlite     motor embebido local para desarrollo, CI y benchmarks
+
+El backend se elige con la clave `backend` de la sección [database] de los
+secrets o con la variable de entorno VETDB_BACKEND.
+"""
+from backends.base import Backend, ProgrammingError
+
+BACKENDS = ('snowflake', 'sqlite')
+
+
+def load_backend(name: str, cfg: dict = None) -> Backend:
+    """Instancia el backend `name` con su configuración."""
+    name = (name or 'snowflake').lower()
+    if name == 'snowflake':
+        from backends.snowflake_backend import SnowflakeBackend
+        return SnowflakeBackend(cfg)
+    if name == 'sqlite':
+        from backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(cfg)
+    raise ValueError(f"Backend desconocido: {name!r}; opciones: {', '.join(BACKENDS)}")
@@ -0,0 +1,118 @@
+# app/backends/base.py
+"""
+Interfaz común de los backends de base de datos.
+
+Un backend sabe abrir conexiones DB-API con paramstyle `%s`, traducir el
+SQL (dialecto Snowflake) si hace falta y convertir sus errores nativos en
+ProgrammingError, de modo que los CRUD no dependan del conector concreto.
+"""
+from typing import Iterator
+
+import pandas as pd
+
+
+class ProgrammingError(Exception):
+    """Error de base de datos (sintaxis, constraint, objeto inexistente, ...)."""
+
+
+class Backend:
+    """
+    Clase base. Las subclases implementan _connect() y, si lo necesitan,
+    translate() / fetch_dataframe() / fetch_batches().
+    """
+
+    name = 'base'
+    # Excepciones nativas que se convierten en ProgrammingError
+    error_types: tuple = ()
+
+    def __init__(self, cfg: dict = None):
+        self.cfg = dict(cfg or {})
+
+    def connect(self):
+        """Abre una conexión nueva envuelta en BackendConnection."""
+        return BackendConnection(self._connect(), self)
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def translate(self, sql: str, params):
+        """Adapta una sentencia al dialecto del backend. Por defecto no cambia nada."""
+        return sql, params
+
+    def execute(self, cursor, sql: str, params):
+        """Ejecuta una sentencia en un cursor nativo, ya traducida."""
+        sql, params = self.translate(sql, params)
+        if params is None:
+            return cursor.execute(sql)
+        return cursor.execute(sql, params)
+
+    def error_message(self, error: Exception) -> str:
+        return str(error)
+
+    def column_name(self, name: str) -> str:
+        """Nombre de columna tal como lo ve el resto de la app."""
+        return name
+
+    def fetch_dataframe(self, cur) -> pd.DataFrame:
+        """Lee el resultado completo de un cursor ya ejecutado."""
+        cols = [c[0] for c in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=cols)
+
+    def fetch_batches(self, cur, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Lee el resultado por lotes de `batch_size` filas."""
+        cols = [c[0] for c in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=cols)
+
+
+class BackendConnection:
+    """Conexión cuyos cursores traducen SQL y errores según el backend."""
+
+    def __init__(self, conn, backend: Backend):
+        self._conn = conn
+        self.backend = backend
+
+    def cursor(self, *args, **kwargs):
+        return BackendCursor(self._conn.cursor(*args, **kwargs), self.backend)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class BackendCursor:
+    """Cursor que traduce cada sentencia y convierte los errores nativos."""
+
+    def __init__(self, cursor, backend: Backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    def execute(self, sql, params=None):
+        try:
+            result = self._backend.execute(self._cursor, sql, params)
+        except self._backend.error_types as e:
+            raise ProgrammingError(self._backend.error_message(e)) from e
+        return self if result is self._cursor else result
+
+    def executemany(self, sql, seq_of_params):
+        sql, _ = self._backend.translate(sql, None)
+        try:
+            result = self._cursor.executemany(sql, seq_of_params)
+        except self._backend.error_types as e:
+            raise ProgrammingError(self._backend.error_message(e)) from e
+        return self if result is self._cursor else result
+
+    @property
+    def description(self):
+        desc = self._cursor.description
+        if desc is None:
+            return None
+        return [(self._backend.column_name(d[0]),) + tuple(d[1:]) for d in desc]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
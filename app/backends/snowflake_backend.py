@@ -0,0 +1,82 @@
+# app/backends/snowflake_backend.py
+"""
+Backend Snowflake: conexión por key-pair o password y lectura vía Arrow.
+El conector y cryptography se importan al conectar, no al cargar el módulo.
+"""
+from typing import Iterator
+
+import pandas as pd
+
+from backends.base import Backend
+
+
+class SnowflakeBackend(Backend):
+    """
+    Configuración (sección [snowflake] de los secrets): user, account,
+    warehouse, database, schema, role y private_key_path o password.
+    """
+
+    name = 'snowflake'
+
+    def __init__(self, cfg: dict = None):
+        super().__init__(cfg)
+        from snowflake.connector.errors import NotSupportedError, ProgrammingError
+        self.error_types = (ProgrammingError,)
+        self._not_supported = (NotSupportedError, AttributeError)
+
+    def _connect(self):
+        from snowflake.connector import connect
+        cfg = self.cfg
+        conn_kwargs = {
+            'user':    cfg['user'],
+            'account': cfg['account'],
+            'warehouse': cfg['warehouse'],
+            'database':  cfg['database'],
+            'schema':    cfg['schema'],
+            'role':      cfg.get('role'),
+            # Transacciones explícitas: commit()/rollback() sólo afectan a la
+            # sesión que tiene la conexión.
+            'autocommit': False,
+        }
+        # Key-pair
+        pk_path = cfg.get('private_key_path')
+        if pk_path:
+            from cryptography.hazmat.primitives import serialization
+            with open(pk_path, 'rb') as f:
+                p_key = serialization.load_pem_private_key(f.read(), password=None)
+            der = p_key.private_bytes(
+                encoding=serialization.Encoding.DER,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            )
+            conn_kwargs['private_key'] = der
+        else:
+            pwd = cfg.get('password')
+            if not pwd:
+                raise ValueError("Se requiere password o private_key_path en los secrets.")
+            conn_kwargs['password'] = pwd
+
+        return connect(**conn_kwargs)
+
+    def fetch_dataframe(self, cur) -> pd.DataFrame:
+        """
+        Usa el camino Arrow del conector (fetch_pandas_all), que arma columnas
+        directamente desde los lotes Arrow sin pasar por tuplas de Python.
+        Las sentencias que no devuelven Arrow (CALL, SHOW, resultados JSON)
+        caen a fetchall() + DataFrame.
+        """
+        try:
+            return cur.fetch_pandas_all()
+        except self._not_supported:
+            return super().fetch_dataframe(cur)
+
+    def fetch_batches(self, cur, batch_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Con Arrow cada lote es un chunk del resultado tal como lo entrega
+        Snowflake; sin Arrow se leen `batch_size` filas por vez con fetchmany().
+        """
+        try:
+            batches = cur.fetch_pandas_batches()
+        except self._not_supported:
+            batches = super().fetch_batches(cur, batch_size)
+        yield from batches
@@ -0,0 +1,184 @@
+# app/backends/sqlite_backend.py
+"""
+Backend local embebido (SQLite) para desarrollo, CI y benchmarks sin
+cuenta de Snowflake.
+
+Crea el esquema de sqlite_schema.sql la primera vez y traduce lo que la
+app usa del dialecto Snowflake:
+  - parámetros %s -> ?
+  - CURRENT_DATE() / CURRENT_TIMESTAMP()
+  - DATEADD(day, n, x), DATE_TRUNC('hour', x), YEAR(x), MONTH(x), TO_DATE(x),
+    LOWER(x) con Unicode, TRANSLATE(x, de, a)
+  - CALL sp_soft_delete('tabla', 'columna_id', id)
+Los nombres de columna se devuelven en mayúsculas, como en Snowflake.
+"""
+import calendar
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from backends.base import Backend
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+# Constraints UNIQUE: SQLite informa "tabla.columna", Snowflake el nombre.
+_UNIQUE_CONSTRAINTS = {
+    'vet_dueno.documento_id': 'uq_dueno_doc',
+    'vet_mascota.microchip':  'uq_microchip',
+}
+# Tablas con borrado lógico (columna is_active)
+_SOFT_DELETE_TABLES = {'vet_dueno', 'vet_mascota', 'vet_veterinario', 'vet_usuario_sistema'}
+
+_CALL_SOFT_DELETE_RE = re.compile(
+    r"^\s*CALL\s+sp_soft_delete\s*\(\s*'(\w+)'\s*,\s*'(\w+)'\s*,\s*(?:%s|\?)\s*\)\s*;?\s*$",
+    re.IGNORECASE)
+_DIALECT = [
+    (re.compile(r'\bCURRENT_DATE\s*\(\s*\)', re.IGNORECASE), "DATE('now', 'localtime')"),
+    (re.compile(r'\bCURRENT_TIMESTAMP\s*\(\s*\)', re.IGNORECASE), "DATETIME('now', 'localtime')"),
+    (re.compile(r'\bDATEADD\s*\(\s*(\w+)\s*,', re.IGNORECASE), r"DATEADD('\1',"),
+    (re.compile(r'%s'), '?'),
+]
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(sep=' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.float64, float)
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    return str(value)[:10]
+
+
+def _year(value):
+    return int(str(value)[:4]) if value is not None else None
+
+
+def _month(value):
+    return int(str(value)[5:7]) if value is not None else None
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _translate(value, source, target):
+    if not isinstance(value, str):
+        return value
+    return value.translate(str.maketrans(source, target[:len(source)],
+                                         source[len(target):]))
+
+
+def _dateadd(part, n, value):
+    if value is None:
+        return None
+    text = str(value)
+    base = datetime.fromisoformat(text)
+    part = part.lower()
+    if part in ('day', 'days', 'd'):
+        result = base + timedelta(days=n)
+    elif part in ('week', 'weeks', 'w'):
+        result = base + timedelta(weeks=n)
+    elif part in ('hour', 'hours', 'h'):
+        result = base + timedelta(hours=n)
+    elif part in ('month', 'months', 'mm'):
+        month = base.month - 1 + int(n)
+        year, month = base.year + month // 12, month % 12 + 1
+        day = min(base.day, calendar.monthrange(year, month)[1])
+        result = base.replace(year=year, month=month, day=day)
+    else:
+        raise ValueError(f"DATEADD: unidad no soportada: {part}")
+    return result.date().isoformat() if len(text) <= 10 else result.isoformat(sep=' ')
+
+
+def _date_trunc(part, value):
+    if value is None:
+        return None
+    text = str(value)
+    part = part.lower()
+    if part in ('hour', 'hours', 'h'):
+        return text[:13] + ':00:00'
+    if part in ('day', 'days', 'd'):
+        return text[:10] + ' 00:00:00'
+    if part in ('month', 'months', 'mm'):
+        return text[:7] + '-01 00:00:00'
+    raise ValueError(f"DATE_TRUNC: unidad no soportada: {part}")
+
+
+class SQLiteBackend(Backend):
+    """
+    Configuración (sección [sqlite] de los secrets o VETDB_SQLITE_PATH):
+      path: archivo de la base (por defecto vetdb.sqlite en el directorio actual)
+    """
+
+    name = 'sqlite'
+    error_types = (sqlite3.DatabaseError,)
+
+    def __init__(self, cfg: dict = None):
+        super().__init__(cfg)
+        self.path = self.cfg.get('path') or 'vetdb.sqlite'
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        for name, n_args, fn in (('TO_DATE', 1, _to_date), ('YEAR', 1, _year),
+                                 ('MONTH', 1, _month), ('LOWER', 1, _lower),
+                                 ('TRANSLATE', 3, _translate),
+                                 ('DATEADD', 3, _dateadd), ('DATE_TRUNC', 2, _date_trunc)):
+            conn.create_function(name, n_args, fn, deterministic=True)
+        self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with open(SCHEMA_PATH, encoding='utf-8') as f:
+                conn.executescript(f.read())
+            conn.commit()
+            self._schema_ready = True
+
+    def translate(self, sql: str, params):
+        for pattern, repl in _DIALECT:
+            sql = pattern.sub(repl, sql)
+        return sql, params
+
+    def execute(self, cursor, sql: str, params):
+        call = _CALL_SOFT_DELETE_RE.match(sql)
+        if call:
+            return self._soft_delete(cursor, call.group(1), call.group(2), params[0])
+        return super().execute(cursor, sql, params)
+
+    def _soft_delete(self, cursor, table: str, column: str, key):
+        """Equivalente de sp_soft_delete: marca is_active = FALSE y devuelve un mensaje."""
+        table, column = table.lower(), column.lower()
+        if table not in _SOFT_DELETE_TABLES:
+            raise sqlite3.OperationalError(f"sp_soft_delete: tabla no permitida: {table}")
+        cols = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if column not in cols:
+            raise sqlite3.OperationalError(f"sp_soft_delete: columna inexistente: {column}")
+        cursor.execute(f"UPDATE {table} SET is_active = FALSE WHERE {column} = ?", (key,))
+        affected = cursor.rowcount
+        msg = f"{affected} registro(s) de {table} desactivado(s) ({column}={key})"
+        return cursor.execute("SELECT ? AS sp_soft_delete", (msg,))
+
+    def error_message(self, error: Exception) -> str:
+        msg = str(error)
+        for column, constraint in _UNIQUE_CONSTRAINTS.items():
+            if column in msg:
+                return f"{msg} ({constraint})"
+        return msg
+
+    def column_name(self, name: str) -> str:
+        return name.upper()
@@ -0,0 +1,114 @@
+-- app/backends/sqlite_schema.sql
+-- Esquema VetDB para el backend local (SQLite). Replica las tablas vet_*,
+-- las vistas vw_*_activo y los constraints que usa la app; el procedimiento
+-- sp_soft_delete lo emula backends/sqlite_backend.py.
+
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS vet_rol (
+    rol_id      INTEGER PRIMARY KEY,
+    rol_nombre  TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS vet_usuario_sistema (
+    user_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario     TEXT NOT NULL UNIQUE,
+    pass_hash   TEXT NOT NULL,
+    rol_id      INTEGER REFERENCES vet_rol(rol_id),
+    is_active   BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS vet_dueno (
+    dueno_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre       TEXT NOT NULL,
+    telefono     TEXT NOT NULL,
+    correo       TEXT,
+    direccion    TEXT NOT NULL,
+    documento_id TEXT NOT NULL,
+    is_active    BOOLEAN NOT NULL DEFAULT TRUE,
+    CONSTRAINT uq_dueno_doc UNIQUE (documento_id)
+);
+
+CREATE TABLE IF NOT EXISTS vet_sexo (
+    sexo_id      INTEGER PRIMARY KEY,
+    codigo       TEXT NOT NULL UNIQUE,
+    descripcion  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS vet_mascota (
+    mascota_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    dueno_id    INTEGER NOT NULL REFERENCES vet_dueno(dueno_id),
+    nombre      TEXT NOT NULL,
+    especie     TEXT NOT NULL,
+    raza        TEXT,
+    sexo_id     INTEGER REFERENCES vet_sexo(sexo_id),
+    fecha_nac   DATE,
+    peso_kg     REAL,
+    color       TEXT,
+    microchip   TEXT,
+    is_active   BOOLEAN NOT NULL DEFAULT TRUE,
+    CONSTRAINT uq_microchip UNIQUE (microchip)
+);
+CREATE INDEX IF NOT EXISTS ix_mascota_dueno ON vet_mascota (dueno_id);
+
+CREATE TABLE IF NOT EXISTS vet_veterinario (
+    vet_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre        TEXT NOT NULL,
+    especialidad  TEXT,
+    is_active     BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS vet_cita (
+    cita_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    mascota_id  INTEGER NOT NULL REFERENCES vet_mascota(mascota_id),
+    vet_id      INTEGER NOT NULL REFERENCES vet_veterinario(vet_id),
+    fecha_hora  TIMESTAMP NOT NULL,
+    servicio    TEXT NOT NULL,
+    motivo      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_cita_fecha   ON vet_cita (fecha_hora);
+CREATE INDEX IF NOT EXISTS ix_cita_mascota ON vet_cita (mascota_id);
+
+CREATE TABLE IF NOT EXISTS vet_factura (
+    factura_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    cita_id      INTEGER NOT NULL REFERENCES vet_cita(cita_id),
+    monto        REAL NOT NULL,
+    metodo_pago  TEXT,
+    fecha_pago   TIMESTAMP NOT NULL DEFAULT (DATETIME('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS ix_factura_fecha ON vet_factura (fecha_pago);
+CREATE INDEX IF NOT EXISTS ix_factura_cita  ON vet_factura (cita_id);
+
+CREATE TABLE IF NOT EXISTS vet_vacuna (
+    vacuna_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre     TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS vet_vacuna_mascota (
+    vacuna_mascota_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    mascota_id         INTEGER NOT NULL REFERENCES vet_mascota(mascota_id),
+    vacuna_id          INTEGER NOT NULL REFERENCES vet_vacuna(vacuna_id),
+    fecha_aplicacion   DATE,
+    prox_vence         DATE
+);
+CREATE INDEX IF NOT EXISTS ix_vacuna_vence ON vet_vacuna_mascota (prox_vence);
+
+CREATE VIEW IF NOT EXISTS vw_dueno_activo AS
+    SELECT * FROM vet_dueno WHERE is_active = TRUE;
+
+CREATE VIEW IF NOT EXISTS vw_mascota_activa AS
+    SELECT * FROM vet_mascota WHERE is_active = TRUE;
+
+CREATE VIEW IF NOT EXISTS vw_veterinario_activo AS
+    SELECT * FROM vet_veterinario WHERE is_active = TRUE;
+
+-- Dominios
+INSERT OR IGNORE INTO vet_rol (rol_id, rol_nombre) VALUES
+    (1, 'admin'), (2, 'recepcion'), (3, 'veterinario');
+
+INSERT OR IGNORE INTO vet_sexo (sexo_id, codigo, descripcion) VALUES
+    (1, 'M', 'Macho'), (2, 'H', 'Hembra'), (3, 'D', 'Desconocido');
+
+INSERT OR IGNORE INTO vet_vacuna (nombre) VALUES
+    ('Rabia'), ('Parvovirus'), ('Moquillo'), ('Leptospirosis'),
+    ('Triple felina'), ('Leucemia felina'), ('Bordetella');
@@ -0,0 +1,198 @@
+# app/bulk.py
+"""
+Piezas comunes de las altas masivas (create_duenos, create_mascotas,
+create_citas):
+
+  - as_frame: normaliza un DataFrame o una lista de dicts a las columnas
+    esperadas
+  - first_error / text / isdigit: base de los validadores por columnas
+    (_validate_*_frame), que también usan las altas de un solo registro
+  - check_exists / check_unique: validan claves foráneas y unicidad contra
+    la base como conjunto (una consulta por bloque de valores, no por fila)
+  - insert_rows: executemany por lotes dentro de una única transacción
+  - report: resultado por fila (insertada o no, y por qué)
+
+Los errores se acumulan en un dict {fila: [mensajes]}; una fila con algún
+error no se inserta.
+"""
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from common import run_query, get_connection, invalidate_tables
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+# Valores por consulta IN (...): por debajo de los límites de SQLite y Snowflake
+IN_CHUNK = 5_000
+# Filas por executemany
+BATCH_SIZE = 10_000
+
+
+def as_frame(records, columns: tuple, texts: tuple = (), ids: tuple = ()) -> pd.DataFrame:
+    """
+    Convierte `records` (DataFrame o lista de dicts) en un DataFrame con
+    exactamente `columns`, en ese orden, y posiciones 0..n-1.
+
+    :param texts: columnas de texto: se convierten a str ('' si faltan)
+    :param ids: columnas de IDs enteros: None si faltan o no son numéricas
+    :return: DataFrame de dtype object (valores Python, None para nulos)
+    """
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    df = df.reindex(columns=list(columns)).reset_index(drop=True)
+    for col in ids:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+    df = df.astype(object).where(df.notna(), None)
+    for col in texts:
+        df[col] = text(df[col]).astype(object)
+    return df
+
+
+def add_error(errors: dict, rows: Iterable[int], message) -> None:
+    """
+    Registra `message` para cada fila de `rows`. `message` puede ser un
+    texto o una función fila -> texto.
+    """
+    for row in rows:
+        msg = message(row) if callable(message) else message
+        errors.setdefault(int(row), []).append(msg)
+
+
+def first_error(index: pd.Index, rules: list) -> tuple[pd.Series, pd.Series]:
+    """
+    Evalúa reglas vectorizadas en orden y se queda con la primera que falla
+    en cada fila, igual que un validador de un registro que lanza al primer
+    error.
+
+    :param rules: [(máscara de filas inválidas, mensaje), ...]
+    :return: (máscara de filas válidas, mensaje de error por fila o None)
+    """
+    # Índice de la primera regla que falla por fila; -1 = válida
+    first = np.full(len(index), -1)
+    for k, (invalid, _) in enumerate(rules):
+        first[invalid.fillna(False).to_numpy(dtype=bool) & (first == -1)] = k
+    messages = np.array([message for _, message in rules] + [None], dtype=object)
+    return pd.Series(first == -1, index=index), pd.Series(messages[first], index=index)
+
+
+def raise_first(errors: pd.Series) -> None:
+    """Para validadores de un registro: lanza ValueError con el error de la fila 0."""
+    if pd.notna(errors.iat[0]):
+        raise ValueError(errors.iat[0])
+
+
+def isdigit(values: pd.Series) -> pd.Series:
+    """
+    str.isdigit() de Python sobre una columna de texto Arrow. Arrow sólo
+    coincide con Python en ASCII (p.ej. no acepta '²'), así que las filas
+    con otros caracteres se evalúan con Python.
+    """
+    result = values.str.isdigit().astype(bool)
+    other = values.str.contains(r'[^\x00-\x7f]', regex=True).astype(bool)
+    if other.any():
+        result[other] = values[other].astype(object).str.isdigit().astype(bool)
+    return result
+
+
+def add_errors(errors: dict, messages: pd.Series) -> None:
+    """Registra los mensajes no nulos de una serie (índice = fila)."""
+    for row, message in messages.dropna().items():
+        add_error(errors, [row], message)
+
+
+def text(values: pd.Series) -> pd.Series:
+    """
+    Columna como texto: nulos -> '' y el resto con str(). Usa cadenas Arrow
+    para que .str.strip/.isdigit/.fullmatch corran en C y no fila a fila.
+    """
+    return values.astype('string[pyarrow]').fillna('')
+
+
+def existing(table: str, column: str, values: Iterable) -> set:
+    """Subconjunto de `values` presente en table.column (consultas por bloques)."""
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), IN_CHUNK):
+        chunk = values[i:i + IN_CHUNK]
+        marks = ', '.join(['%s'] * len(chunk))
+        df = run_query(f"SELECT {column} FROM {table} WHERE {column} IN ({marks})",
+                       tuple(chunk), cache=False)
+        found.update(df.iloc[:, 0].tolist())
+    return found
+
+
+def check_exists(df: pd.DataFrame, errors: dict, column: str, table: str,
+                 key: str, message: str) -> None:
+    """
+    Marca las filas cuyo `column` no existe en table.key.
+
+    :param message: formato con {value}, p.ej. "dueno_id inválido: {value}"
+    """
+    values = df[column]
+    found = existing(table, key, values.dropna().unique())
+    missing = values.map(lambda v: v is None or v not in found)
+    add_error(errors, df.index[missing], lambda row: message.format(value=values[row]))
+
+
+def check_unique(df: pd.DataFrame, errors: dict, column: str, table: str,
+                 message: str, message_batch: str) -> None:
+    """
+    Marca las filas cuyo `column` (no vacío) ya existe en la tabla, o se
+    repite dentro del mismo lote (la primera aparición se acepta).
+    """
+    values = df[column].map(lambda v: v if v not in (None, '') else None)
+    present = values.notna()
+    repeated = present & values.duplicated(keep='first')
+    add_error(errors, df.index[repeated], message_batch)
+    taken = existing(table, column, values[present].unique())
+    add_error(errors, df.index[present & values.isin(taken)], message)
+
+
+def insert_rows(table: str, columns: tuple, rows: list) -> int:
+    """
+    Inserta `rows` con executemany por lotes en una sola transacción: o
+    entran todas o ninguna.
+
+    :return: filas insertadas
+    """
+    if not rows:
+        return 0
+    sql = (f"INSERT INTO {table}({', '.join(columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            for i in range(0, len(rows), BATCH_SIZE):
+                cur.executemany(sql, rows[i:i + BATCH_SIZE])
+            conn.commit()
+            invalidate_tables(table)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error en alta masiva de {table} ({len(rows)} filas): {e}")
+            raise
+        finally:
+            cur.close()
+    logger.info(f"Alta masiva en {table}: {len(rows)} filas")
+    return len(rows)
+
+
+def valid_rows(n: int, errors: dict) -> list:
+    """Posiciones sin errores, en orden."""
+    return [row for row in range(n) if row not in errors]
+
+
+def report(n: int, errors: dict) -> pd.DataFrame:
+    """
+    Resultado por fila del lote.
+
+    :return: DataFrame con columnas fila (posición en la entrada),
+             insertada (bool) y error (mensajes separados por '; ' o None)
+    """
+    return pd.DataFrame({
+        'fila': range(n),
+        'insertada': [row not in errors for row in range(n)],
+        'error': ['; '.join(errors[row]) if row in errors else None for row in range(n)],
+    })
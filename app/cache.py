@@ -0,0 +1,149 @@
+# app/cache.py
+"""
+Caché de resultados de consultas con TTL, límite LRU e invalidación por tabla.
+
+Cada entrada se indexa por (SQL, parámetros) y recuerda las tablas que lee.
+Cuando un CRUD modifica una tabla llama a invalidate(tabla) y se descartan
+todas las entradas que dependen de ella, de modo que la siguiente lectura
+vuelve a la base de datos.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Vistas que leen de una tabla base: invalidar la tabla invalida la vista.
+VIEW_TABLES = {
+    'vw_dueno_activo':       'vet_dueno',
+    'vw_mascota_activa':     'vet_mascota',
+    'vw_veterinario_activo': 'vet_veterinario',
+}
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+
+
+def tables_in(sql: str) -> frozenset:
+    """
+    Tablas (en minúsculas y sin esquema) que aparecen tras FROM/JOIN.
+    Las vistas conocidas se traducen a su tabla base.
+    """
+    names = set()
+    for raw in _TABLE_RE.findall(sql):
+        name = raw.split('.')[-1].lower()
+        names.add(VIEW_TABLES.get(name, name))
+    return frozenset(names)
+
+
+def is_cacheable(sql: str) -> bool:
+    """Sólo se cachean lecturas (SELECT / WITH)."""
+    head = sql.lstrip().split(None, 1)[:1]
+    return bool(head) and head[0].upper() in ('SELECT', 'WITH')
+
+
+class QueryCache:
+    """
+    Caché LRU thread-safe con expiración por TTL.
+
+    :param max_entries: número máximo de resultados guardados
+    :param ttl: segundos de vida de cada entrada
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expira, tablas, valor)
+        self._generation = 0            # aumenta con cada invalidación
+        self._versions = {}             # tabla -> nº de invalidaciones
+        self._flushes = 0               # invalidaciones sin tablas (todo)
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0}
+
+    @staticmethod
+    def key(sql: str, params) -> tuple:
+        return (' '.join(sql.split()), tuple(params or ()))
+
+    def get(self, key):
+        """Devuelve el valor guardado o None si no existe o expiró."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires, _, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    @property
+    def generation(self) -> int:
+        """Contador de invalidaciones; se toma antes de ir a la BD."""
+        return self._generation
+
+    def put(self, key, value, tables=frozenset(), ttl: float = None,
+            generation: int = None) -> None:
+        """
+        Guarda un valor asociado a las tablas de las que depende.
+
+        :param generation: valor de `generation` leído antes de consultar;
+                           si hubo una invalidación desde entonces el valor
+                           podría estar desactualizado y no se guarda.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, frozenset(tables), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        Descarta las entradas que leen alguna de las tablas indicadas.
+        Sin argumentos vacía toda la caché. Devuelve cuántas descartó.
+        """
+        targets = {VIEW_TABLES.get(t.lower(), t.lower()) for t in tables}
+        with self._lock:
+            if not targets:
+                dropped = list(self._entries)
+            else:
+                dropped = [k for k, (_, deps, _) in self._entries.items()
+                           if deps & targets]
+            for k in dropped:
+                del self._entries[k]
+            if not targets:
+                self._flushes += 1
+            for t in targets:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            self._generation += 1
+            self._stats['invalidations'] += len(dropped)
+            return len(dropped)
+
+    def versions(self, *tables: str) -> tuple:
+        """
+        Versión de cada tabla: cambia cada vez que se invalida (o se vacía
+        la caché). Sirve para guardar resultados fuera de la caché, p.ej. en
+        la sesión de Streamlit, y saber cuándo dejaron de valer.
+        """
+        with self._lock:
+            return (self._flushes,) + tuple(
+                self._versions.get(VIEW_TABLES.get(t.lower(), t.lower()), 0) for t in tables)
+
+    def stats(self) -> dict:
+        """Aciertos, fallos, tamaño y tasa de aciertos."""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                **self._stats,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+            }
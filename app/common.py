@@ -1,53 +1,352 @@
 # app/common.py
+import os
+import threading
 import streamlit as st
-from snowflake.connector import connect
-from cryptography.hazmat.primitives import serialization
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 
+from backends import Backend, load_backend
+from cache import QueryCache, is_cacheable, tables_in
+from metrics import InstrumentedConnection, QueryMetrics, caller_tag, tagged
+from pool import ConnectionPool
+from refdata import RefData
+from rollups import Rollups
+from search import SearchIndex
+from snapshots import SnapshotStore
+
+
+def config(section: str) -> dict:
+    """
+    Sección de los secrets como dict; vacía si no existe o si no hay
+    secrets.toml (p.ej. backend local sin credenciales).
+    """
+    try:
+        return dict(st.secrets.get(section, {}))
+    except FileNotFoundError:
+        return {}
+
+
+@st.cache_resource
+def get_backend() -> Backend:
+    """
+    Backend de base de datos activo: [database] backend en los secrets o la
+    variable de entorno VETDB_BACKEND ('snowflake' por defecto, 'sqlite'
+    para el motor local).
+    """
+    name = os.environ.get('VETDB_BACKEND') or config('database').get('backend', 'snowflake')
+    cfg = config(name.lower())
+    if name.lower() == 'sqlite' and os.environ.get('VETDB_SQLITE_PATH'):
+        cfg['path'] = os.environ['VETDB_SQLITE_PATH']
+    return load_backend(name, cfg)
+
+
+def create_connection():
+    """
+    Abre una conexión nueva con el backend activo.
+    La usa el pool para crecer; el resto del código debe pedir conexiones
+    con get_connection().
+    """
+    return get_backend().connect()
+
+
 @st.cache_resource
+def get_pool() -> ConnectionPool:
+    """
+    Pool de conexiones compartido por todas las sesiones de Streamlit.
+    Los límites se pueden ajustar en la sección [pool] de los secrets.
+    """
+    cfg = config('pool')
+    return ConnectionPool(
+        create_connection,
+        max_size=int(cfg.get('max_size', 10)),
+        min_size=int(cfg.get('min_size', 1)),
+        idle_timeout=float(cfg.get('idle_timeout', 300)),
+        checkout_timeout=float(cfg.get('checkout_timeout', 30)),
+    )
+
+
+@contextmanager
 def get_connection():
     """
-    Retorna una única conexión (singleton) a Snowflake usando key-pair o password.
-    Streamlit se encarga de cachear este recurso para toda la sesión.
-    """
-    cfg = st.secrets['snowflake']
-    conn_kwargs = {
-        'user':    cfg['user'],
-        'account': cfg['account'],
-        'warehouse': cfg['warehouse'],
-        'database':  cfg['database'],
-        'schema':    cfg['schema'],
-        'role':      cfg.get('role'),
-    }
-    # Key-pair
-    pk_path = cfg.get('private_key_path')
-    if pk_path:
-        with open(pk_path, 'rb') as f:
-            p_key = serialization.load_pem_private_key(f.read(), password=None)
-        der = p_key.private_bytes(
-            encoding=serialization.Encoding.DER,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        conn_kwargs['private_key'] = der
-    else:
-        pwd = cfg.get('password')
-        if not pwd:
-            raise ValueError("Se requiere password o private_key_path en los secrets.")
-        conn_kwargs['password'] = pwd
-
-    return connect(**conn_kwargs)
-
-def run_query(sql: str, params: tuple = None) -> pd.DataFrame:
+    Presta una conexión exclusiva del pool durante el bloque `with`.
+    Al salir se devuelve al pool con rollback de lo no confirmado.
+    Sus cursores registran latencia y filas de cada sentencia en get_metrics().
+    """
+    with get_pool().connection() as conn:
+        yield InstrumentedConnection(conn, get_metrics())
+
+
+@st.cache_resource
+def get_metrics() -> QueryMetrics:
+    """Métricas de consultas del proceso (latencias, filas, query IDs)."""
+    return QueryMetrics()
+
+
+def pool_stats() -> dict:
+    """Estadísticas del pool (conexiones en uso, ociosas, esperas, etc.)."""
+    return get_pool().stats()
+
+
+def fetch_dataframe(cur) -> pd.DataFrame:
+    """
+    Lee el resultado de un cursor ya ejecutado como DataFrame, con el camino
+    más rápido del backend (Arrow en Snowflake).
+    """
+    return get_backend().fetch_dataframe(cur)
+
+
+def fetch_batches(cur, batch_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """
+    Recorre el resultado de un cursor ya ejecutado en lotes de DataFrame.
+
+    Con Arrow cada lote es un chunk del resultado tal como lo entrega
+    Snowflake; sin Arrow se leen `batch_size` filas por vez con fetchmany().
+    Nunca se materializa el resultado completo. Un resultado vacío genera
+    un único lote vacío con las columnas, para que el consumidor las conozca.
+    """
+    cols = [c[0] for c in cur.description]
+    empty = True
+    for df in get_backend().fetch_batches(cur, batch_size):
+        if not df.empty:
+            empty = False
+            yield df
+    if empty:
+        yield pd.DataFrame(columns=cols)
+
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    """
+    Caché de resultados compartida por todas las sesiones.
+    Se configura en la sección [cache] de los secrets (ttl, max_entries).
+    """
+    cfg = config('cache')
+    return QueryCache(
+        max_entries=int(cfg.get('max_entries', 256)),
+        ttl=float(cfg.get('ttl', 60)),
+    )
+
+
+def invalidate_tables(*tables: str) -> int:
+    """
+    Descarta los resultados cacheados que leen de las tablas indicadas.
+    Los CRUD la llaman tras cada commit para que la siguiente lectura
+    refleje la escritura.
+    """
+    return get_query_cache().invalidate(*tables)
+
+
+def table_versions(*tables: str) -> tuple:
+    """Versiones de las tablas en la caché de consultas (ver QueryCache.versions)."""
+    return get_query_cache().versions(*tables)
+
+
+def cache_stats() -> dict:
+    """Aciertos/fallos y tamaño de la caché de consultas."""
+    return get_query_cache().stats()
+
+
+@st.cache_resource
+def get_refdata() -> RefData:
+    """
+    Dominios de los selectbox (veterinarios, sexos) compartidos por todas
+    las sesiones. Se configura en la sección [refdata] de los secrets
+    (refresh, full_reload, en segundos).
+    """
+    cfg = config('refdata')
+    return RefData(
+        lambda sql, params: run_query(sql, params, cache=False, tag='refdata'),
+        refresh=float(cfg.get('refresh', 30)),
+        full_reload=float(cfg.get('full_reload', 600)),
+    )
+
+
+@st.cache_resource
+def get_search_index() -> SearchIndex:
+    """
+    Índice de búsqueda por trigramas de dueños y mascotas, compartido por
+    todas las sesiones. Se configura en la sección [search] de los secrets
+    (refresh, full_reload, en segundos).
+    """
+    cfg = config('search')
+    return SearchIndex(
+        lambda sql, params: run_query(sql, params, cache=False, tag='search'),
+        refresh=float(cfg.get('refresh', 30)),
+        full_reload=float(cfg.get('full_reload', 600)),
+    )
+
+
+@st.cache_resource
+def get_rollups() -> Rollups:
+    """
+    Agregados diarios de ingresos y visitas para los reportes, compartidos
+    por todas las sesiones. Se configura en la sección [rollups] de los
+    secrets (refresh, full_reload, en segundos).
+    """
+    cfg = config('rollups')
+    return Rollups(
+        lambda sql, params: run_query(sql, params, cache=False, tag='rollups'),
+        refresh=float(cfg.get('refresh', 30)),
+        full_reload=float(cfg.get('full_reload', 600)),
+    )
+
+
+@st.cache_resource
+def get_snapshots() -> SnapshotStore:
+    """
+    Instantáneas Parquet de los reportes programados (ver snapshots.py).
+    Carpeta: variable de entorno VETDB_SNAPSHOTS_DIR o `dir` de la sección
+    [snapshots] de los secrets; por defecto app/snapshots.
+    """
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+    return SnapshotStore(os.environ.get('VETDB_SNAPSHOTS_DIR')
+                         or config('snapshots').get('dir') or default)
+
+
+def run_query(sql: str, params: tuple = None, cache: bool = True,
+              tag: str = None) -> pd.DataFrame:
     """
     Ejecuta una consulta SELECT y devuelve un DataFrame.
+
+    :param cache: si es True, reutiliza un resultado reciente de la misma
+                  consulta con los mismos parámetros. Las validaciones previas
+                  a una escritura deben pasar cache=False.
+    :param tag: etiqueta para las métricas; por defecto, la función que llama
     """
-    conn = get_connection()
-    cur  = conn.cursor()
-    try:
-        cur.execute(sql, params or ())
-        cols = [c[0] for c in cur.description]
-        rows = cur.fetchall()
-        return pd.DataFrame(rows, columns=cols)
-    finally:
-        cur.close()
+    cacheable = cache and is_cacheable(sql)
+    if cacheable:
+        qcache = get_query_cache()
+        key = qcache.key(sql, params)
+        hit = qcache.get(key)
+        if hit is not None:
+            return hit.copy()
+        generation = qcache.generation
+
+    with get_connection() as conn, tagged(tag):
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params or ())
+            df = fetch_dataframe(cur)
+        finally:
+            cur.close()
+
+    if cacheable:
+        qcache.put(key, df.copy(), tables_in(sql), generation=generation)
+    return df
+
+
+def iter_query(sql: str, params: tuple = None,
+               batch_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """
+    Variante en streaming de run_query: genera el resultado por lotes de
+    DataFrame con memoria acotada. Pensada para exportaciones y reportes
+    grandes; no usa la caché.
+
+    La conexión queda tomada del pool mientras se consume el generador y se
+    devuelve al agotarlo o al cerrarlo.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params or ())
+            yield from fetch_batches(cur, batch_size)
+        finally:
+            cur.close()
+
+
+def iter_csv(sql: str, params: tuple = None,
+             batch_size: int = 50_000) -> Iterator[bytes]:
+    """
+    Genera el resultado de una consulta como CSV (UTF-8) por fragmentos:
+    primero la cabecera y luego un fragmento por lote.
+    """
+    header = True
+    for df in iter_query(sql, params, batch_size):
+        df.columns = df.columns.str.lower()
+        yield df.to_csv(index=False, header=header).encode()
+        header = False
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Hilos compartidos para ejecutar consultas en paralelo. Hay tantos como
+    conexiones en el pool: más hilos sólo esperarían un checkout.
+    """
+    return ThreadPoolExecutor(max_workers=get_pool().max_size,
+                              thread_name_prefix='vetdb-query')
+
+
+@st.cache_resource
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Hilos aparte para lo que se pide por adelantado (páginas vecinas de los
+    listados). Son pocos a propósito ([pool] prefetch_workers, 2 por
+    defecto): la precarga ocupa como mucho esas conexiones y no deja a las
+    consultas de la página actual esperando un checkout detrás de ella.
+    """
+    workers = int(config('pool').get('prefetch_workers', 2))
+    return ThreadPoolExecutor(max_workers=max(1, min(workers, get_pool().max_size - 1)),
+                              thread_name_prefix='vetdb-prefetch')
+
+
+def submit(fn: Callable[[], Any], prefetch: bool = False):
+    """
+    Ejecuta `fn` en segundo plano con su propia conexión del pool y
+    devuelve el Future. El hilo hereda el contexto de la sesión de
+    Streamlit que lo lanzó y, para las métricas, su etiqueta (la que se
+    usa si `fn` no pasa por ninguna función con nombre propio).
+
+    :param prefetch: trabajo especulativo; va a get_prefetch_executor()
+                     en vez de a los hilos de las consultas
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    tag = caller_tag()
+
+    def task():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        with tagged(tag, fallback=True):
+            return fn()
+
+    executor = get_prefetch_executor() if prefetch else get_executor()
+    return executor.submit(task)
+
+
+def run_parallel(calls: dict[str, Callable[[], Any]]) -> dict[str, Any]:
+    """
+    Lanza a la vez varias consultas independientes y espera todas.
+    El tiempo total es el de la más lenta, no la suma.
+
+        res = run_parallel({
+            'mascotas': partial(list_mascotas, limit=5),
+            'sexos':    partial(run_query, "SELECT ... FROM vet_sexo"),
+        })
+
+    :param calls: nombre -> callable sin argumentos
+    :return: nombre -> resultado de cada callable
+    :raises Exception: la primera excepción (en el orden de `calls`),
+                       una vez que terminaron todas
+    """
+    futures = {name: submit(fn) for name, fn in calls.items()}
+    results, error = {}, None
+    for name, fut in futures.items():
+        try:
+            results[name] = fut.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return results
+
+
+def run_queries(queries: dict[str, tuple]) -> dict[str, pd.DataFrame]:
+    """
+    Atajo de run_parallel para SQL directo: nombre -> (sql, params).
+    """
+    return run_parallel({
+        name: (lambda q=q: run_query(*q)) for name, q in queries.items()
+    })
@@ -1,21 +1,22 @@
 # app/crud/analisis.py
+"""
+Reportes en forma de párrafo + DataFrame (para gráficas o Excel). Los datos
+salen del registro de reportes (crud/reportes.py), así que comparten
+definición y caché con los que muestra la UI.
+"""
 import pandas as pd
-from common import run_query
-from datetime import date
+from reporting import run_report
+import timeseries
+import crud.reportes  # noqa: F401  (registra los reportes)
 
 def reporte_mascotas_hoy() -> tuple[str, pd.DataFrame]:
     """
-    Cuenta cuántas mascotas fueron atendidas en la fecha de hoy.
+    Cuenta cuántas mascotas fueron atendidas hoy (día de la clínica).
     Devuelve un párrafo y el DataFrame con el resultado (para gráficas o Excel).
     """
-    hoy = date.today().strftime("%Y-%m-%d")
-    sql = """
-      SELECT COUNT(*) AS atendidas
-      FROM vet_cita
-     WHERE TO_DATE(fecha_hora) = %s
-    """
-    df = run_query(sql, (hoy,))
-    total = int(df.at[0, 'ATENDIDAS'])
+    df = run_report('mascotas_hoy')
+    total = int(df.at[0, 'atendidas'])
+    hoy = timeseries.today()[0].strftime("%Y-%m-%d")
     texto = f"Hoy, {hoy}, se atendieron {total} mascota{'s' if total != 1 else ''}."
     return texto, df
 
@@ -23,12 +24,7 @@ def reporte_ingresos_mes(ano: int, mes: int) -> tuple[str, pd.DataFrame]:
     """
     Suma los montos facturados en un mes específico.
     """
-    sql = """
-      SELECT SUM(monto) AS ingresos
-      FROM vet_factura
-     WHERE YEAR(fecha_pago)=%s AND MONTH(fecha_pago)=%s
-    """
-    df = run_query(sql, (ano, mes))
-    ingresos = float(df.at[0, 'INGRESOS'] or 0)
+    df = run_report('ingresos_mes', {'year': ano, 'month': mes})
+    ingresos = float(df.at[0, 'ingresos'] or 0)
     texto = f"En {mes:02d}/{ano}, los ingresos totales fueron de ${ingresos:,.2f}."
     return texto, df
@@ -4,47 +4,116 @@ CRUD de Citas: funciones para listar, crear, actualizar y eliminar citas.
 Implementa validación centralizada, transacciones, logging y docstrings.
 """
 import pandas as pd
-from common import run_query, get_connection
+from common import get_connection, invalidate_tables, get_rollups
+import bulk
+import paging
+import rollups
 from logging_config import logging
-from snowflake.connector.errors import ProgrammingError
 
 logger = logging.getLogger(__name__)
 
+_CITA_COLUMNS = ('mascota_id', 'vet_id', 'fecha_hora', 'servicio', 'motivo')
 
-def _validate_cita_data(mascota_id: int,
-                        vet_id: int,
-                        fecha_hora: str,
-                        servicio: str) -> None:
+
+def _validate_citas_frame(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
     """
-    Valida los datos de una cita:
-      - mascota_id debe existir y estar activo
-      - vet_id debe existir y estar activo
+    Reglas de formato de citas (sin consultar la base), por columnas:
       - fecha_hora no puede estar vacío
       - servicio no puede estar vacío
+    :return: (máscara de filas válidas, mensaje de error por fila o None)
+    """
+    return bulk.first_error(df.index, [
+        (bulk.text(df['fecha_hora']) == '', "La fecha y hora de la cita son obligatorias"),
+        (bulk.text(df['servicio']).str.strip() == '', "El servicio es obligatorio"),
+    ])
+
+
+def _validate_cita_fields(fecha_hora: str, servicio: str) -> None:
+    """
+    Reglas de formato de una cita: las mismas de _validate_citas_frame.
     Lanza ValueError si falla alguna validación.
     """
-    # Validar mascota activa
-    if run_query("SELECT 1 FROM vw_mascota_activa WHERE mascota_id = %s", (mascota_id,)).empty:
+    _, errors = _validate_citas_frame(pd.DataFrame(
+        [(fecha_hora, servicio)], columns=['fecha_hora', 'servicio'], dtype=object))
+    bulk.raise_first(errors)
+
+
+# Alta validada en una sola sentencia: el SELECT sólo produce la fila si la
+# mascota y el veterinario están activos.
+# Carrera pendiente en Snowflake (READ COMMITTED, sin claves foráneas que se
+# cumplan): una baja simultánea de la mascota o el veterinario no se ve y la
+# cita queda apuntando a un registro inactivo.
+_SQL_INSERT_CITA = """
+    INSERT INTO vet_cita(mascota_id, vet_id, fecha_hora, servicio, motivo)
+    SELECT m.mascota_id, v.vet_id, %s, %s, %s
+      FROM vw_mascota_activa m
+      JOIN vw_veterinario_activo v ON v.vet_id = %s
+     WHERE m.mascota_id = %s
+"""
+
+_SQL_UPDATE_CITA = """
+    UPDATE vet_cita
+       SET mascota_id = %s,
+           vet_id      = %s,
+           fecha_hora  = %s,
+           servicio    = %s,
+           motivo      = %s
+     WHERE cita_id = %s
+       AND EXISTS (SELECT 1 FROM vw_mascota_activa m WHERE m.mascota_id = %s)
+       AND EXISTS (SELECT 1 FROM vw_veterinario_activo v WHERE v.vet_id = %s)
+"""
+
+# Las facturas no se borran con la cita: con facturas registradas no se
+# elimina (Snowflake no hace cumplir la clave foránea, SQLite sí).
+_SQL_DELETE_CITA = """
+    DELETE FROM vet_cita
+     WHERE cita_id = %s
+       AND NOT EXISTS (SELECT 1 FROM vet_factura f WHERE f.cita_id = %s)
+"""
+
+# Sólo si la escritura no afectó filas: qué condición falló, en una consulta
+_SQL_CHECK_CITA = """
+    SELECT (SELECT COUNT(*) FROM vw_mascota_activa WHERE mascota_id = %s) AS mascota,
+           (SELECT COUNT(*) FROM vw_veterinario_activo WHERE vet_id = %s) AS vet
+"""
+
+
+def _raise_cita_conflict(cur, mascota_id: int, vet_id: int) -> None:
+    """
+    Diagnostica una escritura validada que no afectó filas y lanza el
+    ValueError correspondiente (mascota y luego veterinario). No lanza si
+    ambos están activos (p.ej. cita_id inexistente).
+    """
+    cur.execute(_SQL_CHECK_CITA, (mascota_id, vet_id))
+    mascota, vet = cur.fetchone()
+    if not mascota:
         raise ValueError(f"mascota_id inválido o inactiva: {mascota_id}")
-    # Validar veterinario activo
-    if run_query("SELECT 1 FROM vw_veterinario_activo WHERE vet_id = %s", (vet_id,)).empty:
+    if not vet:
         raise ValueError(f"vet_id inválido o inactivo: {vet_id}")
-    # Fecha y hora obligatorias
-    if not fecha_hora:
-        raise ValueError("La fecha y hora de la cita son obligatorias")
-    # Servicio obligatorio
-    if not servicio.strip():
-        raise ValueError("El servicio es obligatorio")
+
+
+def _cita_facts(cur, cita_id: int) -> dict:
+    """
+    Hechos de la cita en los agregados (su visita y sus facturas, que se
+    agrupan por el servicio de la cita), leídos en la transacción en curso.
+    """
+    return {'visitas': rollups.read_facts(cur, 'visitas', "c.cita_id = %s", (cita_id,)),
+            'ingresos': rollups.read_facts(cur, 'ingresos', "f.cita_id = %s", (cita_id,))}
 
 
 def list_citas(limit: int = 5,
-               offset: int = 0,
+               cursor: str = None,
                filtro: str = None) -> pd.DataFrame:
     """
-    Devuelve las citas registradas, con paginación, filtro opcional
+    Devuelve las citas registradas, de la más reciente a la más antigua, con
+    paginación por clave (fecha_hora, cita_id), filtro opcional
     y columnas mascota_id, mascota_nombre, vet_id, veterinario_nombre, fecha_hora, servicio, motivo.
+
+    :param cursor: df.attrs['next_cursor'] / ['prev_cursor'] de la página
+                   anterior; None para la primera página
+    :return: DataFrame; df.attrs trae cursores, total y número de página
     """
-    sql_parts = [
+    select = "\n".join([
         "SELECT",
         "  c.cita_id,",
         "  c.mascota_id,",
@@ -57,20 +126,18 @@ def list_citas(limit: int = 5,
         "FROM vet_cita c",
         "JOIN vet_mascota      m ON c.mascota_id = m.mascota_id",
         "JOIN vet_veterinario  v ON c.vet_id     = v.vet_id",
-        "WHERE 1 = 1"
-    ]
-    params = []
+    ])
+    where, params = [], []
     if filtro:
-        sql_parts.append("  AND (LOWER(c.servicio) LIKE %s OR LOWER(c.motivo) LIKE %s)")
+        where.append("(LOWER(c.servicio) LIKE %s OR LOWER(c.motivo) LIKE %s)")
         term = f"%{filtro.lower()}%"
         params.extend([term, term])
 
-    sql_parts.append("ORDER BY c.fecha_hora DESC")
-    sql_parts.append("LIMIT %s OFFSET %s")
-    params.extend([limit, offset])
-
-    query = "\n".join(sql_parts)
-    return run_query(query, tuple(params))
+    # cita_id desempata citas a la misma hora: el orden es estable entre páginas
+    return paging.fetch_page(select, where, params,
+                             [('c.fecha_hora', 'FECHA_HORA'), ('c.cita_id', 'CITA_ID')],
+                             limit, cursor, descending=True,
+                             count_from='vet_cita c', estimate=bool(filtro))
 
 
 def create_cita(mascota_id: int,
@@ -79,28 +146,61 @@ def create_cita(mascota_id: int,
                 servicio: str,
                 motivo: str = None) -> None:
     """
-    Inserta una nueva cita.
+    Inserta una nueva cita. El formato se valida localmente; mascota y
+    veterinario activos se comprueban en la misma sentencia INSERT (en
+    Snowflake no es atómico frente a una baja simultánea, ver _SQL_INSERT_CITA).
 
     :raises ValueError: si falla validación de datos
     :raises Exception: otros errores de BD
     """
-    _validate_cita_data(mascota_id, vet_id, fecha_hora, servicio)
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO vet_cita(mascota_id, vet_id, fecha_hora, servicio, motivo)"
-            " VALUES (%s, %s, %s, %s, %s)",
-            (mascota_id, vet_id, fecha_hora, servicio, motivo)
-        )
-        conn.commit()
-        logger.info(f"Cita creada: mascota_id={mascota_id}, vet_id={vet_id}, fecha_hora={fecha_hora}")
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error al crear cita: {e}")
-        raise
-    finally:
-        cur.close()
+    _validate_cita_fields(fecha_hora, servicio)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(_SQL_INSERT_CITA,
+                        (fecha_hora, servicio, motivo, vet_id, mascota_id))
+            if cur.rowcount == 0:
+                _raise_cita_conflict(cur, mascota_id, vet_id)
+            conn.commit()
+            invalidate_tables('vet_cita')
+            get_rollups().mark_stale('visitas')
+            logger.info(f"Cita creada: mascota_id={mascota_id}, vet_id={vet_id}, fecha_hora={fecha_hora}")
+        except ValueError:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al crear cita: {e}")
+            raise
+        finally:
+            cur.close()
+
+
+def create_citas(records) -> pd.DataFrame:
+    """
+    Alta masiva de citas. Comprueba mascota_id y vet_id (activos) contra la
+    base como conjunto, valida fecha_hora y servicio por fila e inserta las
+    filas válidas en una sola transacción.
+
+    :param records: DataFrame o lista de dicts con columnas
+                    mascota_id, vet_id, fecha_hora, servicio, motivo
+    :return: reporte por fila (fila, insertada, error)
+    :raises Exception: errores de base de datos (no se inserta nada)
+    """
+    df = bulk.as_frame(records, _CITA_COLUMNS, texts=('fecha_hora', 'servicio'),
+                       ids=('mascota_id', 'vet_id'))
+    errors = {}
+    bulk.check_exists(df, errors, 'mascota_id', 'vw_mascota_activa', 'mascota_id',
+                      "mascota_id inválido o inactiva: {value}")
+    bulk.check_exists(df, errors, 'vet_id', 'vw_veterinario_activo', 'vet_id',
+                      "vet_id inválido o inactivo: {value}")
+    bulk.add_errors(errors, _validate_citas_frame(df)[1])
+    ok = bulk.valid_rows(len(df), errors)
+    bulk.insert_rows('vet_cita', _CITA_COLUMNS,
+                     list(df.loc[ok].itertuples(index=False, name=None)))
+    get_rollups().mark_stale('visitas')
+    logger.info(f"Alta masiva de citas: {len(ok)} de {len(df)} filas insertadas")
+    return bulk.report(len(df), errors)
 
 
 def update_cita(cita_id: int,
@@ -110,39 +210,45 @@ def update_cita(cita_id: int,
                 servicio: str,
                 motivo: str = None) -> int:
     """
-    Actualiza datos de una cita existente.
+    Actualiza datos de una cita existente (comprobaciones en el propio UPDATE,
+    con el mismo límite que create_cita en Snowflake).
 
     :param cita_id: ID de la cita a actualizar
     :return: número de filas afectadas
     :raises ValueError: si falla validación
     :raises Exception: otros errores de BD
     """
-    _validate_cita_data(mascota_id, vet_id, fecha_hora, servicio)
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            UPDATE vet_cita
-               SET mascota_id = %s,
-                   vet_id      = %s,
-                   fecha_hora  = %s,
-                   servicio    = %s,
-                   motivo      = %s
-             WHERE cita_id = %s
-            """,
-            (mascota_id, vet_id, fecha_hora, servicio, motivo, cita_id)
-        )
-        affected = cur.rowcount
-        conn.commit()
-        logger.info(f"Cita actualizada: cita_id={cita_id}, filas={affected}")
-        return affected
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error al actualizar cita {cita_id}: {e}")
-        raise
-    finally:
-        cur.close()
+    _validate_cita_fields(fecha_hora, servicio)
+    marks = {name: get_rollups().begin(name) for name in ('visitas', 'ingresos')}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            before = _cita_facts(cur, cita_id)
+            cur.execute(_SQL_UPDATE_CITA,
+                        (mascota_id, vet_id, fecha_hora, servicio, motivo, cita_id,
+                         mascota_id, vet_id))
+            affected = cur.rowcount
+            if affected == 0:
+                _raise_cita_conflict(cur, mascota_id, vet_id)
+            after = _cita_facts(cur, cita_id) if affected else before
+            conn.commit()
+            invalidate_tables('vet_cita')
+            if affected:
+                # Día, veterinario o servicio pudieron cambiar: se mueve la cita
+                for name, since in marks.items():
+                    get_rollups().add(name, before[name], -1, since)
+                    get_rollups().add(name, after[name], 1, since)
+            logger.info(f"Cita actualizada: cita_id={cita_id}, filas={affected}")
+            return affected
+        except ValueError:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al actualizar cita {cita_id}: {e}")
+            raise
+        finally:
+            cur.close()
 
 
 def delete_cita(cita_id: int) -> int:
@@ -151,19 +257,32 @@ def delete_cita(cita_id: int) -> int:
 
     :param cita_id: ID de la cita a eliminar
     :return: número de filas afectadas
+    :raises ValueError: si la cita tiene facturas registradas
     :raises Exception: errores de BD
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("DELETE FROM vet_cita WHERE cita_id = %s", (cita_id,))
-        affected = cur.rowcount
-        conn.commit()
-        logger.info(f"Cita eliminada: cita_id={cita_id}, filas={affected}")
-        return affected
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error al eliminar cita {cita_id}: {e}")
-        raise
-    finally:
-        cur.close()
+    marks = {name: get_rollups().begin(name) for name in ('visitas', 'ingresos')}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            facts = _cita_facts(cur, cita_id)
+            cur.execute(_SQL_DELETE_CITA, (cita_id, cita_id))
+            affected = cur.rowcount
+            if affected == 0 and facts['ingresos']:
+                raise ValueError("La cita tiene facturas registradas; no se puede eliminar")
+            conn.commit()
+            invalidate_tables('vet_cita')
+            if affected:
+                # Sin la cita, sus facturas tampoco cuentan en los reportes (JOIN)
+                for name, rows in facts.items():
+                    get_rollups().add(name, rows, -1, marks[name])
+            logger.info(f"Cita eliminada: cita_id={cita_id}, filas={affected}")
+            return affected
+        except ValueError:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al eliminar cita {cita_id}: {e}")
+            raise
+        finally:
+            cur.close()
@@ -3,104 +3,185 @@
 CRUD de Dueños: funciones para listar, crear, actualizar y borrar lógicamente.
 Se implementa validación centralizada, captura de errores de unicidad y docstrings detallados.
 """
-import re
 import pandas as pd
-from common import run_query, get_connection
+from backends import ProgrammingError
+from common import get_connection, invalidate_tables, get_search_index
+import bulk
+import paging
+import search
 from logging_config import logging
-from snowflake.connector.errors import ProgrammingError
 
 logger = logging.getLogger(__name__)
 
+_DUENO_COLUMNS = ('nombre', 'telefono', 'correo', 'direccion', 'documento_id')
 
-def _validate_dueno_data(nombre: str, telefono: str, correo: str, direccion: str, documento_id: str) -> None:
+
+# Alta con chequeo de duplicado en la misma sentencia: el SELECT no produce
+# fila si el documento ya existe.
+# Carrera pendiente en Snowflake: no hace cumplir uq_dueno_doc y lee en READ
+# COMMITTED, así que dos altas simultáneas con el mismo documento pueden no
+# verse entre sí y entrar las dos. En SQLite la restricción UNIQUE la corta.
+_SQL_INSERT_DUENO = """
+    INSERT INTO vet_dueno(nombre, telefono, correo, direccion, documento_id)
+    SELECT %s, %s, %s, %s, %s
+      FROM (SELECT 1 AS uno) x
+     WHERE NOT EXISTS (SELECT 1 FROM vet_dueno d WHERE d.documento_id = %s)
+"""
+
+_SQL_UPDATE_DUENO = """
+    UPDATE vet_dueno
+       SET nombre = %s,
+           telefono = %s,
+           correo = %s,
+           direccion = %s,
+           documento_id = %s
+     WHERE dueno_id = %s
+       AND NOT EXISTS (SELECT 1 FROM vet_dueno d
+                        WHERE d.documento_id = %s AND d.dueno_id != %s)
+"""
+
+
+def _validate_duenos_frame(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
     """
-    Valida campos obligatorios y formatos:
+    Valida columnas de dueños (nombre, telefono, correo, direccion,
+    documento_id) de una vez con operaciones de texto de pandas:
       - nombre, telefono, direccion, documento_id no pueden estar vacíos
       - telefono solo dígitos
       - correo con formato usuario@dominio.ext
+    Las reglas se evalúan en ese orden y cada fila lleva el primer error.
+
+    :return: (máscara de filas válidas, mensaje de error por fila o None)
+    """
+    nombre, telefono, correo, direccion, documento_id = (
+        bulk.text(df[c]) for c in _DUENO_COLUMNS)
+    return bulk.first_error(df.index, [
+        (nombre.str.strip() == '', "El nombre no puede estar vacío"),
+        (telefono.str.strip() == '', "El teléfono no puede estar vacío"),
+        (~bulk.isdigit(telefono), "El teléfono no es válido; debe contener solo dígitos"),
+        (direccion.str.strip() == '', "La dirección no puede estar vacía"),
+        (documento_id.str.strip() == '', "El documento ID no puede estar vacío"),
+        (~correo.str.fullmatch(r"[^@]+@[^@]+\.[^@]+"),
+         "El correo no es válido; formato esperado usuario@dominio.ext"),
+    ])
+
+
+def _validate_dueno_data(nombre: str, telefono: str, correo: str, direccion: str, documento_id: str) -> None:
+    """
+    Valida un dueño con las mismas reglas que _validate_duenos_frame.
     Lanza ValueError con mensaje descriptivo.
     """
-    if not nombre.strip():
-        raise ValueError("El nombre no puede estar vacío")
-    if not telefono.strip():
-        raise ValueError("El teléfono no puede estar vacío")
-    if not telefono.isdigit():
-        raise ValueError("El teléfono no es válido; debe contener solo dígitos")
-    if not direccion.strip():
-        raise ValueError("La dirección no puede estar vacía")
-    if not documento_id.strip():
-        raise ValueError("El documento ID no puede estar vacío")
-    if not correo or not re.fullmatch(r"[^@]+@[^@]+\.[^@]+", correo):
-        raise ValueError("El correo no es válido; formato esperado usuario@dominio.ext")
-
-
-def list_duenos(limit: int = 5, offset: int = 0, filtro: str = None) -> pd.DataFrame:
+    _, errors = _validate_duenos_frame(pd.DataFrame(
+        [(nombre, telefono, correo, direccion, documento_id)], columns=_DUENO_COLUMNS))
+    bulk.raise_first(errors)
+
+
+def list_duenos(limit: int = 5, cursor: str = None, filtro: str = None) -> pd.DataFrame:
     """
-    Devuelve dueños activos con paginación y filtro opcional por nombre.
+    Devuelve dueños activos con paginación por clave y filtro opcional por nombre.
 
     :param limit: número máximo de registros a devolver
-    :param offset: posición inicial (para paginación)
-    :param filtro: cadena para búsqueda en nombre (case-insensitive)
+    :param cursor: df.attrs['next_cursor'] / ['prev_cursor'] de la página
+                   anterior; None para la primera página
+    :param filtro: texto a buscar en nombre, teléfono o documento (sin
+                   distinguir mayúsculas ni tildes, ver search.py)
     :return: DataFrame con columnas dueno_id, nombre, telefono, correo, direccion, documento_id
+             y en df.attrs los cursores de la página siguiente/anterior, el
+             total de dueños que cumplen el filtro y el número de página
+             (ver paging.fetch_page)
     """
-    sql_parts = [
-        "SELECT dueno_id, nombre, telefono, correo, direccion, documento_id",
-        "FROM vw_dueno_activo"
-    ]
-    params = []
-    if filtro:
-        sql_parts.append("WHERE LOWER(nombre) LIKE %s")
-        params.append(f"%{filtro.lower()}%")
-    sql_parts.append("ORDER BY dueno_id")
-    sql_parts.append("LIMIT %s OFFSET %s")
-    params.extend([limit, offset])
-    query = " ".join(sql_parts)
-    return run_query(query, tuple(params))
+    where, params, total = [], [], None
+    ids = get_search_index().matching('duenos', filtro) if filtro else None
+    if ids is not None:
+        # El índice ya resolvió la búsqueda: el total es exacto y a la base
+        # sólo van los IDs de esta página
+        cond, params = search.sql_in('dueno_id', paging.id_window(ids, cursor, limit))
+        where.append(cond)
+        total = len(ids)
+    elif filtro:
+        # Consulta corta o índice aún sin construir: el mismo criterio en SQL
+        cond, params = search.sql_like(['nombre', 'telefono', 'documento_id'], filtro)
+        where.append(cond)
+    return paging.fetch_page(
+        "SELECT dueno_id, nombre, telefono, correo, direccion, documento_id FROM vw_dueno_activo",
+        where, params, [('dueno_id', 'DUENO_ID')], limit, cursor,
+        count_from='vw_dueno_activo', estimate=bool(filtro) and ids is None, total=total)
 
 
 def create_dueno(nombre: str, telefono: str, correo: str, direccion: str, documento_id: str) -> None:
     """
     Inserta un nuevo dueño en la base de datos.
-    Captura duplicados y errores de validación.
+    Captura duplicados y errores de validación. En Snowflake el chequeo de
+    documento no es atómico frente a otra alta simultánea (ver _SQL_INSERT_DUENO).
 
     :raises ValueError: si la validación de datos falla o documento duplicado
     :raises Exception: otros errores de base de datos
     """
-    # Validación centralizada
+    # Validación centralizada (formato, sin consultar la base)
     _validate_dueno_data(nombre, telefono, correo, direccion, documento_id)
 
-    # Pre-chequeo de duplicados
-    exists = run_query(
-        "SELECT 1 FROM vet_dueno WHERE documento_id = %s",
-        (documento_id,)
-    )
-    if not exists.empty:
-        raise ValueError("Ya existe un dueño con ese Documento ID")
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            # Chequeo de duplicado e inserción en la misma sentencia
+            cur.execute(_SQL_INSERT_DUENO,
+                        (nombre, telefono, correo, direccion, documento_id, documento_id))
+            if cur.rowcount == 0:
+                raise ValueError("Ya existe un dueño con ese Documento ID")
+            conn.commit()
+            invalidate_tables('vet_dueno')
+            get_search_index().mark_stale('duenos')
+            logger.info(f"Dueño creado con documento_id={documento_id}")
+        except ValueError:
+            conn.rollback()
+            raise
+        except ProgrammingError as pe:
+            # Captura duplicados por constraint de DB
+            if 'uq_dueno_doc' in str(pe).lower():
+                conn.rollback()
+                raise ValueError("Ya existe un dueño con ese Documento ID")
+            conn.rollback()
+            logger.error(f"Error de BD al crear dueño: {pe}")
+            raise
+        finally:
+            cur.close()
 
-    conn = get_connection()
-    cur = conn.cursor()
+
+def create_duenos(records) -> pd.DataFrame:
+    """
+    Alta masiva de dueños (p.ej. al incorporar una clínica).
+    Valida cada fila, verifica documento_id contra la base y dentro del lote
+    con una consulta por bloque, e inserta las filas válidas en una sola
+    transacción.
+
+    :param records: DataFrame o lista de dicts con columnas
+                    nombre, telefono, correo, direccion, documento_id
+    :return: reporte por fila (fila, insertada, error)
+    :raises ValueError: si otro proceso insertó un documento del lote entretanto
+    :raises Exception: otros errores de base de datos (no se inserta nada)
+    """
+    df = bulk.as_frame(records, _DUENO_COLUMNS, texts=_DUENO_COLUMNS)
+    errors = {}
+    bulk.add_errors(errors, _validate_duenos_frame(df)[1])
+    bulk.check_unique(df, errors, 'documento_id', 'vet_dueno',
+                      "Ya existe un dueño con ese Documento ID",
+                      "Documento ID repetido en el lote")
+    ok = bulk.valid_rows(len(df), errors)
     try:
-        cur.execute(
-            "INSERT INTO vet_dueno(nombre, telefono, correo, direccion, documento_id) VALUES (%s, %s, %s, %s, %s)",
-            (nombre, telefono, correo, direccion, documento_id)
-        )
-        conn.commit()
-        logger.info(f"Dueño creado con documento_id={documento_id}")
+        bulk.insert_rows('vet_dueno', _DUENO_COLUMNS,
+                         list(df.loc[ok].itertuples(index=False, name=None)))
     except ProgrammingError as pe:
-        # Captura duplicados por constraint de DB
         if 'uq_dueno_doc' in str(pe).lower():
-            conn.rollback()
             raise ValueError("Ya existe un dueño con ese Documento ID")
-        conn.rollback()
-        logger.error(f"Error de BD al crear dueño: {pe}")
         raise
-    finally:
-        cur.close()
+    get_search_index().mark_stale('duenos')
+    logger.info(f"Alta masiva de dueños: {len(ok)} de {len(df)} filas insertadas")
+    return bulk.report(len(df), errors)
 
 
 def update_dueno(dueno_id: int, nombre: str, telefono: str, correo: str, direccion: str, documento_id: str) -> int:
     """
-    Actualiza un dueño existente.
+    Actualiza un dueño existente. Mismo límite que create_dueno ante escrituras
+    simultáneas con el mismo documento en Snowflake.
 
     :param dueno_id: ID del dueño a actualizar
     :raises ValueError: si la validación de datos falla o documento duplicado
@@ -109,42 +190,37 @@ def update_dueno(dueno_id: int, nombre: str, telefono: str, correo: str, direcci
     """
     _validate_dueno_data(nombre, telefono, correo, direccion, documento_id)
 
-    # Pre-chequeo de duplicados (excluyendo el mismo registro)
-    exists = run_query(
-        "SELECT 1 FROM vet_dueno WHERE documento_id = %s AND dueno_id != %s",
-        (documento_id, dueno_id)
-    )
-    if not exists.empty:
-        raise ValueError("Ya existe otro dueño con ese Documento ID")
-
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            UPDATE vet_dueno
-               SET nombre = %s,
-                   telefono = %s,
-                   correo = %s,
-                   direccion = %s,
-                   documento_id = %s
-             WHERE dueno_id = %s
-            """,
-            (nombre, telefono, correo, direccion, documento_id, dueno_id)
-        )
-        affected = cur.rowcount
-        conn.commit()
-        logger.info(f"Dueño actualizado: dueno_id={dueno_id}, filas={affected}")
-        return affected
-    except ProgrammingError as pe:
-        if 'uq_dueno_doc' in str(pe).lower():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            # Chequeo de duplicado (excluyendo el mismo registro) y UPDATE juntos
+            cur.execute(_SQL_UPDATE_DUENO,
+                        (nombre, telefono, correo, direccion, documento_id, dueno_id,
+                         documento_id, dueno_id))
+            affected = cur.rowcount
+            if affected == 0:
+                cur.execute("SELECT COUNT(*) FROM vet_dueno WHERE documento_id = %s AND dueno_id != %s",
+                            (documento_id, dueno_id))
+                if cur.fetchone()[0]:
+                    raise ValueError("Ya existe otro dueño con ese Documento ID")
+            conn.commit()
+            invalidate_tables('vet_dueno')
+            if affected:
+                get_search_index().upsert('duenos', dueno_id, (nombre, telefono, documento_id))
+            logger.info(f"Dueño actualizado: dueno_id={dueno_id}, filas={affected}")
+            return affected
+        except ValueError:
             conn.rollback()
-            raise ValueError("Ya existe otro dueño con ese Documento ID")
-        conn.rollback()
-        logger.error(f"Error de BD al actualizar dueño {dueno_id}: {pe}")
-        raise
-    finally:
-        cur.close()
+            raise
+        except ProgrammingError as pe:
+            if 'uq_dueno_doc' in str(pe).lower():
+                conn.rollback()
+                raise ValueError("Ya existe otro dueño con ese Documento ID")
+            conn.rollback()
+            logger.error(f"Error de BD al actualizar dueño {dueno_id}: {pe}")
+            raise
+        finally:
+            cur.close()
 
 
 def delete_dueno(dueno_id: int) -> str:
@@ -155,17 +231,19 @@ def delete_dueno(dueno_id: int) -> str:
     :return: mensaje de confirmación del SP
     :raises Exception: errores de base de datos
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("CALL sp_soft_delete('vet_dueno', 'dueno_id', %s)", (str(dueno_id),))
-        result = cur.fetchone()[0] if cur.description else ''
-        conn.commit()
-        logger.info(f"Soft-delete dueño dueno_id={dueno_id}: {result}")
-        return result
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error al eliminar dueño {dueno_id}: {e}")
-        raise
-    finally:
-        cur.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("CALL sp_soft_delete('vet_dueno', 'dueno_id', %s)", (str(dueno_id),))
+            result = cur.fetchone()[0] if cur.description else ''
+            conn.commit()
+            invalidate_tables('vet_dueno')
+            get_search_index().remove('duenos', dueno_id)
+            logger.info(f"Soft-delete dueño dueno_id={dueno_id}: {result}")
+            return result
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al eliminar dueño {dueno_id}: {e}")
+            raise
+        finally:
+            cur.close()
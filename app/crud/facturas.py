@@ -1,44 +1,58 @@
 import pandas as pd
-from common import run_query, get_connection
+from common import get_connection, invalidate_tables, get_rollups
+import paging
+import rollups
 from logging_config import logging
 
 logger = logging.getLogger(__name__)
 
-def list_facturas(limit=5, offset=0, filtro=None) -> pd.DataFrame:
-    sql = ["SELECT factura_id, cita_id, monto, metodo_pago, fecha_pago",
-           "FROM vet_factura"]
-    params=[]
+def list_facturas(limit=5, cursor=None, filtro=None) -> pd.DataFrame:
+    # Paginación por clave: más recientes primero, factura_id desempata.
+    # df.attrs trae cursores, total y número de página (paging.fetch_page).
+    where, params = [], []
     if filtro:
-        sql.append("WHERE LOWER(metodo_pago) LIKE %s")
+        where.append("LOWER(metodo_pago) LIKE %s")
         params.append(f"%{filtro.lower()}%")
-    sql.append("ORDER BY fecha_pago DESC LIMIT %s OFFSET %s")
-    params.extend([limit, offset])
-    return run_query(" ".join(sql), tuple(params))
+    return paging.fetch_page(
+        "SELECT factura_id, cita_id, monto, metodo_pago, fecha_pago FROM vet_factura",
+        where, params, [('fecha_pago', 'FECHA_PAGO'), ('factura_id', 'FACTURA_ID')],
+        limit, cursor, descending=True,
+        count_from='vet_factura', estimate=bool(filtro))
 
 def create_factura(cita_id:int, monto:float, metodo:str) -> None:
     # aquí podrías validar que la cita exista
-    conn, cur = get_connection(), None
-    try:
-        cur = conn.cursor()
-        cur.execute(
-          "INSERT INTO vet_factura(cita_id, monto, metodo_pago) VALUES (%s,%s,%s)",
-          (cita_id, monto, metodo)
-        )
-        conn.commit()
-        logger.info(f"Factura creada para cita {cita_id}")
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        if cur: cur.close()
+    with get_connection() as conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute(
+              "INSERT INTO vet_factura(cita_id, monto, metodo_pago) VALUES (%s,%s,%s)",
+              (cita_id, monto, metodo)
+            )
+            conn.commit()
+            invalidate_tables('vet_factura')
+            get_rollups().mark_stale('ingresos')
+            logger.info(f"Factura creada para cita {cita_id}")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if cur: cur.close()
 
 def delete_factura(factura_id:int) -> int:
-    conn, cur = get_connection(), None
-    try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM vet_factura WHERE factura_id = %s", (factura_id,))
-        cnt = cur.rowcount
-        conn.commit()
-        return cnt
-    finally:
-        if cur: cur.close()
+    since = get_rollups().begin('ingresos')
+    with get_connection() as conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            # Lo que la factura sumaba en los agregados, antes de borrarla
+            facts = rollups.read_facts(cur, 'ingresos', "f.factura_id = %s", (factura_id,))
+            cur.execute("DELETE FROM vet_factura WHERE factura_id = %s", (factura_id,))
+            cnt = cur.rowcount
+            conn.commit()
+            invalidate_tables('vet_factura')
+            if cnt:
+                get_rollups().add('ingresos', facts, -1, since)
+            return cnt
+        finally:
+            if cur: cur.close()
@@ -3,64 +3,130 @@
 CRUD de Mascotas: funciones para listar, crear, actualizar y borrar lógicamente.
 Implementa validación centralizada, captura de duplicados, logging, transacciones y docstrings.
 """
-import re
 import pandas as pd
-from common import run_query, get_connection
+from backends import ProgrammingError
+from common import get_connection, invalidate_tables, get_search_index
+import bulk
+import paging
+import search
 from logging_config import logging
-from snowflake.connector.errors import ProgrammingError
 
 logger = logging.getLogger(__name__)
 
+_MASCOTA_COLUMNS = ('dueno_id', 'nombre', 'especie', 'raza', 'sexo_id',
+                    'fecha_nac', 'peso_kg', 'color', 'microchip')
 
-def _validate_mascota_data(nombre: str,
-                           especie: str,
-                           raza: str,
-                           peso_kg: float,
-                           color: str,
-                           microchip: str,
-                           sexo_id: int,
-                           dueno_id: int) -> None:
+
+def _validate_mascotas_frame(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
     """
-    Valida campos obligatorios y formatos para mascota:
+    Reglas de formato de mascotas (sin consultar la base), por columnas:
       - nombre y especie no pueden estar vacíos
-      - peso_kg debe ser número >= 0
+      - peso_kg obligatorio y número >= 0
       - microchip (si existe) solo alfanuméricos o guiones
-      - sexo_id y dueno_id deben existir en sus tablas de dominio
+    Las reglas se evalúan en ese orden y cada fila lleva el primer error.
+
+    :param df: columnas nombre, especie, peso_kg, microchip
+    :return: (máscara de filas válidas, mensaje de error por fila o None)
+    """
+    nombre, especie, microchip = (bulk.text(df[c]) for c in ('nombre', 'especie', 'microchip'))
+    peso = pd.to_numeric(df['peso_kg'], errors='coerce')
+    return bulk.first_error(df.index, [
+        (nombre.str.strip() == '', "El nombre de la mascota no puede estar vacío"),
+        (especie.str.strip() == '', "La especie no puede estar vacía"),
+        (df['peso_kg'].isna(), "El peso es obligatorio"),
+        (peso.isna() | (peso < 0), "El peso debe ser un número válido"),
+        ((microchip != '') & ~microchip.str.fullmatch(r"[A-Za-z0-9\-]+"),
+         "El microchip tiene caracteres inválidos"),
+    ])
+
+
+def _validate_mascota_fields(nombre: str,
+                             especie: str,
+                             raza: str,
+                             peso_kg: float,
+                             color: str,
+                             microchip: str) -> None:
+    """
+    Reglas de formato de una mascota: las mismas de _validate_mascotas_frame.
     Lanza ValueError con mensaje descriptivo.
     """
-    if not nombre.strip():
-        raise ValueError("El nombre de la mascota no puede estar vacío")
-    if not especie.strip():
-        raise ValueError("La especie no puede estar vacía")
-    if peso_kg is None:
-        raise ValueError("El peso es obligatorio")
-    try:
-        p = float(peso_kg)
-        if p < 0:
-            raise ValueError("El peso debe ser un número positivo")
-    except (TypeError, ValueError):
-        raise ValueError("El peso debe ser un número válido")
-    if microchip:
-        if not re.fullmatch(r"[A-Za-z0-9\-]+", microchip):
-            raise ValueError("El microchip tiene caracteres inválidos")
-    # validar sexo_id existe en dominio
-    exists = run_query("SELECT 1 FROM vet_sexo WHERE sexo_id = %s", (sexo_id,))
-    if exists.empty:
+    _, errors = _validate_mascotas_frame(pd.DataFrame(
+        [(nombre, especie, peso_kg, microchip)],
+        columns=['nombre', 'especie', 'peso_kg', 'microchip'], dtype=object))
+    bulk.raise_first(errors)
+
+
+# Alta validada en una sola sentencia: el SELECT sólo produce la fila si el
+# dueño está activo, el sexo existe y el microchip (si hay) está libre.
+# Carrera pendiente en Snowflake: no hace cumplir la UNIQUE del microchip y
+# lee en READ COMMITTED, así que dos escrituras simultáneas con el mismo chip
+# pueden no verse entre sí y entrar las dos (lo mismo con un dueño que se da
+# de baja a la vez). En SQLite la restricción UNIQUE la corta.
+_SQL_INSERT_MASCOTA = """
+    INSERT INTO vet_mascota(dueno_id, nombre, especie, raza, sexo_id, fecha_nac, peso_kg, color, microchip)
+    SELECT d.dueno_id, %s, %s, %s, s.sexo_id, %s, %s, %s, %s
+      FROM vw_dueno_activo d
+      JOIN vet_sexo s ON s.sexo_id = %s
+     WHERE d.dueno_id = %s
+       AND NOT EXISTS (SELECT 1 FROM vet_mascota x WHERE x.microchip = %s)
+"""
+
+_SQL_UPDATE_MASCOTA = """
+    UPDATE vet_mascota
+       SET dueno_id  = %s,
+           nombre    = %s,
+           especie   = %s,
+           raza      = %s,
+           sexo_id   = %s,
+           fecha_nac = %s,
+           peso_kg   = %s,
+           color     = %s,
+           microchip = %s
+     WHERE mascota_id = %s
+       AND EXISTS (SELECT 1 FROM vet_sexo s WHERE s.sexo_id = %s)
+       AND EXISTS (SELECT 1 FROM vw_dueno_activo d WHERE d.dueno_id = %s)
+       AND NOT EXISTS (SELECT 1 FROM vet_mascota x
+                        WHERE x.microchip = %s AND x.mascota_id != %s)
+"""
+
+# Sólo si la escritura no afectó filas: qué condición falló, en una consulta
+_SQL_CHECK_MASCOTA = """
+    SELECT (SELECT COUNT(*) FROM vet_sexo WHERE sexo_id = %s) AS sexo,
+           (SELECT COUNT(*) FROM vw_dueno_activo WHERE dueno_id = %s) AS dueno,
+           (SELECT COUNT(*) FROM vet_mascota
+             WHERE microchip = %s AND mascota_id != %s) AS microchip
+"""
+
+
+def _raise_mascota_conflict(cur, sexo_id: int, dueno_id: int, microchip,
+                            mascota_id: int, duplicate_message: str) -> None:
+    """
+    Diagnostica una escritura validada que no afectó filas y lanza el mismo
+    ValueError que las validaciones por separado, en su orden (sexo, dueño,
+    microchip). No lanza si todas se cumplen (p.ej. mascota_id inexistente).
+    """
+    cur.execute(_SQL_CHECK_MASCOTA, (sexo_id, dueno_id, microchip, mascota_id))
+    sexo, dueno, chip = cur.fetchone()
+    if not sexo:
         raise ValueError(f"sexo_id inválido: {sexo_id}")
-    # validar dueño existe y activo
-    exists = run_query(
-        "SELECT 1 FROM vw_dueno_activo WHERE dueno_id = %s", (dueno_id,))
-    if exists.empty:
+    if not dueno:
         raise ValueError(f"dueno_id inválido o inactivo: {dueno_id}")
+    if chip:
+        raise ValueError(duplicate_message)
 
 
 def list_mascotas(limit: int = 5,
-                  offset: int = 0,
+                  cursor: str = None,
                   filtro: str = None) -> pd.DataFrame:
     """
     Devuelve mascotas activas, con dueno_id, dueno_nombre, sexo_id, y demás campos.
+    Paginación por clave: `cursor` es df.attrs['next_cursor'] / ['prev_cursor']
+    de la página anterior (None para la primera). df.attrs trae además el
+    total y el número de página.
+    `filtro` busca en nombre, especie y microchip sin distinguir mayúsculas
+    ni tildes (ver search.py).
     """
-    sql_parts = [
+    select = "\n".join([
         "SELECT",
         "  m.mascota_id,",
         "  m.dueno_id,",
@@ -75,22 +141,23 @@ def list_mascotas(limit: int = 5,
         "  m.microchip",
         "FROM vet_mascota m",
         "JOIN vet_dueno   d ON m.dueno_id = d.dueno_id",
-        "WHERE m.is_active = TRUE"
-    ]
-    params = []
-    if filtro:
-        sql_parts.append(
-            "  AND (LOWER(m.nombre)   LIKE %s OR LOWER(m.especie) LIKE %s)"
-        )
-        term = f"%{filtro.lower()}%"
-        params.extend([term, term])
+    ])
+    where = ["m.is_active = TRUE"]
+    params, total = [], None
+    ids = get_search_index().matching('mascotas', filtro) if filtro else None
+    if ids is not None:
+        # Como en list_duenos: total del índice y sólo los IDs de la página
+        cond, params = search.sql_in('m.mascota_id', paging.id_window(ids, cursor, limit))
+        where.append(cond)
+        total = len(ids)
+    elif filtro:
+        cond, params = search.sql_like(['m.nombre', 'm.especie', 'm.microchip'], filtro)
+        where.append(cond)
 
-    sql_parts.append("ORDER BY m.mascota_id")
-    sql_parts.append("LIMIT %s OFFSET %s")
-    params.extend([limit, offset])
-
-    query = "\n".join(sql_parts)
-    return run_query(query, tuple(params))
+    return paging.fetch_page(select, where, params,
+                             [('m.mascota_id', 'MASCOTA_ID')], limit, cursor,
+                             count_from='vet_mascota m', estimate=bool(filtro) and ids is None,
+                             total=total)
 
 
 def create_mascota(dueno_id: int,
@@ -103,41 +170,86 @@ def create_mascota(dueno_id: int,
                    color: str,
                    microchip: str) -> None:
     """
-    Inserta una nueva mascota.
-    Captura duplicados de microchip y errores de validación.
+    Inserta una nueva mascota. El formato se valida localmente; dueño activo,
+    sexo y microchip libre se comprueban en la misma sentencia INSERT (en
+    Snowflake no es atómico frente a otra escritura simultánea, ver
+    _SQL_INSERT_MASCOTA).
 
     :raises ValueError: si falla validación o microchip duplicado
     :raises Exception: otros errores de base de datos
     """
-    _validate_mascota_data(nombre, especie, raza, peso_kg,
-                           color, microchip, sexo_id, dueno_id)
-    if microchip:
-        dup = run_query(
-            "SELECT 1 FROM vet_mascota WHERE microchip = %s", (microchip,))
-        if not dup.empty:
-            raise ValueError(
-                "Ya existe otra mascota con ese número de microchip")
-    conn = get_connection()
-    cur = conn.cursor()
+    _validate_mascota_fields(nombre, especie, raza, peso_kg, color, microchip)
+    # Sin microchip se guarda NULL: '' chocaría con la siguiente mascota sin chip
+    microchip = microchip or None
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                _SQL_INSERT_MASCOTA,
+                (nombre, especie, raza, fecha_nac, peso_kg, color, microchip,
+                 sexo_id, dueno_id, microchip)
+            )
+            if cur.rowcount == 0:
+                _raise_mascota_conflict(cur, sexo_id, dueno_id, microchip, -1,
+                                        "Ya existe otra mascota con ese número de microchip")
+            conn.commit()
+            invalidate_tables('vet_mascota')
+            get_search_index().mark_stale('mascotas')
+            logger.info(f"Mascota creada: {nombre} (microchip={microchip})")
+        except ValueError:
+            conn.rollback()
+            raise
+        except ProgrammingError as pe:
+            if 'uq_microchip' in str(pe).lower():
+                conn.rollback()
+                raise ValueError(
+                    "Ya existe otra mascota con ese número de microchip")
+            conn.rollback()
+            logger.error(f"Error de BD al crear mascota: {pe}")
+            raise
+        finally:
+            cur.close()
+
+
+def create_mascotas(records) -> pd.DataFrame:
+    """
+    Alta masiva de mascotas. Valida el formato de cada fila, comprueba
+    dueno_id (activo) y sexo_id contra la base como conjunto, la unicidad
+    del microchip contra la base y dentro del lote, e inserta las filas
+    válidas en una sola transacción.
+
+    :param records: DataFrame o lista de dicts con columnas dueno_id, nombre,
+                    especie, raza, sexo_id, fecha_nac, peso_kg, color, microchip
+    :return: reporte por fila (fila, insertada, error)
+    :raises ValueError: si otro proceso insertó un microchip del lote entretanto
+    :raises Exception: otros errores de base de datos (no se inserta nada)
+    """
+    texts = ('nombre', 'especie', 'raza', 'color', 'microchip')
+    df = bulk.as_frame(records, _MASCOTA_COLUMNS, texts=texts, ids=('dueno_id', 'sexo_id'))
+    errors = {}
+    bulk.add_errors(errors, _validate_mascotas_frame(df)[1])
+    bulk.check_exists(df, errors, 'sexo_id', 'vet_sexo', 'sexo_id',
+                      "sexo_id inválido: {value}")
+    bulk.check_exists(df, errors, 'dueno_id', 'vw_dueno_activo', 'dueno_id',
+                      "dueno_id inválido o inactivo: {value}")
+    bulk.check_unique(df, errors, 'microchip', 'vet_mascota',
+                      "Ya existe otra mascota con ese número de microchip",
+                      "Microchip repetido en el lote")
+    ok = bulk.valid_rows(len(df), errors)
+    # Campos opcionales vacíos se guardan como NULL (como el microchip del alta individual)
+    rows = df.loc[ok]
+    for col in ('raza', 'color', 'microchip'):
+        rows[col] = rows[col].map(lambda v: v or None)
     try:
-        cur.execute(
-            "INSERT INTO vet_mascota(dueno_id, nombre, especie, raza, sexo_id, fecha_nac, peso_kg, color, microchip)"
-            " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-            (dueno_id, nombre, especie, raza, sexo_id,
-             fecha_nac, peso_kg, color, microchip)
-        )
-        conn.commit()
-        logger.info(f"Mascota creada: {nombre} (microchip={microchip})")
+        bulk.insert_rows('vet_mascota', _MASCOTA_COLUMNS,
+                         list(rows.itertuples(index=False, name=None)))
     except ProgrammingError as pe:
         if 'uq_microchip' in str(pe).lower():
-            conn.rollback()
-            raise ValueError(
-                "Ya existe otra mascota con ese número de microchip")
-        conn.rollback()
-        logger.error(f"Error de BD al crear mascota: {pe}")
+            raise ValueError("Ya existe otra mascota con ese número de microchip")
         raise
-    finally:
-        cur.close()
+    get_search_index().mark_stale('mascotas')
+    logger.info(f"Alta masiva de mascotas: {len(ok)} de {len(df)} filas insertadas")
+    return bulk.report(len(df), errors)
 
 
 def update_mascota(mascota_id: int,
@@ -151,55 +263,48 @@ def update_mascota(mascota_id: int,
                    color: str,
                    microchip: str) -> int:
     """
-    Actualiza datos de una mascota existente.
+    Actualiza datos de una mascota existente. Como en create_mascota, las
+    comprobaciones contra la base van en el propio UPDATE, con el mismo
+    límite ante escrituras simultáneas en Snowflake.
 
     :param mascota_id: ID de la mascota a modificar
     :return: filas afectadas
     :raises ValueError: si validación o duplicado falla
     :raises Exception: otros errores de BD
     """
-    _validate_mascota_data(nombre, especie, raza, peso_kg,
-                           color, microchip, sexo_id, dueno_id)
-    if microchip:
-        dup = run_query(
-            "SELECT 1 FROM vet_mascota WHERE microchip = %s AND mascota_id != %s",
-            (microchip, mascota_id)
-        )
-        if not dup.empty:
-            raise ValueError("Otra mascota ya usa ese número de microchip")
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            UPDATE vet_mascota
-               SET dueno_id = %s,
-                   nombre    = %s,
-                   especie   = %s,
-                   raza      = %s,
-                   sexo_id   = %s,
-                   fecha_nac = %s,
-                   peso_kg   = %s,
-                   color     = %s,
-                   microchip = %s
-             WHERE mascota_id = %s
-            """,
-            (dueno_id, nombre, especie, raza, sexo_id,
-             fecha_nac, peso_kg, color, microchip, mascota_id)
-        )
-        affected = cur.rowcount
-        conn.commit()
-        logger.info(f"Mascota actualizada: id={mascota_id}, filas={affected}")
-        return affected
-    except ProgrammingError as pe:
-        if 'uq_microchip' in str(pe).lower():
+    _validate_mascota_fields(nombre, especie, raza, peso_kg, color, microchip)
+    microchip = microchip or None     # como en create_mascota
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                _SQL_UPDATE_MASCOTA,
+                (dueno_id, nombre, especie, raza, sexo_id,
+                 fecha_nac, peso_kg, color, microchip, mascota_id,
+                 sexo_id, dueno_id, microchip, mascota_id)
+            )
+            affected = cur.rowcount
+            if affected == 0:
+                _raise_mascota_conflict(cur, sexo_id, dueno_id, microchip, mascota_id,
+                                        "Otra mascota ya usa ese número de microchip")
+            conn.commit()
+            invalidate_tables('vet_mascota')
+            if affected:
+                get_search_index().upsert('mascotas', mascota_id, (nombre, especie, microchip))
+            logger.info(f"Mascota actualizada: id={mascota_id}, filas={affected}")
+            return affected
+        except ValueError:
             conn.rollback()
-            raise ValueError("Otra mascota ya usa ese número de microchip")
-        conn.rollback()
-        logger.error(f"Error de BD al actualizar mascota {mascota_id}: {pe}")
-        raise
-    finally:
-        cur.close()
+            raise
+        except ProgrammingError as pe:
+            if 'uq_microchip' in str(pe).lower():
+                conn.rollback()
+                raise ValueError("Otra mascota ya usa ese número de microchip")
+            conn.rollback()
+            logger.error(f"Error de BD al actualizar mascota {mascota_id}: {pe}")
+            raise
+        finally:
+            cur.close()
 
 
 def delete_mascota(mascota_id: int) -> str:
@@ -210,18 +315,20 @@ def delete_mascota(mascota_id: int) -> str:
     :return: mensaje de confirmación del SP
     :raises Exception: errores de BD
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "CALL sp_soft_delete('vet_mascota', 'mascota_id', %s)", (str(mascota_id),))
-        result = cur.fetchone()[0] if cur.description else ''
-        conn.commit()
-        logger.info(f"Soft-delete mascota id={mascota_id}: {result}")
-        return result
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error al eliminar mascota {mascota_id}: {e}")
-        raise
-    finally:
-        cur.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "CALL sp_soft_delete('vet_mascota', 'mascota_id', %s)", (str(mascota_id),))
+            result = cur.fetchone()[0] if cur.description else ''
+            conn.commit()
+            invalidate_tables('vet_mascota')
+            get_search_index().remove('mascotas', mascota_id)
+            logger.info(f"Soft-delete mascota id={mascota_id}: {result}")
+            return result
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al eliminar mascota {mascota_id}: {e}")
+            raise
+        finally:
+            cur.close()
@@ -1,42 +1,144 @@
-from common import run_query
+# app/crud/reportes.py
+"""
+Reportes de la veterinaria, declarados en el registro de reporting.py: la
+UI los pinta de forma genérica y sus resultados se comparten entre sesiones.
+Las funciones reporte_* / csv_* se mantienen para quien las llame directo.
+
+Los de `schedule` se guardan como instantáneas (ver reporting.py): los del
+mes cada 5 minutos, las series cada 15 y las vacunas cada hora. Los del día
+(atendidos hoy) salen de los agregados en memoria y se piden en vivo.
+"""
+from datetime import date, timedelta
+from typing import Iterator
+
 import pandas as pd
 
-def reporte_atendidos_hoy() -> pd.DataFrame:
-    """Cantidad de mascotas atendidas HOY por veterinario."""
-    sql = """
-    SELECT v.nombre    AS veterinario,
-           COUNT(*)     AS atendidos
-      FROM vet_cita c
-      JOIN vet_veterinario v ON c.vet_id = v.vet_id
-     WHERE DATE(c.fecha_hora) = CURRENT_DATE()
-     GROUP BY v.nombre
-     ORDER BY atendidos DESC
-    """
-    return run_query(sql)
+from common import run_query
+import timeseries
+from reporting import Param, Report, register, run_report, export_csv_rows
+
+
+_YEAR = Param('year', "Año", int, lambda: date.today().year, min_value=2000, max_value=2100)
+_MONTH = Param('month', "Mes", int, lambda: date.today().month, min_value=1, max_value=12)
+_DESDE = Param('desde', "Desde", date,
+               lambda: date.today().replace(day=1) - timedelta(days=365))
+_HASTA = Param('hasta', "Hasta (incluido)", date, date.today)
+_GRANO = Param('grano', "Agrupar por", str, lambda: 'month',
+               options={'day': "Día", 'week': "Semana", 'month': "Mes"})
+
+
+# --- Visitas (agregado diario de citas) ---------------------------------- #
+def _atendidos_hoy() -> pd.DataFrame:
+    df = timeseries.totals('visitas', *timeseries.today(), by=('vet_id',))
+    vets = run_query("SELECT vet_id, nombre FROM vet_veterinario")
+    nombres = dict(zip(vets.iloc[:, 0], vets.iloc[:, 1]))
+    df = (df.assign(veterinario=df['vet_id'].map(nombres))
+            .groupby('veterinario', as_index=False)['n'].sum()
+            .rename(columns={'n': 'atendidos'}))
+    df['atendidos'] = df['atendidos'].astype(int)
+    return df.sort_values('atendidos', ascending=False, ignore_index=True)
+
+
+def _mascotas_hoy() -> pd.DataFrame:
+    df = timeseries.totals('visitas', *timeseries.today())
+    return pd.DataFrame({'atendidas': [int(df.at[0, 'n'])]})
+
+
+def _visitas_periodo(desde: date, hasta: date, grano: str) -> pd.DataFrame:
+    return timeseries.series('visitas', desde, hasta + timedelta(days=1), grano)
+
+
+register(Report(
+    'atendidos_hoy', "Atendidos hoy por veterinario",
+    {'veterinario': "Veterinario", 'atendidos': "Atendidos"},
+    loader=_atendidos_hoy, chart='bar', x='veterinario', y='atendidos',
+    ttl=60, tables=('vet_cita', 'vet_veterinario'), daily=True))
+
+register(Report(
+    'mascotas_hoy', "Mascotas atendidas hoy", {'atendidas': "Atendidas"},
+    loader=_mascotas_hoy, chart='metric', y='atendidas',
+    ttl=60, tables=('vet_cita',), daily=True))
+
+register(Report(
+    'visitas_periodo', "Evolución de visitas", {'periodo': "Periodo", 'n': "Visitas"},
+    loader=_visitas_periodo, params=(_DESDE, _HASTA, _GRANO),
+    chart='bar', x='periodo', y='n', ttl=300, tables=('vet_cita',),
+    schedule="*/15 * * * *"))
 
-def reporte_ingresos_servicio_mes(year: int, month: int) -> pd.DataFrame:
-    """Ingresos totales por servicio en el mes y año indicados."""
-    sql = """
-    SELECT c.servicio,
-           SUM(f.monto) AS total
-      FROM vet_factura f
-      JOIN vet_cita    c ON f.cita_id = c.cita_id
-     WHERE YEAR(f.fecha_pago)  = %s
-       AND MONTH(f.fecha_pago) = %s
-     GROUP BY c.servicio
-     ORDER BY total DESC
-    """
-    return run_query(sql, (year, month))
 
-def reporte_vacunas_pendientes() -> pd.DataFrame:
-    """Listado de mascotas con vacunas ya vencidas o por vencer en 7 días."""
-    sql = """
+# --- Ingresos (agregado diario de facturas) ------------------------------ #
+def _ingresos_mes(year: int, month: int) -> pd.DataFrame:
+    df = timeseries.totals('ingresos', *timeseries.month(year, month))
+    # Sin facturas en el mes, SUM() daba NULL
+    return pd.DataFrame({'ingresos': [float(df.at[0, 'total']) if df.at[0, 'n'] else None]})
+
+
+def _ingresos_servicio_mes(year: int, month: int) -> pd.DataFrame:
+    df = timeseries.totals('ingresos', *timeseries.month(year, month), by=('servicio',))
+    return df.sort_values('total', ascending=False, ignore_index=True)
+
+
+def _ingresos_periodo(desde: date, hasta: date, grano: str) -> pd.DataFrame:
+    return timeseries.series('ingresos', desde, hasta + timedelta(days=1), grano)
+
+
+register(Report(
+    'ingresos_mes', "Ingresos del mes", {'ingresos': "Ingresos ($)"},
+    loader=_ingresos_mes, params=(_YEAR, _MONTH), chart='metric', y='ingresos',
+    ttl=300, tables=('vet_factura', 'vet_cita'), schedule="*/5 * * * *"))
+
+register(Report(
+    'ingresos_servicio_mes', "Ingresos por servicio (mes)",
+    {'servicio': "Servicio", 'total': "Total"},
+    loader=_ingresos_servicio_mes, params=(_YEAR, _MONTH),
+    chart='bar', x='servicio', y='total', ttl=300, tables=('vet_factura', 'vet_cita'),
+    schedule="*/5 * * * *"))
+
+register(Report(
+    'ingresos_periodo', "Evolución de ingresos",
+    {'periodo': "Periodo", 'total': "Ingresos", 'n': "Facturas"},
+    loader=_ingresos_periodo, params=(_DESDE, _HASTA, _GRANO),
+    chart='line', x='periodo', y='total', ttl=300, tables=('vet_factura', 'vet_cita'),
+    schedule="*/15 * * * *"))
+
+
+# --- Vacunas ------------------------------------------------------------- #
+register(Report(
+    'vacunas_pendientes', "Vacunas pendientes",
+    {'mascota': "Mascota", 'vacuna': "Vacuna", 'vence': "Vence"},
+    sql="""
     SELECT m.nombre       AS mascota,
            v.nombre AS vacuna,
            vm.prox_vence AS vence
       FROM vet_vacuna_mascota vm
       JOIN vet_mascota       m ON vm.mascota_id = m.mascota_id
       JOIN vet_vacuna        v ON vm.vacuna_id  = v.vacuna_id
-     WHERE vm.prox_vence < DATEADD(day, 7, CURRENT_DATE())
+     WHERE vm.prox_vence < %s
+     ORDER BY vence
+    """,
+    # Vencidas o por vencer en 7 días (día de la clínica)
+    params=(Param('vence_antes', "Vencen antes de", date,
+                  lambda: timeseries.today()[0] + timedelta(days=7)),),
+    ttl=600, preview=500, csv=True, schedule="0 * * * *"))
+
+
+# --- Funciones de siempre ------------------------------------------------ #
+def reporte_atendidos_hoy() -> pd.DataFrame:
+    """Cantidad de mascotas atendidas HOY (día de la clínica) por veterinario."""
+    return run_report('atendidos_hoy')
+
+def reporte_ingresos_servicio_mes(year: int, month: int) -> pd.DataFrame:
+    """Ingresos totales por servicio en el mes y año indicados."""
+    return run_report('ingresos_servicio_mes', {'year': year, 'month': month})
+
+def reporte_vacunas_pendientes(limit: int = None) -> pd.DataFrame:
     """
-    return run_query(sql)
+    Listado de mascotas con vacunas ya vencidas o por vencer en 7 días.
+
+    :param limit: máximo de filas (p.ej. para una vista previa); None = todas
+    """
+    return run_report('vacunas_pendientes', limit=limit)
+
+def csv_vacunas_pendientes() -> Iterator[bytes]:
+    """Mismo listado que reporte_vacunas_pendientes, como CSV por fragmentos."""
+    return export_csv_rows('vacunas_pendientes')
@@ -0,0 +1,538 @@
+# app/datagen.py
+"""
+Generador de datos sintéticos para VetDB (pruebas de carga y benchmarks).
+
+Llena vet_usuario_sistema, vet_veterinario, vet_dueno, vet_mascota,
+vet_cita, vet_factura y vet_vacuna_mascota a partir de un número de citas
+(hasta 10M), con distribuciones plausibles:
+  - mascotas por dueño: 1 + Poisson(0.55), máximo 6
+  - veterinarios dimensionados para ~14 citas por veterinario y día hábil
+  - citas por día según día de la semana y temporada; algunas mascotas y
+    veterinarios concentran más visitas que otros
+  - ~88% de las citas facturadas; monto según servicio, con recargo en
+    temporada alta (julio, diciembre)
+  - vacunas por mascota según especie, con refuerzo anual
+
+Es determinista: la misma semilla, número de citas y fecha final producen
+exactamente las mismas filas. La fecha final por defecto es fija
+(DEFAULT_END); con --end hoy la historia termina hoy y la salida cambia de
+un día a otro. Ni citas ni pagos pasan de la fecha final: un cobro que
+caería después se registra el último día. Escribe por lotes con executemany y un commit
+por lote. Los IDs se asignan explícitamente a partir del máximo existente.
+
+Usuarios generados: en el backend sqlite usan la contraseña de demo
+DEMO_PASSWORD; en cualquier otro, una contraseña aleatoria que se imprime
+una sola vez al terminar. --reset (vaciar las tablas antes, incluida
+vet_usuario_sistema) sólo se acepta con el backend sqlite.
+
+    python app/datagen.py --backend sqlite --path vetdb.sqlite --citas 1000000 --seed 42 --reset
+    python app/datagen.py --backend snowflake --citas 10000000
+"""
+import argparse
+import hashlib
+import math
+import os
+import secrets
+import sys
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+import numpy as np
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_CITAS = 10_000_000
+BATCH_SIZE = 50_000
+DEFAULT_DAYS = 730
+# Último día con citas si no se indica otro: fijo, para que la semilla baste
+DEFAULT_END = date(2025, 12, 31)
+# Contraseña de los usuarios generados en el backend local (sqlite)
+DEMO_PASSWORD = 'vetdb123'
+# Único backend en que se permite --reset y la contraseña de demo
+LOCAL_BACKEND = 'sqlite'
+
+# Orden de borrado respetando las FK
+TABLES = ('vet_factura', 'vet_cita', 'vet_vacuna_mascota', 'vet_mascota',
+          'vet_dueno', 'vet_veterinario', 'vet_usuario_sistema')
+
+NOMBRES = ['María', 'José', 'Ana', 'Luis', 'Carmen', 'Carlos', 'Lucía', 'Jorge',
+           'Sofía', 'Miguel', 'Valentina', 'Andrés', 'Camila', 'Diego', 'Isabel',
+           'Fernando', 'Gabriela', 'Ricardo', 'Paula', 'Javier', 'Daniela', 'Raúl',
+           'Elena', 'Pedro', 'Natalia', 'Manuel', 'Laura', 'Alejandro', 'Rosa', 'Tomás']
+APELLIDOS = ['García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez',
+             'Sánchez', 'Pérez', 'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández',
+             'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Alonso', 'Gutiérrez',
+             'Navarro', 'Torres', 'Domínguez', 'Vásquez', 'Ramos', 'Castillo']
+CALLES = ['Av. Central', 'Calle 5', 'Av. Las Palmas', 'Calle Real', 'Av. Bolívar',
+          'Calle Los Pinos', 'Av. del Mar', 'Calle 12', 'Vía España', 'Calle Norte']
+NOMBRES_MASCOTA = ['Luna', 'Max', 'Rocky', 'Coco', 'Toby', 'Lola', 'Simba', 'Nala',
+                   'Bruno', 'Kira', 'Thor', 'Mia', 'Zeus', 'Canela', 'Milo', 'Chispa',
+                   'Oreo', 'Pelusa', 'Firulais', 'Bella', 'Manchas', 'Tigre', 'Nieve', 'Pipo']
+ESPECIES = ['Perro', 'Gato', 'Ave', 'Conejo', 'Hámster']
+P_ESPECIE = [0.55, 0.33, 0.05, 0.04, 0.03]
+RAZAS = {
+    'Perro':   ['Mestizo', 'Labrador', 'Poodle', 'Pastor Alemán', 'Chihuahua', 'Bulldog', 'Beagle'],
+    'Gato':    ['Mestizo', 'Siamés', 'Persa', 'Maine Coon', 'Angora'],
+    'Ave':     ['Periquito', 'Canario', 'Loro'],
+    'Conejo':  ['Belier', 'Enano'],
+    'Hámster': ['Sirio', 'Ruso'],
+}
+# Peso medio (kg) por especie
+PESO = {'Perro': 18.0, 'Gato': 4.5, 'Ave': 0.3, 'Conejo': 2.0, 'Hámster': 0.15}
+COLORES = ['negro', 'blanco', 'café', 'gris', 'atigrado', 'dorado', 'manchado', 'crema']
+ESPECIALIDADES = ['Medicina general', 'Cirugía', 'Dermatología', 'Cardiología',
+                  'Odontología', 'Exóticos']
+
+# servicio: (probabilidad, precio base)
+SERVICIOS = {
+    'Consulta general':  (0.34, 35.0),
+    'Vacunación':        (0.18, 25.0),
+    'Control':           (0.14, 20.0),
+    'Desparasitación':   (0.09, 15.0),
+    'Baño y peluquería': (0.10, 30.0),
+    'Laboratorio':       (0.07, 60.0),
+    'Urgencia':          (0.05, 90.0),
+    'Cirugía':           (0.03, 250.0),
+}
+MOTIVOS = ['Chequeo anual', 'Vómitos', 'Cojera', 'Picazón', 'Refuerzo de vacuna',
+           'Pérdida de apetito', 'Diarrea', 'Revisión postoperatoria', 'Tos', 'Control de peso']
+METODOS_PAGO = ['efectivo', 'tarjeta', 'transferencia']
+P_METODO = [0.35, 0.45, 0.20]
+
+# Demanda relativa por día de la semana (lunes..domingo) y por mes (enero..diciembre)
+PESO_DIA_SEMANA = np.array([1.0, 1.0, 0.95, 1.0, 1.1, 0.7, 0.12])
+PESO_MES = np.array([0.9, 0.85, 0.95, 1.0, 1.0, 1.05, 1.15, 1.1, 0.95, 0.95, 1.0, 1.2])
+# Recargo de facturación en temporada alta
+RECARGO_MES = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.08, 1.05, 1.0, 1.0, 1.0, 1.12])
+# Distribución de la hora de la cita, 8:00 a 18:45
+PESO_HORA = np.array([1.2, 1.4, 1.3, 1.1, 0.6, 0.5, 0.9, 1.1, 1.2, 1.3, 1.0])
+
+CITAS_POR_VET_DIA = 14
+P_FACTURADA = 0.88
+
+
+def plan(citas: int, days: int = DEFAULT_DAYS) -> dict:
+    """
+    Tamaños derivados del número de citas.
+
+    :param citas: citas a generar (1..MAX_CITAS)
+    :param days: días de historia que abarcan las citas
+    :return: dict con el número aproximado de filas por tabla
+    """
+    if not 1 <= citas <= MAX_CITAS:
+        raise ValueError(f"citas debe estar entre 1 y {MAX_CITAS:,}")
+    duenos = max(math.ceil(citas / 24), 10)
+    dias_habiles = days * 6 / 7
+    vets = max(math.ceil(citas / (dias_habiles * CITAS_POR_VET_DIA)), 3)
+    return {
+        'duenos': duenos,
+        'mascotas_aprox': int(duenos * 1.55),
+        'veterinarios': vets,
+        'recepcionistas': max(vets // 4, 1),
+        'citas': citas,
+        'facturas_aprox': int(citas * P_FACTURADA),
+    }
+
+
+def _rng(seed: int, *stream: int) -> np.random.Generator:
+    """Generador independiente por tabla y lote: no depende del orden de escritura."""
+    return np.random.default_rng([seed, *stream])
+
+
+def _ascii(text: str) -> str:
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+
+
+def _next_id(cur, table: str, column: str) -> int:
+    cur.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+    return int(cur.fetchone()[0]) + 1
+
+
+def _catalog(cur, sql: str) -> dict:
+    cur.execute(sql)
+    return {str(name): int(key) for key, name in cur.fetchall()}
+
+
+def _bulk_insert(conn, columns: dict, batches: Iterator[tuple]) -> dict:
+    """
+    Inserta lotes de filas con executemany y confirma cada lote.
+
+    :param columns: {tabla: (columnas, ...)}
+    :param batches: lotes (tabla, filas); pueden alternar entre tablas
+    :return: total de filas insertadas por tabla
+    """
+    sql = {table: (f"INSERT INTO {table}({', '.join(cols)}) "
+                   f"VALUES ({', '.join(['%s'] * len(cols))})")
+           for table, cols in columns.items()}
+    total = dict.fromkeys(columns, 0)
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    try:
+        for table, rows in batches:
+            if not rows:
+                continue
+            cur.executemany(sql[table], rows)
+            conn.commit()
+            total[table] += len(rows)
+            logger.debug(f"{table}: {total[table]:,} filas")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    logger.info(f"{', '.join(f'{t}: {n:,}' for t, n in total.items())} filas "
+                f"en {time.perf_counter() - t0:.1f}s")
+    return total
+
+
+def _each(table: str, batches) -> Iterator[tuple]:
+    for rows in batches:
+        yield table, rows
+
+
+def _chunks(n: int, size: int = BATCH_SIZE) -> Iterator[tuple]:
+    for i, start in enumerate(range(0, n, size)):
+        yield i, start, min(start + size, n)
+
+
+def _usuarios(seed: int, first_id: int, roles: dict, vets: int, recepcion: int,
+              password: str) -> list:
+    pass_hash = hashlib.sha256(password.encode()).hexdigest()
+    spec = ([(roles.get('admin'), 'admin')]
+            + [(roles.get('recepcion'), 'recepcion')] * recepcion
+            + [(roles.get('veterinario'), 'vet')] * vets)
+    return [(first_id + i, f"{prefix}{first_id + i}", pass_hash, rol_id)
+            for i, (rol_id, prefix) in enumerate(spec)]
+
+
+def _veterinarios(seed: int, first_id: int, n: int) -> list:
+    rng = _rng(seed, 1)
+    nombres = rng.choice(NOMBRES, n)
+    apellidos = rng.choice(APELLIDOS, n)
+    esp = rng.choice(ESPECIALIDADES, n, p=[0.6, 0.12, 0.08, 0.07, 0.07, 0.06])
+    return [(first_id + i, f"Dr(a). {nombres[i]} {apellidos[i]}", str(esp[i]))
+            for i in range(n)]
+
+
+def _duenos(seed: int, first_id: int, n: int) -> Iterator[list]:
+    for chunk, start, stop in _chunks(n):
+        rng = _rng(seed, 2, chunk)
+        k = stop - start
+        nombres = rng.choice(NOMBRES, k)
+        apellidos = rng.choice(APELLIDOS, (k, 2))
+        telefonos = rng.integers(600_000_000, 700_000_000, k)
+        calles = rng.choice(CALLES, k)
+        numeros = rng.integers(1, 999, k)
+        con_correo = rng.random(k) < 0.8
+        rows = []
+        for j in range(k):
+            dueno_id = first_id + start + j
+            nombre = f"{nombres[j]} {apellidos[j, 0]} {apellidos[j, 1]}"
+            correo = (f"{_ascii(nombres[j])}.{_ascii(apellidos[j, 0])}{dueno_id}@example.com"
+                      if con_correo[j] else None)
+            rows.append((dueno_id, nombre, str(telefonos[j]), correo,
+                         f"{calles[j]} #{numeros[j]}", str(10_000_000 + dueno_id)))
+        yield rows
+
+
+def _mascotas_por_dueno(seed: int, n_duenos: int) -> np.ndarray:
+    return np.minimum(1 + _rng(seed, 3).poisson(0.55, n_duenos), 6)
+
+
+def _mascotas(seed: int, first_id: int, first_dueno: int, por_dueno: np.ndarray,
+              sexos: list, end: date) -> Iterator[list]:
+    owners = np.repeat(np.arange(first_dueno, first_dueno + len(por_dueno)), por_dueno)
+    n = len(owners)
+    for chunk, start, stop in _chunks(n):
+        rng = _rng(seed, 4, chunk)
+        k = stop - start
+        especies = rng.choice(ESPECIES, k, p=P_ESPECIE)
+        nombres = rng.choice(NOMBRES_MASCOTA, k)
+        sexo = rng.choice(sexos, k, p=[0.49, 0.49, 0.02] if len(sexos) == 3 else None)
+        edad_dias = rng.integers(60, 15 * 365, k)
+        peso_factor = rng.lognormal(0, 0.35, k)
+        colores = rng.choice(COLORES, k)
+        con_chip = rng.random(k) < 0.7
+        raza_idx = rng.random(k)
+        rows = []
+        for j in range(k):
+            mascota_id = first_id + start + j
+            especie = str(especies[j])
+            razas = RAZAS[especie]
+            rows.append((
+                mascota_id, int(owners[start + j]), str(nombres[j]), especie,
+                razas[int(raza_idx[j] * len(razas))], int(sexo[j]),
+                (end - timedelta(days=int(edad_dias[j]))).isoformat(),
+                round(PESO[especie] * float(peso_factor[j]), 2), str(colores[j]),
+                f"985{mascota_id:012d}" if con_chip[j] else None,
+            ))
+        yield rows
+
+
+def _citas_por_dia(seed: int, citas: int, start: date, days: int) -> np.ndarray:
+    dias = [start + timedelta(days=i) for i in range(days)]
+    peso = np.array([PESO_DIA_SEMANA[d.weekday()] * PESO_MES[d.month - 1] for d in dias])
+    return _rng(seed, 5).multinomial(citas, peso / peso.sum())
+
+
+def _citas(seed: int, first_id: int, first_mascota: int, n_mascotas: int,
+           first_vet: int, n_vets: int, first_factura: int, start: date, end: date,
+           por_dia: np.ndarray) -> Iterator[tuple]:
+    """
+    Citas en orden cronológico (cita_id crece con fecha_hora). Cada lote de
+    citas va seguido de sus facturas, así no se acumulan en memoria.
+    """
+    rng = _rng(seed, 6)
+    # Algunas mascotas y veterinarios concentran más visitas
+    p_mascota = rng.lognormal(0, 1.0, n_mascotas)
+    p_mascota /= p_mascota.sum()
+    p_vet = rng.gamma(6.0, 1.0, n_vets)
+    p_vet /= p_vet.sum()
+    p_hora = PESO_HORA / PESO_HORA.sum()
+    servicios = list(SERVICIOS)
+    p_servicio = np.array([p for p, _ in SERVICIOS.values()])
+    p_servicio /= p_servicio.sum()
+
+    next_id, next_factura = first_id, first_factura
+    day_bounds = np.concatenate([[0], np.cumsum(por_dia)])
+    # Agrupa días consecutivos hasta completar ~BATCH_SIZE citas por lote
+    chunk, day = 0, 0
+    while day < len(por_dia):
+        last = int(np.searchsorted(day_bounds, day_bounds[day] + BATCH_SIZE, side='right')) - 1
+        last = max(last, day + 1)
+        k = int(day_bounds[last] - day_bounds[day])
+        rng = _rng(seed, 7, chunk)
+        dia = np.repeat(np.arange(day, last), por_dia[day:last])
+        minuto = (8 + rng.choice(len(PESO_HORA), k, p=p_hora)) * 60 + rng.integers(0, 4, k) * 15
+        orden = np.lexsort((minuto, dia))
+        dia, minuto = dia[orden], minuto[orden]
+        mascotas = first_mascota + rng.choice(n_mascotas, k, p=p_mascota)
+        vets = first_vet + rng.choice(n_vets, k, p=p_vet)
+        serv = rng.choice(len(servicios), k, p=p_servicio)
+        motivos = rng.choice(MOTIVOS, k)
+        rows, bill = [], []
+        base = datetime.combine(start, datetime.min.time())
+        for j in range(k):
+            fecha = base + timedelta(days=int(dia[j]), minutes=int(minuto[j]))
+            rows.append((next_id, int(mascotas[j]), int(vets[j]),
+                         fecha.strftime('%Y-%m-%d %H:%M:%S'), servicios[serv[j]],
+                         str(motivos[j])))
+            bill.append((next_id, fecha, int(serv[j])))
+            next_id += 1
+        yield 'vet_cita', rows
+        facturas = _facturas(seed, chunk, next_factura, bill, end)
+        next_factura += len(facturas)
+        yield 'vet_factura', facturas
+        chunk, day = chunk + 1, last
+
+
+def _facturas(seed: int, chunk: int, first_id: int, bill: list, end: date) -> list:
+    """
+    Facturas de un lote de citas: (cita_id, fecha_hora, índice de servicio).
+    Ningún pago queda después de `end` (con --end hoy no hay cobros futuros).
+    """
+    precios = np.array([precio for _, precio in SERVICIOS.values()])
+    rng = _rng(seed, 8, chunk)
+    k = len(bill)
+    facturada = rng.random(k) < P_FACTURADA
+    variacion = rng.lognormal(0, 0.25, k)
+    metodo = rng.choice(METODOS_PAGO, k, p=P_METODO)
+    # La mayoría paga el mismo día; algunas facturas se cobran días después
+    demora = np.where(rng.random(k) < 0.92, rng.integers(20, 120, k),
+                      rng.integers(1, 5, k) * 1440)
+    limite = datetime.combine(end, datetime.max.time()).replace(microsecond=0)
+    rows = []
+    for j in range(k):
+        if not facturada[j]:
+            continue
+        cita_id, fecha, serv = bill[j]
+        monto = precios[serv] * variacion[j] * RECARGO_MES[fecha.month - 1]
+        pago = min(fecha + timedelta(minutes=int(demora[j])), limite)
+        rows.append((first_id + len(rows), cita_id, round(float(monto), 2), str(metodo[j]),
+                     pago.strftime('%Y-%m-%d %H:%M:%S')))
+    return rows
+
+
+def _vacunas(seed: int, first_id: int, first_mascota: int, n_mascotas: int,
+             vacunas: dict, start: date, end: date) -> Iterator[list]:
+    ids = list(vacunas.values())
+    # Vacunas por especie según nombre del catálogo; si no coincide, cualquiera
+    por_especie = {
+        'Perro': [vacunas[v] for v in ('Rabia', 'Parvovirus', 'Moquillo', 'Leptospirosis', 'Bordetella')
+                  if v in vacunas] or ids,
+        'Gato':  [vacunas[v] for v in ('Rabia', 'Triple felina', 'Leucemia felina')
+                  if v in vacunas] or ids,
+    }
+    span = (end - start).days
+    next_id = first_id
+    for chunk, lo, hi in _chunks(n_mascotas):
+        rng = _rng(seed, 9, chunk)
+        # Misma especie que _mascotas(): se regenera con su mismo stream
+        especies = _rng(seed, 4, chunk).choice(ESPECIES, hi - lo, p=P_ESPECIE)
+        cuantas = np.minimum(rng.poisson(1.4, hi - lo), 5)
+        rows = []
+        for j in range(hi - lo):
+            opciones = por_especie.get(str(especies[j]))
+            if not opciones:
+                continue
+            for vacuna_id in rng.choice(opciones, min(int(cuantas[j]), len(opciones)), replace=False):
+                aplicada = start + timedelta(days=int(rng.integers(0, span + 1)))
+                rows.append((next_id, first_mascota + lo + j, int(vacuna_id), aplicada.isoformat(),
+                             (aplicada + timedelta(days=365)).isoformat()))
+                next_id += 1
+        yield rows
+
+
+def reset(conn) -> None:
+    """
+    Borra las filas de las tablas que llena el generador (los dominios
+    quedan), usuarios incluidos. Sólo para bases locales: main() la
+    rechaza con cualquier backend que no sea sqlite.
+    """
+    cur = conn.cursor()
+    try:
+        for table in TABLES:
+            cur.execute(f"DELETE FROM {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    logger.info("Tablas vaciadas: " + ', '.join(TABLES))
+
+
+def generate(conn, citas: int, seed: int = 42, days: int = DEFAULT_DAYS,
+             end: date = None, password: str = None) -> dict:
+    """
+    Genera y escribe todos los datos sintéticos.
+
+    :param conn: conexión DB-API de un backend (paramstyle %s)
+    :param citas: número de citas (1..MAX_CITAS); el resto de tablas se escala
+    :param seed: semilla; mismos parámetros => mismas filas
+    :param days: días de historia hasta `end`
+    :param end: último día con citas (por defecto DEFAULT_END)
+    :param password: contraseña de los usuarios generados; None = una
+                     aleatoria que no se guarda en ningún lado
+    :return: filas insertadas por tabla
+    """
+    sizes = plan(citas, days)
+    password = password or secrets.token_urlsafe(12)
+    end = end or DEFAULT_END
+    start = end - timedelta(days=days - 1)
+    cur = conn.cursor()
+    try:
+        roles = _catalog(cur, "SELECT rol_id, rol_nombre FROM vet_rol")
+        sexos = sorted(_catalog(cur, "SELECT sexo_id, codigo FROM vet_sexo").values())
+        vacunas = _catalog(cur, "SELECT vacuna_id, nombre FROM vet_vacuna")
+        first = {t: _next_id(cur, t, c) for t, c in (
+            ('vet_usuario_sistema', 'user_id'), ('vet_veterinario', 'vet_id'),
+            ('vet_dueno', 'dueno_id'), ('vet_mascota', 'mascota_id'),
+            ('vet_cita', 'cita_id'), ('vet_factura', 'factura_id'),
+            ('vet_vacuna_mascota', 'vacuna_mascota_id'))}
+    finally:
+        cur.close()
+
+    logger.info(f"Generando {citas:,} citas (semilla {seed}, {start} a {end}): {sizes}")
+    t0 = time.perf_counter()
+    written = {}
+    n_vets = sizes['veterinarios']
+    written.update(_bulk_insert(
+        conn, {'vet_veterinario': ('vet_id', 'nombre', 'especialidad')},
+        _each('vet_veterinario', [_veterinarios(seed, first['vet_veterinario'], n_vets)])))
+    written.update(_bulk_insert(
+        conn, {'vet_usuario_sistema': ('user_id', 'usuario', 'pass_hash', 'rol_id')},
+        _each('vet_usuario_sistema', [_usuarios(seed, first['vet_usuario_sistema'], roles,
+                                                n_vets, sizes['recepcionistas'],
+                                                password)])))
+    written.update(_bulk_insert(
+        conn, {'vet_dueno': ('dueno_id', 'nombre', 'telefono', 'correo', 'direccion',
+                             'documento_id')},
+        _each('vet_dueno', _duenos(seed, first['vet_dueno'], sizes['duenos']))))
+    por_dueno = _mascotas_por_dueno(seed, sizes['duenos'])
+    n_mascotas = int(por_dueno.sum())
+    written.update(_bulk_insert(
+        conn, {'vet_mascota': ('mascota_id', 'dueno_id', 'nombre', 'especie', 'raza', 'sexo_id',
+                               'fecha_nac', 'peso_kg', 'color', 'microchip')},
+        _each('vet_mascota', _mascotas(seed, first['vet_mascota'], first['vet_dueno'],
+                                       por_dueno, sexos, end))))
+    written.update(_bulk_insert(
+        conn, {'vet_cita': ('cita_id', 'mascota_id', 'vet_id', 'fecha_hora', 'servicio', 'motivo'),
+               'vet_factura': ('factura_id', 'cita_id', 'monto', 'metodo_pago', 'fecha_pago')},
+        _citas(seed, first['vet_cita'], first['vet_mascota'], n_mascotas,
+               first['vet_veterinario'], n_vets, first['vet_factura'], start, end,
+               _citas_por_dia(seed, citas, start, days))))
+    written.update(_bulk_insert(
+        conn, {'vet_vacuna_mascota': ('vacuna_mascota_id', 'mascota_id', 'vacuna_id',
+                                      'fecha_aplicacion', 'prox_vence')},
+        _each('vet_vacuna_mascota', _vacunas(seed, first['vet_vacuna_mascota'],
+                                             first['vet_mascota'], n_mascotas, vacunas,
+                                             start, end))))
+    logger.info(f"Datos generados en {time.perf_counter() - t0:.1f}s: {written}")
+    return written
+
+
+def _backend_config(name: str, path: str = None) -> dict:
+    """Sección del backend en .streamlit/secrets.toml (si existe) más --path."""
+    import tomllib
+    cfg = {}
+    secrets = os.path.join('.streamlit', 'secrets.toml')
+    if os.path.exists(secrets):
+        with open(secrets, 'rb') as f:
+            cfg = dict(tomllib.load(f).get(name, {}))
+    if path:
+        cfg['path'] = path
+    return cfg
+
+
+def _end_date(value: str) -> date:
+    return date.today() if value == 'hoy' else date.fromisoformat(value)
+
+
+def main() -> None:
+    from backends import BACKENDS, load_backend
+
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--backend', choices=BACKENDS, default='sqlite')
+    ap.add_argument('--path', help='archivo SQLite (backend sqlite)')
+    ap.add_argument('--citas', type=int, default=100_000, help=f'citas a generar (máx. {MAX_CITAS:,})')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--days', type=int, default=DEFAULT_DAYS, help='días de historia')
+    ap.add_argument('--end', type=_end_date,
+                    help=f'último día con citas: AAAA-MM-DD u "hoy" (por defecto {DEFAULT_END}; '
+                         '"hoy" no es reproducible)')
+    ap.add_argument('--reset', action='store_true',
+                    help=f'vaciar las tablas antes de generar (sólo backend {LOCAL_BACKEND})')
+    args = ap.parse_args()
+    local = args.backend == LOCAL_BACKEND
+    if args.reset and not local:
+        ap.error(f"--reset sólo se permite con --backend {LOCAL_BACKEND}: vacía todas "
+                 "las tablas, usuarios incluidos")
+
+    # Fuera de la base local nunca se usa la contraseña publicada
+    password = DEMO_PASSWORD if local else secrets.token_urlsafe(12)
+    backend = load_backend(args.backend, _backend_config(args.backend, args.path))
+    conn = backend.connect()
+    try:
+        if args.reset:
+            reset(conn)
+        written = generate(conn, args.citas, seed=args.seed, days=args.days, end=args.end,
+                           password=password)
+    finally:
+        conn.close()
+    for table, n in written.items():
+        print(f"{table:<22}{n:>12,}")
+    if not local and written.get('vet_usuario_sistema'):
+        print(f"\nContraseña de los usuarios generados (no se vuelve a mostrar): {password}")
+
+
+if __name__ == '__main__':
+    main()
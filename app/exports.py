@@ -0,0 +1,81 @@
+# app/exports.py
+"""
+Exportaciones CSV escritas por fragmentos a un archivo temporal privado.
+
+La consulta se recorre por lotes (common.iter_csv) y cada fragmento va
+directo a disco: mientras se genera, el resultado no se arma entero en
+memoria. El archivo vive en una carpeta temporal del servidor (permisos
+sólo del proceso), fuera de cualquier ruta que Streamlit sirva.
+
+La descarga se entrega con st.download_button, detrás del login de la app,
+y ahí sí el CSV entero pasa a memoria: Streamlit lee el archivo completo
+y lo guarda en su gestor de medios hasta que termina la sesión. Por eso
+cada exportación tiene un tope de tamaño (MAX_BYTES, [exports] max_mb en
+los secrets); si lo supera se descarta y se pide acotar los parámetros.
+"""
+import os
+import tempfile
+import time
+from typing import Iterable
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORTS_DIR = os.path.join(tempfile.gettempdir(), 'vetdb-exports')
+# Restos de exportaciones interrumpidas (el flujo normal las borra al entregarlas)
+MAX_AGE_SECONDS = 3600
+# Tope por exportación: es lo que ocupa en memoria al entregarse
+MAX_BYTES = 50 * 2**20
+
+
+def export_csv(chunks: Iterable[bytes], file_name: str,
+               max_bytes: int = MAX_BYTES) -> tuple[str, int]:
+    """
+    Escribe los fragmentos CSV a un archivo temporal nuevo sin acumularlos
+    en memoria.
+
+    :param chunks: fragmentos de bytes, p.ej. common.iter_csv(...)
+    :param file_name: nombre con el que se descargará (sufijo del temporal)
+    :param max_bytes: tamaño máximo; se corta la consulta al superarlo
+    :return: (ruta del archivo, tamaño en bytes); borrarlo con discard_export()
+    :raises ValueError: si el CSV supera `max_bytes`
+    """
+    purge_exports()
+    os.makedirs(EXPORTS_DIR, mode=0o700, exist_ok=True)
+    # mkstemp crea el archivo con permisos 0600 y nombre impredecible
+    fd, path = tempfile.mkstemp(suffix=f"-{file_name}", dir=EXPORTS_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(
+                        f"El CSV supera el límite de {max_bytes / 2**20:.0f} MB; "
+                        f"acota los parámetros del reporte")
+                f.write(chunk)
+    except Exception:
+        discard_export(path)
+        raise
+    logger.info(f"Exportación {file_name} escrita: {size} bytes")
+    return path, size
+
+
+def discard_export(path: str) -> None:
+    """Borra una exportación ya entregada (o fallida)."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_exports(max_age: float = MAX_AGE_SECONDS) -> int:
+    """Borra las exportaciones con más de `max_age` segundos. Devuelve cuántas."""
+    if not os.path.isdir(EXPORTS_DIR):
+        return 0
+    now, removed = time.time(), 0
+    for entry in os.scandir(EXPORTS_DIR):
+        if entry.is_file() and now - entry.stat().st_mtime > max_age:
+            discard_export(entry.path)
+            removed += 1
+    return removed
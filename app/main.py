@@ -1,24 +1,21 @@
 # app/main.py
+# Sólo dependencias livianas al cargar: pandas, el backend y los CRUD se
+# importan al abrir cada sección, así la pantalla de login se pinta sin
+# esperar a la base de datos (ver startup.py).
+import startup
 import streamlit as st
-import pandas as pd
-import io
+from collections import OrderedDict
+from functools import partial
 
 from auth import login_page
-from common import run_query
-from datetime import datetime, date
-
-from crud.duenos import list_duenos,   create_dueno,   update_dueno,   delete_dueno
-from crud.mascotas import list_mascotas, create_mascota, update_mascota, delete_mascota
-from crud.citas import list_citas,    create_cita,    update_cita,    delete_cita
-from crud.reportes import reporte_vacunas_pendientes, reporte_atendidos_hoy, reporte_ingresos_servicio_mes
-from crud.analisis import reporte_mascotas_hoy, reporte_ingresos_mes
+from startup import lazy_import
 
 
 # Menú principal
 def main_menu():
     # Mapeamos siempre en minúsculas
     opciones_por_rol = {
-        'admin':       ['Dueños', 'Mascotas', 'Citas', 'Facturación', 'Reportes'],
+        'admin':       ['Dueños', 'Mascotas', 'Citas', 'Facturación', 'Reportes', 'Diagnóstico'],
         'recepcion':   ['Dueños', 'Mascotas', 'Citas'],
         'veterinario': ['Mascotas', 'Citas']
     }
@@ -27,597 +24,1043 @@ def main_menu():
     return st.sidebar.radio("Menú", opciones_por_rol.get(rol, []), key="menu")
 
 
-def app():
-
-    # — LOGOUT —
-    # Si ya estabas autenticado, muestra el botón “Cerrar sesión”
-    if st.session_state.get("authenticated"):
-        if st.sidebar.button("🔒 Cerrar sesión"):
-            # limpia toda la info de tu sesión
-            for k in ("authenticated","user","user_id","rol_id","rol_nombre"):
-                st.session_state.pop(k, None)
-            # detenemos la ejecución actual; al volverse a ejecutar,
-            # como ya no hay 'authenticated', caerá en la pantalla de login
-            st.stop()
+@st.fragment
+def _bulk_import(entidad: str, create_many, key: str):
+    """Expander para importar un CSV con una función de alta masiva y ver el reporte por fila."""
+    with st.expander(f"📥 Importar {entidad} desde CSV"):
+        archivo = st.file_uploader("Archivo CSV (una columna por campo)", type="csv",
+                                   key=f"file_{key}")
+        if archivo is not None and st.button("Importar", key=f"btn_import_{key}"):
+            import pandas as pd
+            try:
+                reporte = create_many(pd.read_csv(archivo, dtype=str))
+            except ValueError as ve:
+                st.error(f"Error de validación: {ve}")
+                return
+            except Exception as e:
+                st.error(f"Error inesperado al importar {entidad}. Revisa los logs.")
+                st.write(e)
+                return
+            ok = int(reporte['insertada'].sum())
+            # El listado cambió: se re-ejecuta toda la app con el reporte
+            _flash("success", f"{ok} de {len(reporte)} filas importadas",
+                   reporte[~reporte['insertada']] if ok < len(reporte) else None)
+            st.rerun()
+
+
+def _page_cursor(key: str, *signature) -> str | None:
+    """
+    Cursor de la página actual de un listado (None = primera página).
+    Si cambian el filtro o las filas por página se vuelve a la primera.
+    """
+    state = st.session_state
+    if state.get(f"page_sig_{key}") != signature:
+        state[f"page_sig_{key}"] = signature
+        state[f"page_cursor_{key}"] = None
+    return state.get(f"page_cursor_{key}")
+
+
+def _set_page_cursor(key: str, cursor: str | None):
+    st.session_state[f"page_cursor_{key}"] = cursor
+
+
+def _pager(key: str, df):
+    """
+    "Página X de N · total" y botones Inicio / Anterior / Siguiente con los
+    cursores que devuelve el listado.
+    """
+    prev_cursor = df.attrs.get('prev_cursor')
+    next_cursor = df.attrs.get('next_cursor')
+    page, pages, total = df.attrs.get('page'), df.attrs.get('pages'), df.attrs.get('total')
+    if total is not None:
+        if df.attrs.get('total_exact'):
+            texto = f"Página {page:,} de {pages:,} · {total:,} resultados"
+        else:
+            texto = f"Página {page:,} · más de {total:,} resultados"
+        st.caption(texto.replace(',', '.'))
+    c1, c2, c3 = st.columns(3)
+    c1.button("⏮ Inicio", key=f"page_first_{key}", on_click=_set_page_cursor,
+              args=(key, None), disabled=st.session_state.get(f"page_cursor_{key}") is None)
+    c2.button("◀ Anterior", key=f"page_prev_{key}", on_click=_set_page_cursor,
+              args=(key, prev_cursor), disabled=prev_cursor is None)
+    c3.button("Siguiente ▶", key=f"page_next_{key}", on_click=_set_page_cursor,
+              args=(key, next_cursor), disabled=next_cursor is None)
+
+
+# Selectores con búsqueda: coincidencias por consulta y consultas
+# recientes que guarda cada sesión
+TYPEAHEAD_LIMIT = 20
+TYPEAHEAD_CACHE = 64
+
+
+def _lookup(entity: str, query: str) -> list:
+    """
+    [(id, texto)] de las mejores coincidencias de `query` en el índice de
+    búsqueda. Las consultas recientes se guardan en la sesión (LRU) con la
+    versión del índice en la clave, así un alta/edición/baja las invalida.
+    """
+    from common import get_search_index
+    from search import normalize
+    index = get_search_index()
+    cache = st.session_state.setdefault("typeahead_cache", OrderedDict())
+    key = (entity, normalize(query), index.version(entity))
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    found = [(i, text) for i, text, _ in index.search(entity, query, TYPEAHEAD_LIMIT)]
+    cache[key] = found
+    while len(cache) > TYPEAHEAD_CACHE:
+        cache.popitem(last=False)
+    return found
+
+
+def _picker(label: str, entity: str, key: str, current: int = None, hint: str = ""):
+    """
+    Selector con búsqueda en el servidor: un campo de texto y un selectbox
+    con las TYPEAHEAD_LIMIT mejores coincidencias (ver search.py). La
+    consulta se envía al pulsar Enter o salir del campo, no en cada tecla.
+
+    :param current: ID seleccionado de antemano (edición); se ofrece
+                    aunque no esté entre las coincidencias
+    :return: ID elegido, o None si aún no hay coincidencias
+    """
+    from common import get_search_index
+    query = st.text_input(f"🔎 {label}", key=f"{key}_q", placeholder=hint)
+    options = dict(_lookup(entity, query)) if query else {}
+    if current is not None and current not in options:
+        text = get_search_index().label(entity, current)
+        options = {current: text or "(inactivo)", **options}
+    if not options:
+        st.caption("Escribe al menos 2 letras para buscar." if len(query.strip()) < 2
+                   else "Sin coincidencias.")
+        return None
+    return st.selectbox(label, options=list(options), key=key,
+                        format_func=lambda i: f"{i} – {options[i]}")
+
+
+# Datos de la sesión: cada fragmento (st.fragment) se re-ejecuta solo al
+# tocar sus widgets, y lo que muestra se guarda en st.session_state hasta
+# que un CRUD escribe en alguna de las tablas de las que depende.
+def _fragment_run() -> bool:
+    """True si este rerun es sólo de un fragmento y no de toda la app."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+
+def _session_data(name: str, tables: tuple, loader, *args, key: tuple = ()):
+    """
+    loader(*args) guardado en la sesión bajo `name`. Se vuelve a pedir sólo
+    si cambian los argumentos, `key` (p.ej. la fecha de hoy) o alguna de
+    `tables` recibió una escritura: los CRUD llaman a invalidate_tables y eso
+    cambia su versión (ver cache.QueryCache.versions).
+    """
+    from common import table_versions
+    store = st.session_state.setdefault("session_data", {})
+    signature = (args, key, table_versions(*tables))
+    hit = store.get(name)
+    if hit is not None and hit[0] == signature:
+        return hit[1]
+    value = loader(*args)
+    store[name] = (signature, value)
+    return value
+
+
+# Páginas vecinas pedidas en segundo plano que guarda cada sesión (LRU)
+PREFETCH_PAGES = 8
+
+
+def _prefetched(key: str, tables: tuple, list_fn):
+    """
+    list_fn(limit, cursor, filtro) que primero mira si esa página ya se
+    pidió en segundo plano (ver _prefetch) con las tablas sin cambios.
+    """
+    from common import table_versions
+    store = st.session_state.setdefault("prefetch", OrderedDict())
+
+    def load(limit, cursor, filtro):
+        future = store.pop((key, limit, cursor, filtro, table_versions(*tables)), None)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass    # se reintenta abajo y, si falla, el error se muestra
+        return list_fn(limit, cursor, filtro)
+    return load
+
+
+def _prefetch(key: str, tables: tuple, list_fn, limit: int, filtro: str, df):
+    """
+    Lanza en segundo plano la página siguiente y la anterior de `df` con el
+    mismo filtro, en los hilos de precarga (common.get_prefetch_executor). La clave lleva la versión de las tablas: tras una
+    escritura ya no coincide y esas páginas se descartan.
+    """
+    from common import submit, table_versions
+    store = st.session_state.setdefault("prefetch", OrderedDict())
+    versions = table_versions(*tables)
+    for stale in [k for k in store if k[0] == key and k[-1] != versions]:
+        store.pop(stale).cancel()
+    for cursor in (df.attrs.get('next_cursor'), df.attrs.get('prev_cursor')):
+        if cursor is None:
+            continue
+        page_key = (key, limit, cursor, filtro, versions)
+        if page_key in store:
+            store.move_to_end(page_key)
+        else:
+            store[page_key] = submit(partial(list_fn, limit, cursor, filtro), prefetch=True)
+    while len(store) > PREFETCH_PAGES:
+        store.popitem(last=False)[1].cancel()
+
+
+def _list_page(key: str, list_fn, tables: tuple, filtro: str, limit):
+    """
+    Página actual de un listado (list_duenos, list_mascotas, ...) desde la
+    sesión. La deja en st.session_state[f"page_rows_{key}"] para el panel
+    de edición; si cambió durante un rerun del fragmento (otra página,
+    filtro o datos) se re-ejecuta toda la app para que el panel la vea.
+    Las páginas vecinas se piden por adelantado (ver _prefetch).
+    """
+    st.session_state[f"page_rows_{key}"] = None
+    cursor = _page_cursor(key, filtro, int(limit))
+    df = _session_data(f"list_{key}", tables, _prefetched(key, tables, list_fn),
+                       int(limit), cursor, filtro)
+    token = st.session_state["session_data"][f"list_{key}"][0]
+    changed = st.session_state.get(f"page_token_{key}") != token
+    st.session_state[f"page_token_{key}"] = token
+    st.session_state[f"page_rows_{key}"] = df
+    if changed and _fragment_run():
+        st.rerun()
+    _prefetch(key, tables, list_fn, int(limit), filtro, df)
+    return df
+
+
+def _flash(kind: str, message: str, detail=None):
+    """Mensaje (success/error/...) para mostrar tras el próximo st.rerun()."""
+    st.session_state.setdefault("flash", []).append((kind, message, detail))
+
+
+def _show_flash():
+    for kind, message, detail in st.session_state.pop("flash", []):
+        getattr(st, kind)(message)
+        if detail is not None:
+            st.dataframe(detail)
+
+
+def _warm_up():
+    """
+    Carga pandas y el backend, abre la primera conexión del pool,
+    construye el índice de búsqueda y los agregados de los reportes y
+    arranca el planificador de instantáneas.
+    """
+    with lazy_import('pandas'):
+        import pandas  # noqa: F401
+    with lazy_import('common'):
+        from common import get_connection, get_search_index, get_rollups
+    with get_connection():
+        pass
+    get_search_index().warm('duenos', 'mascotas')
+    get_rollups().warm()
+    with lazy_import('crud.reportes'):
+        import crud.reportes  # noqa: F401
+    from reporting import get_scheduler
+    get_scheduler().start()
+
+
+# === DUEÑOS ===
+DUENO_TABLES = ('vet_dueno',)
+
+
+@st.fragment
+def _duenos_listado():
+    from crud.duenos import list_duenos
+    # 1) Filtros + paginación en el body
+    filtro = st.text_input("🔎 Buscar por nombre, teléfono o documento", key="filter_duenos")
+    limit = st.number_input("Filas a mostrar", min_value=1,
+                            max_value=100, value=5, step=1, key="limit_duenos")
+
+    # 2) Listado
+    try:
+        df = _list_page("duenos", list_duenos, DUENO_TABLES, filtro, limit)
+    except Exception as e:
+        st.error("Error al cargar la lista de dueños. Revisa los logs.")
+        st.write(e)
+        return
+    st.dataframe(df)
+    _pager("duenos", df)
+
+
+@st.fragment
+def _duenos_alta():
+    from crud.duenos import create_dueno
+    # 3) Crear nuevo dueño
+    with st.expander("➕ Agregar nuevo dueño"):
+        nombre = st.text_input("Nombre", key="new_nombre")
+        telefono = st.text_input("Teléfono", key="new_telefono")
+        correo = st.text_input("Correo", key="new_correo")
+        direccion = st.text_input("Dirección", key="new_direccion")
+        documento = st.text_input("Documento ID", key="new_documento")
+
+        if st.button("Crear", key="btn_create_dueno"):
+            try:
+                create_dueno(nombre, telefono, correo,
+                             direccion, documento)
+                # refresca la tabla
+                _flash("success", "Dueño creado exitosamente")
+                st.rerun()
+            except ValueError as ve:
+                st.error(f"Error de validación: {ve}")
+            except Exception as e:
+                st.error(
+                    "Error inesperado al crear dueño. Revisa los logs.")
+                st.write(e)
 
-    # — LOGIN —
-    # Si no estás autenticado, lanzamos la página de login y detenemos
-    if not st.session_state.get("authenticated"):
-        login_page()  # dentro de login_page usas st.stop() si no se autentica
-        st.stop()
 
-    # — TODA LA APP “LOGUEADA” VA A PARTIR DE AQUÍ —
-    st.title(f"Sistema de Gestión Veterinaria — Usuario: {st.session_state['user']}")
-    opcion = main_menu()
+@st.fragment
+def _duenos_edicion():
+    from crud.duenos import update_dueno, delete_dueno
+    # 4) Editar / Eliminar (sobre la página que muestra el listado)
+    df = st.session_state.get("page_rows_duenos")
+    if df is None or df.empty:
+        return
+    selected = st.selectbox(
+        "Selecciona dueño por ID", df["DUENO_ID"].tolist(), key="sel_dueno")
+    if not selected:
+        return
+    row = df[df["DUENO_ID"] == selected].iloc[0]
+    c1, c2 = st.columns(2)
+
+    with c1:
+        upd_nombre = st.text_input(
+            "Nombre", row["NOMBRE"], key="upd_nombre")
+        upd_tel = st.text_input(
+            "Teléfono", row["TELEFONO"], key="upd_tel")
+        upd_correo = st.text_input(
+            "Correo", row["CORREO"], key="upd_correo")
+        upd_dir = st.text_input(
+            "Dirección", row["DIRECCION"], key="upd_dir")
+        upd_doc = st.text_input(
+            "Documento ID", row["DOCUMENTO_ID"], key="upd_doc")
+        if st.button("Actualizar", key="btn_update_dueno"):
+            try:
+                update_dueno(selected, upd_nombre, upd_tel,
+                             upd_correo, upd_dir, upd_doc)
+                _flash("success", "Dueño actualizado")
+                st.rerun()
+            except ValueError as ve:
+                st.error(f"Error de validación: {ve}")
+            except Exception as e:
+                st.error(
+                    "Error inesperado al actualizar dueño. Revisa los logs.")
+                st.write(e)
 
-    # === DUEÑOS ===
-    if opcion == 'Dueños':
-        st.header("🔎 Gestión de Dueños")
+    with c2:
+        if st.button("Eliminar", key="btn_delete_dueno"):
+            try:
+                delete_dueno(selected)
+                _flash("success", "Dueño eliminado (soft-delete)")
+                st.rerun()
+            except Exception as e:
+                st.error("Error al eliminar dueño. Revisa los logs.")
+                st.write(e)
 
-        # 1) Filtros + paginación en el body
-        filtro = st.text_input("🔎 Buscar por nombre", key="filter_duenos")
-        limit = st.number_input("Filas a mostrar", min_value=1,
-                                max_value=100, value=5, step=1, key="limit_duenos")
-        offset = st.number_input("Offset", min_value=0,
-                                 step=1, value=0, key="offset_duenos")
 
-        # 2) Listado
+# === MASCOTAS ===
+MASCOTA_TABLES = ('vet_mascota', 'vet_dueno')
+
+
+def _sexos() -> dict:
+    """Dominio de sexos (memoria compartida del proceso, copia en la sesión)."""
+    from common import get_refdata
+    return _session_data("sexos", ('vet_sexo',), lambda: get_refdata().items('sexos'))
+
+
+@st.fragment
+def _mascotas_listado():
+    from crud.mascotas import list_mascotas
+    # 👉 Filtros y paginación específicos de Mascotas
+    filtro_m = st.text_input(
+        "🔎 Buscar nombre, especie o microchip", key="filter_mascotas")
+    limit_m = st.number_input(
+        "Filas a mostrar", min_value=1, max_value=100, value=5, key="limit_mascotas")
+
+    # 1) Listado de mascotas
+    try:
+        dfm = _list_page("mascotas", list_mascotas, MASCOTA_TABLES, filtro_m, limit_m)
+    except Exception as e:
+        st.error("Error al cargar la lista de mascotas. Revisa los logs.")
+        st.write(e)
+        return
+    # muestra la columna dueno_nombre en lugar de DUENO_ID
+    dfm_viz = dfm.rename(columns={"DUENO_NOMBRE": "Dueño"})
+    # elige el orden y las columnas que aparecen (omite DUENO_ID)
+    cols = [
+        "MASCOTA_ID",
+        "Dueño",
+        "NOMBRE",
+        "ESPECIE",
+        "RAZA",
+        "FECHA_NAC",
+        "PESO_KG",
+        "COLOR",
+        "MICROCHIP"
+    ]
+    st.dataframe(dfm_viz[cols])
+    _pager("mascotas", dfm)
+
+
+@st.fragment
+def _mascotas_alta():
+    from crud.mascotas import create_mascota
+    # 2) Dominios: Sexos; los dueños se buscan con _picker
+    sexo_map = _sexos()
+
+    # 3) Formulario de creación
+    with st.expander("➕ Agregar nueva mascota"):
+        dueno_id = _picker("Dueño", "duenos", "new_dueno",
+                           hint="Nombre, teléfono o documento")
+        nombre = st.text_input("Nombre", key="new_mnombre")
+        especie = st.text_input("Especie", key="new_especie")
+        raza = st.text_input("Raza", key="new_raza")
+        sexo_id = st.selectbox(
+            "Sexo",
+            options=list(sexo_map.keys()),
+            format_func=lambda id: sexo_map[id],
+            key="new_sexo"
+        )
+        fecha_nac = st.date_input(
+            "Fecha de nacimiento", key="new_fecha_nac")
+        peso_kg = st.number_input(
+            "Peso (kg)", min_value=0.0, format="%.2f", key="new_peso")
+        color = st.text_input("Color", key="new_color")
+        microchip = st.text_input("Microchip", key="new_microchip")
+
+    if st.button("Crear", key="btn_create_mascota"):
         try:
-            df = list_duenos(limit=int(limit),
-                             offset=int(offset), filtro=filtro)
-            st.dataframe(df)
+            create_mascota(
+                dueno_id, nombre, especie, raza,
+                sexo_id, fecha_nac.strftime("%Y-%m-%d"),
+                peso_kg, color, microchip
+            )
+            _flash("success", "Mascota creada exitosamente")
+            st.rerun()
+        except ValueError as ve:
+            st.error(f"Error de validación: {ve}")
         except Exception as e:
-            st.error("Error al cargar la lista de dueños. Revisa los logs.")
+            st.error(
+                "Error inesperado al crear mascota. Revisa los logs.")
             st.write(e)
-            return
 
-        # 3) Crear nuevo dueño
-        with st.expander("➕ Agregar nuevo dueño"):
-            nombre = st.text_input("Nombre", key="new_nombre")
-            telefono = st.text_input("Teléfono", key="new_telefono")
-            correo = st.text_input("Correo", key="new_correo")
-            direccion = st.text_input("Dirección", key="new_direccion")
-            documento = st.text_input("Documento ID", key="new_documento")
-
-            if st.button("Crear", key="btn_create_dueno"):
-                dup = run_query(
-                    "SELECT 1 FROM vet_dueno WHERE documento_id = %s", (documento,))
-                if not dup.empty:
-                    st.error("Ya existe un dueño con ese Documento ID")
-                else:
-                    try:
-                        create_dueno(nombre, telefono, correo,
-                                     direccion, documento)
-                        st.success("Dueño creado exitosamente")
-                    except ValueError as ve:
-                        st.error(f"Error de validación: {ve}")
-                    except Exception as e:
-                        st.error(
-                            "Error inesperado al crear dueño. Revisa los logs.")
-                        st.write(e)
-                # refresca la tabla
-                # df = list_duenos(limit=int(limit), offset=int(offset), filtro=filtro)
-                # st.dataframe(df)
-
-        # 4) Editar / Eliminar
-        if not df.empty:
-            selected = st.selectbox(
-                "Selecciona dueño por ID", df["DUENO_ID"].tolist(), key="sel_dueno")
-        if selected:
-            row = df[df["DUENO_ID"] == selected].iloc[0]
-            c1, c2 = st.columns(2)
-
-            with c1:
-                upd_nombre = st.text_input(
-                    "Nombre", row["NOMBRE"], key="upd_nombre")
-                upd_tel = st.text_input(
-                    "Teléfono", row["TELEFONO"], key="upd_tel")
-                upd_correo = st.text_input(
-                    "Correo", row["CORREO"], key="upd_correo")
-                upd_dir = st.text_input(
-                    "Dirección", row["DIRECCION"], key="upd_dir")
-                upd_doc = st.text_input(
-                    "Documento ID", row["DOCUMENTO_ID"], key="upd_doc")
-                if st.button("Actualizar", key="btn_update_dueno"):
-                    try:
-                        update_dueno(selected, upd_nombre, upd_tel,
-                                     upd_correo, upd_dir, upd_doc)
-                        st.success("Dueño actualizado")
-                    except ValueError as ve:
-                        st.error(f"Error de validación: {ve}")
-                    except Exception as e:
-                        st.error(
-                            "Error inesperado al actualizar dueño. Revisa los logs.")
-                        st.write(e)
-                    # df = list_duenos(limit=int(limit), offset=int(offset), filtro=filtro)
-                    # st.dataframe(df)
-
-            with c2:
-                if st.button("Eliminar", key="btn_delete_dueno"):
-                    try:
-                        delete_dueno(selected)
-                        st.success("Dueño eliminado (soft-delete)")
-                    except Exception as e:
-                        st.error("Error al eliminar dueño. Revisa los logs.")
-                        st.write(e)
-                    # df = list_duenos(limit=int(limit), offset=int(offset), filtro=filtro)
-                    # st.dataframe(df)
-
-    # === MASCOTAS ===
-    elif opcion == 'Mascotas':
-        st.header("🐶 Gestión de Mascotas")
 
-        # 👉 Filtros y paginación específicos de Mascotas
-        filtro_m = st.text_input(
-            "🔎 Buscar nombre o especie", key="filter_mascotas")
-        limit_m = st.number_input(
-            "Filas a mostrar", min_value=1, max_value=100, value=5, key="limit_mascotas")
-        offset_m = st.number_input(
-            "Offset", min_value=0, step=1, value=0, key="offset_mascotas")
-        
-        # Pon esto justo antes del bloque de listado de Mascotas (por ejemplo, antes del try:)
-        #st.write("🏷 Contexto actual:", run_query("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA()", None))
-        #st.write("🐾 Total mascotas en tabla base:",
-         #        run_query("SELECT COUNT(*) AS total FROM vet_mascota", None))
-        #st.write("🐾 Total mascotas en la vista activa:",
-                 #run_query("SELECT COUNT(*) AS total FROM vw_mascota_activa", None))
-
-        # 1) Listado de mascotas
+@st.fragment
+def _mascotas_edicion():
+    import pandas as pd
+    from crud.mascotas import update_mascota, delete_mascota
+    # 4) Edición y eliminación
+    dfm = st.session_state.get("page_rows_mascotas")
+    if dfm is None or dfm.empty:
+        return
+    selected_m = st.selectbox(
+        "Selecciona mascota por ID",
+        options=dfm["MASCOTA_ID"].tolist(),
+        key="sel_mascota"
+    )
+    if not selected_m:
+        return
+    rowm = dfm[dfm["MASCOTA_ID"] == selected_m].iloc[0]
+    current_dueno = int(rowm["DUENO_ID"])
+    sexo_map = _sexos()
+    c1, c2 = st.columns(2)
+
+    # — Edición —
+    with c1:
+        upd_dueno = _picker("Dueño", "duenos", "upd_dueno", current=current_dueno,
+                            hint="Nombre, teléfono o documento")
+
+        upd_nombre = st.text_input(
+            "Nombre", rowm["NOMBRE"], key="upd_nombre_m")
+        upd_esp = st.text_input(
+            "Especie", rowm["ESPECIE"], key="upd_especie")
+        upd_raza = st.text_input(
+            "Raza", rowm["RAZA"], key="upd_raza")
+
+        sexo_keys = list(sexo_map.keys())
+        current_sexo = int(rowm["SEXO_ID"])
         try:
-            dfm = list_mascotas(limit=int(limit_m),
-                                offset=int(offset_m), filtro=filtro_m)
-            # muestra la columna dueno_nombre en lugar de DUENO_ID
-            # tras obtener dfm de list_mascotas…
-            # 1) renombra DUENO_NOMBRE → Dueño
-            dfm_viz = dfm.rename(columns={"DUENO_NOMBRE": "Dueño"})
-
-            # 2) elige el orden y las columnas que aparecen (omite DUENO_ID)
-            cols = [
-                "MASCOTA_ID",
-                "Dueño",
-                "NOMBRE",
-                "ESPECIE",
-                "RAZA",
-                "FECHA_NAC",
-                "PESO_KG",
-                "COLOR",
-                "MICROCHIP"
-            ]
-            dfm_viz = dfm_viz[cols]
-
-            # 3) muéstralo
-            st.dataframe(dfm_viz)
+            sexo_idx = sexo_keys.index(current_sexo)
+        except ValueError:
+            sexo_idx = 0
+
+        upd_sexo = st.selectbox(
+            "Sexo",
+            options=sexo_keys,
+            format_func=lambda id: sexo_map[id],
+            index=sexo_idx,
+            key="upd_sexo"
+        )
 
-        except Exception as e:
-            st.error("Error al cargar la lista de mascotas. Revisa los logs.")
-            st.write(e)
-            return
+        upd_fecha = st.date_input(
+            "Fecha de nacimiento",
+            value=pd.to_datetime(rowm["FECHA_NAC"]),
+            key="upd_fecha"
+        )
+        upd_peso = st.number_input(
+            "Peso (kg)",
+            value=float(rowm["PESO_KG"]),
+            format="%.2f",
+            key="upd_peso"
+        )
+        upd_color = st.text_input(
+            "Color", rowm["COLOR"], key="upd_color")
+        upd_chip = st.text_input(
+            "Microchip", rowm["MICROCHIP"], key="upd_chip")
 
-        # 2) Carga dominios: Dueños y Sexos
-        duenos_df = list_duenos(limit=1000, offset=0, filtro=None)
-        dueno_map = duenos_df.set_index("DUENO_ID")["NOMBRE"].to_dict()
-
-        sexos_df = run_query(
-            "SELECT sexo_id, descripcion FROM vet_sexo ORDER BY codigo", None)
-        sexo_map = sexos_df.set_index("SEXO_ID")["DESCRIPCION"].to_dict()
-
-        # 3) Formulario de creación
-        with st.expander("➕ Agregar nueva mascota"):
-            dueno_id = st.selectbox(
-                "Dueño",
-                options=list(dueno_map.keys()),
-                format_func=lambda id: dueno_map[id],
-                key="new_dueno"
-            )
-            nombre = st.text_input("Nombre", key="new_mnombre")
-            especie = st.text_input("Especie", key="new_especie")
-            raza = st.text_input("Raza", key="new_raza")
-            sexo_id = st.selectbox(
-                "Sexo",
-                options=list(sexo_map.keys()),
-                format_func=lambda id: sexo_map[id],
-                key="new_sexo"
-            )
-            fecha_nac = st.date_input(
-                "Fecha de nacimiento", key="new_fecha_nac")
-            peso_kg = st.number_input(
-                "Peso (kg)", min_value=0.0, format="%.2f", key="new_peso")
-            color = st.text_input("Color", key="new_color")
-            microchip = st.text_input("Microchip", key="new_microchip")
-
-        if st.button("Crear", key="btn_create_mascota"):
+        if st.button("Actualizar", key="btn_update_mascota"):
             try:
-                create_mascota(
-                    dueno_id, nombre, especie, raza,
-                    sexo_id, fecha_nac.strftime("%Y-%m-%d"),
-                    peso_kg, color, microchip
+                affected = update_mascota(
+                    selected_m, upd_dueno, upd_nombre, upd_esp, upd_raza,
+                    upd_sexo, upd_fecha.strftime("%Y-%m-%d"),
+                    upd_peso, upd_color, upd_chip
                 )
-                st.success("Mascota creada exitosamente")
+                _flash("success", f"Mascota actualizada ({affected} fila(s))")
+                st.rerun()
             except ValueError as ve:
                 st.error(f"Error de validación: {ve}")
             except Exception as e:
                 st.error(
-                    "Error inesperado al crear mascota. Revisa los logs.")
+                    "Error inesperado al actualizar mascota. Revisa los logs.")
                 st.write(e)
-            # refrescar
-            # dfm = list_mascotas(limit=int(limit_m),
-                # offset=int(offset_m), filtro=filtro_m)
-            # st.dataframe(dfm)
-
-        # 4) Edición y eliminación
-        if not dfm.empty:
-            selected_m = st.selectbox(
-                "Selecciona mascota por ID",
-                options=dfm["MASCOTA_ID"].tolist(),
-                key="sel_mascota"
-            )
-            if selected_m:
-                rowm = dfm[dfm["MASCOTA_ID"] == selected_m].iloc[0]
-                # —> rowm["DUENO_ID"] ahora existe ✔
-                current_dueno = int(rowm["DUENO_ID"])
-                c1, c2 = st.columns(2)
-
-                # — Edición —
-                with c1:
-                    # Nueva versión: casteo explicito a int y fallback a 0 si no lo encuentra
-                    dueno_keys = list(dueno_map.keys())
-                    current_dueno = int(rowm["DUENO_ID"])
-                    try:
-                        sel_idx = dueno_keys.index(current_dueno)
-                    except ValueError:
-                        sel_idx = 0
-
-                    upd_dueno = st.selectbox(
-                        "Dueño",
-                        options=dueno_keys,
-                        format_func=lambda id: dueno_map[id],
-                        index=sel_idx,
-                        key="upd_dueno"
-                    )
-
-                    upd_nombre = st.text_input(
-                        "Nombre", rowm["NOMBRE"], key="upd_nombre_m")
-                    upd_esp = st.text_input(
-                        "Especie", rowm["ESPECIE"], key="upd_especie")
-                    upd_raza = st.text_input(
-                        "Raza", rowm["RAZA"], key="upd_raza")
-
-                    sexo_keys = list(sexo_map.keys())
-                    current_sexo = int(rowm["SEXO_ID"])
-                    try:
-                        sexo_idx = sexo_keys.index(current_sexo)
-                    except ValueError:
-                        sexo_idx = 0
-
-                    upd_sexo = st.selectbox(
-                        "Sexo",
-                        options=sexo_keys,
-                        format_func=lambda id: sexo_map[id],
-                        index=sexo_idx,
-                        key="upd_sexo"
-                    )
-
-                    upd_fecha = st.date_input(
-                        "Fecha de nacimiento",
-                        value=pd.to_datetime(rowm["FECHA_NAC"]),
-                        key="upd_fecha"
-                    )
-                    upd_peso = st.number_input(
-                        "Peso (kg)",
-                        value=float(rowm["PESO_KG"]),
-                        format="%.2f",
-                        key="upd_peso"
-                    )
-                    upd_color = st.text_input(
-                        "Color", rowm["COLOR"], key="upd_color")
-                    upd_chip = st.text_input(
-                        "Microchip", rowm["MICROCHIP"], key="upd_chip")
-
-                    if st.button("Actualizar", key="btn_update_mascota"):
-                        try:
-                            affected = update_mascota(
-                                selected_m, upd_dueno, upd_nombre, upd_esp, upd_raza,
-                                upd_sexo, upd_fecha.strftime("%Y-%m-%d"),
-                                upd_peso, upd_color, upd_chip
-                            )
-                            st.success(
-                                f"Mascota actualizada ({affected} fila(s))")
-                        except ValueError as ve:
-                            st.error(f"Error de validación: {ve}")
-                        except Exception as e:
-                            st.error(
-                                "Error inesperado al actualizar mascota. Revisa los logs.")
-                            st.write(e)
-                        # dfm = list_mascotas(limit=int(limit_m), offset=int(
-                            # offset_m), filtro=filtro_m)
-                        # st.dataframe(dfm)
-
-                # — Eliminación lógica —
-                with c2:
-                    if st.button("Eliminar", key="btn_delete_mascota"):
-                        try:
-                            _ = delete_mascota(selected_m)
-                            st.success("Mascota eliminada (soft-delete)")
-                        except Exception as e:
-                            st.error(
-                                "Error al eliminar mascota. Revisa los logs.")
-                            st.write(e)
-                        # dfm = list_mascotas(limit=int(limit_m), offset=int(
-                            # offset_m), filtro=filtro_m)
-                        # st.dataframe(dfm)
-
-    # === CITAS ===
-    elif opcion == 'Citas':
-        st.header("📅 Gestión de Citas")
 
-        # 🔎 Filtro y paginación en el cuerpo
-        filtro_c = st.text_input(
-            "🔎 Buscar servicio o motivo", key="filter_citas")
-        limit_c = st.number_input(
-            "Filas a mostrar", min_value=1, max_value=100, value=5, key="limit_citas")
-        offset_c = st.number_input(
-            "Offset", min_value=0, step=1, value=0, key="offset_citas")
+    # — Eliminación lógica —
+    with c2:
+        if st.button("Eliminar", key="btn_delete_mascota"):
+            try:
+                _ = delete_mascota(selected_m)
+                _flash("success", "Mascota eliminada (soft-delete)")
+                st.rerun()
+            except Exception as e:
+                st.error(
+                    "Error al eliminar mascota. Revisa los logs.")
+                st.write(e)
 
-        # 1) Listado de citas
-        try:
-            dfc = list_citas(limit=int(limit_c), offset=int(
-                offset_c), filtro=filtro_c)
-
-            # 1) DataFrame crudo (contiene todos los IDs para la edición)
-            dfc = list_citas(limit=int(limit_c), offset=int(
-                offset_c), filtro=filtro_c)
-
-            # 2) DataFrame de vista: renombramos y ocultamos los IDs
-            dfc_viz = (
-                dfc
-                .rename(columns={
-                    "MASCOTA_NOMBRE":     "Mascota",
-                    "VETERINARIO_NOMBRE": "Veterinario",
-                    "FECHA_HORA":         "Fecha & Hora"
-                })
-                .loc[:, [
-                    "CITA_ID",
-                    "Mascota",
-                    "Veterinario",
-                    "Fecha & Hora",
-                    "SERVICIO",
-                    "MOTIVO"
-                ]]
-            )
 
-            # 3) Mostramos solo la vista limpia
-            st.dataframe(dfc_viz)
+# === CITAS ===
+CITA_TABLES = ('vet_cita', 'vet_mascota', 'vet_veterinario')
+
+
+def _veterinarios() -> dict:
+    """Veterinarios por nombre (memoria compartida del proceso; son pocos)."""
+    from common import get_refdata
+    return _session_data("vets", ('vet_veterinario',), lambda: dict(
+        sorted(get_refdata().items('vets').items(), key=lambda kv: kv[1])))
+
+
+@st.fragment
+def _citas_listado():
+    from crud.citas import list_citas
+    # 🔎 Filtro y paginación en el cuerpo
+    filtro_c = st.text_input(
+        "🔎 Buscar servicio o motivo", key="filter_citas")
+    limit_c = st.number_input(
+        "Filas a mostrar", min_value=1, max_value=100, value=5, key="limit_citas")
+
+    # 1) Listado de citas (DataFrame crudo: contiene todos los IDs para la edición)
+    try:
+        dfc = _list_page("citas", list_citas, CITA_TABLES, filtro_c, limit_c)
+    except Exception as e:
+        st.error("Error al cargar la lista de citas. Revisa los logs.")
+        st.write(e)
+        return
+
+    # 2) DataFrame de vista: renombramos y ocultamos los IDs
+    dfc_viz = (
+        dfc
+        .rename(columns={
+            "MASCOTA_NOMBRE":     "Mascota",
+            "VETERINARIO_NOMBRE": "Veterinario",
+            "FECHA_HORA":         "Fecha & Hora"
+        })
+        .loc[:, [
+            "CITA_ID",
+            "Mascota",
+            "Veterinario",
+            "Fecha & Hora",
+            "SERVICIO",
+            "MOTIVO"
+        ]]
+    )
+
+    # 3) Mostramos solo la vista limpia
+    st.dataframe(dfc_viz)
+    _pager("citas", dfc)
+
+
+@st.fragment
+def _citas_alta():
+    from crud.citas import create_cita
+    vet_map = _veterinarios()
+
+    # Formulario de creación; las mascotas se buscan con _picker
+    with st.expander("➕ Agregar nueva cita"):
+        mascota_id = _picker("Mascota", "mascotas", "new_mascota",
+                             hint="Nombre, especie o microchip")
+        vet_id = st.selectbox(
+            "Veterinario",
+            options=list(vet_map.keys()),
+            format_func=lambda i: f"{i} – {vet_map[i]}",
+            key="new_vet"
+        )
+        fecha_hora = st.date_input("Fecha", key="new_fecha") \
+            .strftime("%Y-%m-%d") + " " + \
+            st.time_input("Hora", key="new_hora").strftime("%H:%M:%S")
+        servicio = st.text_input("Servicio", key="new_servicio")
+        motivo = st.text_input("Motivo",   key="new_motivo")
 
-        except Exception as e:
-            st.error("Error al cargar la lista de citas. Revisa los logs.")
-            st.write(e)
-            return
+        if st.button("Crear", key="btn_create_cita"):
+            try:
+                create_cita(mascota_id, vet_id,
+                            fecha_hora, servicio, motivo)
+                _flash("success", "Cita creada exitosamente")
+                st.rerun()
+            except ValueError as ve:
+                st.error(f"Error de validación: {ve}")
+            except Exception as e:
+                st.error("Error inesperado al crear cita. Revisa los logs.")
+                st.write(e)
 
-        # 2) Carga dominios: Mascotas y Veterinarios
-        masc_df = list_mascotas(limit=1000, offset=0, filtro=None)
-        masc_map = masc_df.set_index("MASCOTA_ID")["NOMBRE"].to_dict()
 
-        vets_df = run_query(
-            "SELECT vet_id, nombre FROM vw_veterinario_activo ORDER BY nombre", None
+@st.fragment
+def _citas_edicion():
+    import pandas as pd
+    from crud.citas import update_cita, delete_cita
+    # Edición y eliminación
+    dfc = st.session_state.get("page_rows_citas")
+    if dfc is None or dfc.empty:
+        return
+    selected_c = st.selectbox(
+        "Selecciona cita por ID",
+        options=dfc["CITA_ID"].tolist(),
+        key="sel_cita"
+    )
+    if not selected_c:
+        return
+    rowc = dfc[dfc["CITA_ID"] == selected_c].iloc[0]
+    vet_map = _veterinarios()
+    c1, c2 = st.columns(2)
+
+    # — Edición —
+    with c1:
+        # Mascota
+        upd_mascota = _picker("Mascota", "mascotas", "upd_mascota",
+                              current=int(rowc["MASCOTA_ID"]),
+                              hint="Nombre, especie o microchip")
+        # Veterinario
+        vet_keys = list(vet_map.keys())
+        cur_v = int(rowc["VET_ID"])
+        idx_v = vet_keys.index(cur_v) if cur_v in vet_keys else 0
+        upd_vet = st.selectbox(
+            "Veterinario",
+            options=vet_keys,
+            format_func=lambda i: f"{i} – {vet_map[i]}",
+            index=idx_v,
+            key="upd_vet"
         )
-        vet_map = vets_df.set_index("VET_ID")["NOMBRE"].to_dict()
-
-        # 3) Formulario de creación
-        with st.expander("➕ Agregar nueva cita"):
-            mascota_id = st.selectbox(
-                "Mascota",
-                options=list(masc_map.keys()),
-                format_func=lambda i: f"{i} – {masc_map[i]}",
-                key="new_mascota"
-            )
-            vet_id = st.selectbox(
-                "Veterinario",
-                options=list(vet_map.keys()),
-                format_func=lambda i: f"{i} – {vet_map[i]}",
-                key="new_vet"
-            )
-            fecha_hora = st.date_input("Fecha", key="new_fecha") \
-                .strftime("%Y-%m-%d") + " " + \
-                st.time_input("Hora", key="new_hora").strftime("%H:%M:%S")
-            servicio = st.text_input("Servicio", key="new_servicio")
-            motivo = st.text_input("Motivo",   key="new_motivo")
+        # Fecha y hora
+        fecha_val = pd.to_datetime(rowc["FECHA_HORA"])
+        upd_fecha = st.date_input(
+            "Fecha", value=fecha_val.date(), key="upd_fecha")
+        upd_hora = st.time_input(
+            "Hora",   value=fecha_val.time(),   key="upd_hora")
+        # Combina
+        upd_fh = upd_fecha.strftime(
+            "%Y-%m-%d") + " " + upd_hora.strftime("%H:%M:%S")
+
+        upd_servicio = st.text_input(
+            "Servicio", rowc["SERVICIO"], key="upd_servicio")
+        upd_motivo = st.text_input(
+            "Motivo",   rowc["MOTIVO"],   key="upd_motivo")
+
+        if st.button("Actualizar", key="btn_update_cita"):
+            try:
+                affected = update_cita(
+                    selected_c,
+                    upd_mascota,
+                    upd_vet,
+                    upd_fh,
+                    upd_servicio,
+                    upd_motivo
+                )
+                _flash("success", f"Cita actualizada ({affected} fila(s))")
+                st.rerun()
+            except ValueError as ve:
+                st.error(f"Error de validación: {ve}")
+            except Exception as e:
+                st.error(
+                    "Error inesperado al actualizar cita. Revisa los logs.")
+                st.write(e)
 
-            if st.button("Crear", key="btn_create_cita"):
-                try:
-                    create_cita(mascota_id, vet_id,
-                                fecha_hora, servicio, motivo)
-                    st.success("Cita creada exitosamente")
-                except ValueError as ve:
-                    st.error(f"Error de validación: {ve}")
-                except Exception as e:
-                    st.error("Error inesperado al crear cita. Revisa los logs.")
-                    st.write(e)
-                # dfc = list_citas(limit=int(limit_c), offset=int(
-                    # offset_c), filtro=filtro_c)
-                # st.dataframe(dfc)
-
-        # 4) Edición y eliminación
-        if not dfc.empty:
-            selected_c = st.selectbox(
-                "Selecciona cita por ID",
-                options=dfc["CITA_ID"].tolist(),
-                key="sel_cita"
-            )
-            if selected_c:
-                rowc = dfc[dfc["CITA_ID"] == selected_c].iloc[0]
-                c1, c2 = st.columns(2)
-
-                # — Edición —
-                with c1:
-                    # Mascota
-                    masc_keys = list(masc_map.keys())
-                    cur_m = int(rowc["MASCOTA_ID"])
-                    idx_m = masc_keys.index(cur_m) if cur_m in masc_keys else 0
-                    upd_mascota = st.selectbox(
-                        "Mascota",
-                        options=masc_keys,
-                        format_func=lambda i: f"{i} – {masc_map[i]}",
-                        index=idx_m,
-                        key="upd_mascota"
-                    )
-                    # Veterinario
-                    vet_keys = list(vet_map.keys())
-                    cur_v = int(rowc["VET_ID"])
-                    idx_v = vet_keys.index(cur_v) if cur_v in vet_keys else 0
-                    upd_vet = st.selectbox(
-                        "Veterinario",
-                        options=vet_keys,
-                        format_func=lambda i: f"{i} – {vet_map[i]}",
-                        index=idx_v,
-                        key="upd_vet"
-                    )
-                    # Fecha y hora
-                    fecha_val = pd.to_datetime(rowc["FECHA_HORA"])
-                    upd_fecha = st.date_input(
-                        "Fecha", value=fecha_val.date(), key="upd_fecha")
-                    upd_hora = st.time_input(
-                        "Hora",   value=fecha_val.time(),   key="upd_hora")
-                    # Combina
-                    upd_fh = upd_fecha.strftime(
-                        "%Y-%m-%d") + " " + upd_hora.strftime("%H:%M:%S")
-
-                    upd_servicio = st.text_input(
-                        "Servicio", rowc["SERVICIO"], key="upd_servicio")
-                    upd_motivo = st.text_input(
-                        "Motivo",   rowc["MOTIVO"],   key="upd_motivo")
-
-                    if st.button("Actualizar", key="btn_update_cita"):
-                        try:
-                            affected = update_cita(
-                                selected_c,
-                                upd_mascota,
-                                upd_vet,
-                                upd_fh,
-                                upd_servicio,
-                                upd_motivo
-                            )
-                            st.success(
-                                f"Cita actualizada ({affected} fila(s))")
-                        except ValueError as ve:
-                            st.error(f"Error de validación: {ve}")
-                        except Exception as e:
-                            st.error(
-                                "Error inesperado al actualizar cita. Revisa los logs.")
-                            st.write(e)
-                        # dfc = list_citas(limit=int(limit_c), offset=int(
-                            # offset_c), filtro=filtro_c)
-                        # st.dataframe(dfc)
-
-                # — Eliminación lógica —
-                with c2:
-                    if st.button("Eliminar", key="btn_delete_cita"):
-                        try:
-                            cnt = delete_cita(selected_c)
-                            st.success(f"Cita eliminada ({cnt} fila(s))")
-                        except Exception as e:
-                            st.error(
-                                "Error al eliminar cita. Revisa los logs.")
-                            st.write(e)
-                        # dfc = list_citas(limit=int(limit_c), offset=int(
-                            # offset_c), filtro=filtro_c)
-                        # st.dataframe(dfc)
+    # — Eliminación lógica —
+    with c2:
+        if st.button("Eliminar", key="btn_delete_cita"):
+            try:
+                cnt = delete_cita(selected_c)
+                _flash("success", f"Cita eliminada ({cnt} fila(s))")
+                st.rerun()
+            except ValueError as ve:
+                st.error(str(ve))
+            except Exception as e:
+                st.error(
+                    "Error al eliminar cita. Revisa los logs.")
+                st.write(e)
 
-    elif opcion == 'Facturación':
-        st.header("💳 Gestión de Facturas")
 
-        # filtros / paginación
-        filtro_f = st.text_input("🔎 Buscar método de pago", key="filter_facturas")
-        limit_f = st.number_input("Filas a mostrar", 1, 100, 5, key="limit_facturas")
-        offset_f = st.number_input("Offset", 0, step=1, key="offset_facturas")
+# === FACTURACIÓN ===
+FACTURA_TABLES = ('vet_factura',)
 
+
+@st.fragment
+def _facturas_listado():
+    from crud.facturas import list_facturas
+    # filtros / paginación
+    filtro_f = st.text_input("🔎 Buscar método de pago", key="filter_facturas")
+    limit_f = st.number_input("Filas a mostrar", 1, 100, 5, key="limit_facturas")
+
+    try:
+        dff = _list_page("facturas", list_facturas, FACTURA_TABLES, filtro_f, limit_f)
+    except Exception as e:
+        st.error("Error al cargar facturas")
+        st.write(e)
+        return
+
+    st.dataframe(dff)
+    _pager("facturas", dff)
+
+
+@st.fragment
+def _facturas_alta():
+    from crud.facturas import create_factura
+    with st.expander("➕ Nueva factura"):
+        cita = st.number_input("ID de cita", min_value=1, key="new_cita")
+        monto = st.number_input("Monto", min_value=0.0, format="%.2f", key="new_monto")
+        metodo = st.text_input("Método de pago", key="new_metodo")
+        if st.button("Crear", key="btn_create_factura"):
+            try:
+                create_factura(cita, monto, metodo)
+                _flash("success", "Factura creada")
+                st.rerun()
+            except Exception as e:
+                st.error("No se pudo crear")
+                st.write(e)
+
+
+@st.fragment
+def _facturas_baja():
+    from crud.facturas import delete_factura
+    dff = st.session_state.get("page_rows_facturas")
+    if dff is None or dff.empty:
+        return
+    sel = st.selectbox("Selecciona factura",
+                       dff["FACTURA_ID"], key="sel_factura")
+    if st.button("Eliminar", key="btn_delete_factura"):
         try:
-            dff = list_facturas(limit=int(limit_f), offset=int(offset_f), filtro=filtro_f)
+            cnt = delete_factura(sel)
+            _flash("success", f"Facturas eliminadas: {cnt}")
+            st.rerun()
         except Exception as e:
-            st.error("Error al cargar facturas")
+            st.error("Error al eliminar")
             st.write(e)
-            return
 
-        st.dataframe(dff)
 
-        with st.expander("➕ Nueva factura"):
-            cita = st.number_input("ID de cita", min_value=1, key="new_cita")
-            monto = st.number_input("Monto", min_value=0.0, format="%.2f", key="new_monto")
-            metodo = st.text_input("Método de pago", key="new_metodo")
-            if st.button("Crear", key="btn_create_factura"):
-                try:
-                    create_factura(cita, monto, metodo)
-                    st.success("Factura creada")
-                except Exception as e:
-                    st.error("No se pudo crear")
-                    st.write(e)
-                dff = list_facturas(limit=int(limit_f),
-                                offset=int(offset_f), filtro=filtro_f)
-                st.dataframe(dff)
-
-        if not dff.empty:
-            sel = st.selectbox("Selecciona factura",
-                           dff["FACTURA_ID"], key="sel_factura")
-        if st.button("Eliminar", key="btn_delete_factura"):
+# === REPORTES ===
+# Panel de la mañana: reportes del registro (crud/reportes.py) que se piden
+# en paralelo; cada tarjeta se pinta al llegar. El fragmento se re-ejecuta
+# cada PANEL_TICK segundos y sólo vuelve a pedir las tarjetas cuyo ttl pasó
+# o cuyas tablas cambiaron.
+PANEL_TICK = 60
+PANEL_REPORTS = ('mascotas_hoy', 'ingresos_mes', 'atendidos_hoy',
+                 'ingresos_servicio_mes', 'vacunas_pendientes')
+
+
+def _report_params(report) -> dict:
+    """Widgets de los parámetros de un reporte registrado; devuelve sus valores."""
+    from datetime import date
+    values = {}
+    for col, p in zip(st.columns(max(len(report.params), 1)), report.params):
+        key = f"rep_{report.key}_{p.name}"
+        default = p.default() if p.default else None
+        if p.options:
+            options = list(p.options)
+            values[p.name] = col.selectbox(p.label, options, key=key, format_func=p.options.get,
+                                           index=options.index(default) if default in options else 0)
+        elif p.kind is date:
+            values[p.name] = col.date_input(p.label, value=default, key=key)
+        else:
+            values[p.name] = int(col.number_input(p.label, value=default, min_value=p.min_value,
+                                                  max_value=p.max_value, step=1, key=key))
+    return values
+
+
+def _render_report(report, df, limit: int = None, compact: bool = False):
+    """Gráfico y tabla de un reporte según su declaración (chart, x, y, columns)."""
+    import pandas as pd
+    taken = df.attrs.get('snapshot')
+    if df.attrs.get('offline'):
+        st.warning(f"Sin conexión con la base: datos de las {taken:%H:%M} del {taken:%d/%m}.")
+    elif taken is not None:
+        st.caption(f"Instantánea de las {taken:%H:%M}")
+    if report.chart == 'metric':
+        value = df.at[0, report.y] if len(df) else None
+        if value is None or pd.isna(value):
+            value = "—"
+        elif isinstance(value, float):
+            value = f"{value:,.2f}"
+        st.metric(report.columns[report.y], value)
+        return
+    if report.chart in ('bar', 'line') and len(df):
+        chart = st.bar_chart if report.chart == 'bar' else st.line_chart
+        chart(df.set_index(report.x)[report.y], x_label=report.columns[report.x],
+              y_label=report.columns[report.y], height=250 if compact else None)
+        if compact:
+            return
+    if limit is not None and len(df) >= limit:
+        st.caption(f"Vista previa (primeras {limit} filas)")
+    st.dataframe(df.rename(columns=report.columns), hide_index=True,
+                 height=220 if compact else None)
+
+
+@st.fragment(run_every=PANEL_TICK)
+def _panel():
+    """
+    Panel de la mañana: lanza a la vez los reportes de las tarjetas que no
+    están en la sesión (o vencieron) y pinta cada una en cuanto llega, así
+    el panel tarda lo que el reporte más lento.
+    """
+    import time
+    from concurrent.futures import as_completed
+    from datetime import date
+    from common import submit, table_versions
+    from reporting import REPORTS, run_report
+    store = st.session_state.setdefault("panel", {})
+    now = time.monotonic()
+
+    cols = st.columns(2)
+    slots, pending = {}, {}
+    for i, key in enumerate(PANEL_REPORTS):
+        report = REPORTS[key]
+        box = cols[i % 2].container(border=True)
+        box.markdown(f"**{report.title}**")
+        slots[key] = box.empty()
+        signature = (date.today(), table_versions(*report.depends_on()))
+        hit = store.get(key)
+        if hit is not None and hit[0] == signature and now - hit[1] < report.ttl:
+            with slots[key].container():
+                _render_report(report, hit[2], report.preview, compact=True)
+            continue
+        slots[key].caption("Cargando…")
+        pending[submit(partial(run_report, key, None, report.preview))] = (key, signature)
+
+    for future in as_completed(pending):
+        key, signature = pending[future]
+        report = REPORTS[key]
+        with slots[key].container():
             try:
-                cnt = delete_factura(sel)
-                st.success(f"Facturas eliminadas: {cnt}")
+                df = future.result()
+            except Exception as e:
+                st.error("Error al cargar el reporte. Revisa los logs.")
+                st.write(e)
+                continue
+            store[key] = (signature, now, df)
+            _render_report(report, df, report.preview, compact=True)
+
+
+@st.fragment
+def _reportes():
+    """Cualquier reporte del registro: parámetros, gráfico, tabla y CSV."""
+    from reporting import REPORTS, run_report, export_csv_rows
+    from common import config
+    from exports import MAX_BYTES, export_csv, discard_export
+
+    key = st.selectbox("Seleccione reporte", list(REPORTS), key="rep_tipo",
+                       format_func=lambda k: REPORTS[k].title)
+    report = REPORTS[key]
+    params = _report_params(report)
+    # Resultado compartido entre sesiones (caché de consultas, ver reporting.py)
+    try:
+        df = run_report(key, params, report.preview)
+    except ValueError as ve:
+        st.error(str(ve))
+        return
+    _render_report(report, df, report.preview)
+
+    if report.csv:
+        # El CSV completo se escribe por lotes a un temporal privado y se
+        # entrega con download_button, detrás del login. download_button lo
+        # lee entero a memoria: de ahí el tope de tamaño ([exports] max_mb).
+        if st.button("Generar CSV", key=f"btn_csv_{key}"):
+            try:
+                max_mb = float(config('exports').get('max_mb', MAX_BYTES / 2**20))
+                path, size = export_csv(export_csv_rows(key, params), f"{key}.csv",
+                                        max_bytes=int(max_mb * 2**20))
+                try:
+                    with open(path, 'rb') as f:
+                        st.download_button(f"⬇️ Descargar CSV ({size / 2**20:.1f} MB)", f,
+                                           file_name=f"{key}.csv", mime="text/csv",
+                                           key=f"dl_csv_{key}", on_click="ignore")
+                finally:
+                    discard_export(path)
+            except ValueError as ve:
+                st.error(str(ve))
             except Exception as e:
-                st.error("Error al eliminar")
+                st.error("Error al generar el CSV. Revisa los logs.")
                 st.write(e)
-            dff = list_facturas(limit=int(limit_f),
-                                offset=int(offset_f), filtro=filtro_f)
-            st.dataframe(dff)
 
-    # === REPORTES ===
+
+def app():
+    # — LOGOUT —
+    # Si ya estabas autenticado, muestra el botón “Cerrar sesión”
+    if st.session_state.get("authenticated"):
+        if st.sidebar.button("🔒 Cerrar sesión"):
+            # limpia toda la info de tu sesión
+            for k in ("authenticated","user","user_id","rol_id","rol_nombre",
+                      "session_data", "prefetch"):
+                st.session_state.pop(k, None)
+            from common import get_metrics
+            get_metrics().end_session()
+            # detenemos la ejecución actual; al volverse a ejecutar,
+            # como ya no hay 'authenticated', caerá en la pantalla de login
+            st.stop()
+
+    # — LOGIN —
+    # Si no estás autenticado, lanzamos la página de login y detenemos
+    if not st.session_state.get("authenticated"):
+        # El formulario ya está pintado cuando arranca el calentamiento
+        login_page(on_render=partial(startup.warm_up, _warm_up))
+        st.stop()
+
+    # — TODA LA APP “LOGUEADA” VA A PARTIR DE AQUÍ —
+    with lazy_import('pandas'):
+        import pandas as pd
+    with lazy_import('common'):
+        from common import (get_metrics, get_refdata, get_search_index, get_rollups,
+                            pool_stats, cache_stats)
+    get_metrics().begin_rerun()
+
+    st.title(f"Sistema de Gestión Veterinaria — Usuario: {st.session_state['user']}")
+    opcion = main_menu()
+
+    # Cada sección es un grupo de fragmentos (listado, alta, edición): un
+    # widget sólo re-ejecuta su fragmento y los datos salen de la sesión.
+    if opcion == 'Dueños':
+        with lazy_import('crud.duenos'):
+            from crud.duenos import create_duenos
+        st.header("🔎 Gestión de Dueños")
+        _show_flash()
+        _duenos_listado()
+        _duenos_alta()
+        _bulk_import("dueños", create_duenos, "duenos")
+        _duenos_edicion()
+
+    elif opcion == 'Mascotas':
+        with lazy_import('crud.mascotas'):
+            from crud.mascotas import create_mascotas
+        st.header("🐶 Gestión de Mascotas")
+        _show_flash()
+        _mascotas_listado()
+        _mascotas_alta()
+        _bulk_import("mascotas", create_mascotas, "mascotas")
+        _mascotas_edicion()
+
+    elif opcion == 'Citas':
+        with lazy_import('crud.citas'):
+            from crud.citas import create_citas
+        st.header("📅 Gestión de Citas")
+        _show_flash()
+        _citas_listado()
+        _citas_alta()
+        _bulk_import("citas", create_citas, "citas")
+        _citas_edicion()
+
+    elif opcion == 'Facturación':
+        with lazy_import('crud.facturas'):
+            import crud.facturas  # noqa: F401
+        st.header("💳 Gestión de Facturas")
+        _show_flash()
+        _facturas_listado()
+        _facturas_alta()
+        _facturas_baja()
+
     elif opcion == 'Reportes':
+        with lazy_import('crud.reportes'):
+            import crud.reportes  # noqa: F401
+        with lazy_import('crud.analisis'):
+            import crud.analisis  # noqa: F401
+        with lazy_import('exports'):
+            import exports  # noqa: F401
         st.header("📊 Reportes")
-
-        tipo = st.selectbox("Seleccione reporte", [
-            "Atendidos Hoy",
-            "Ingresos por Servicio (Mes)",
-            "Vacunas Pendientes"
-        ], key="rep_tipo")
-
-        if tipo == "Atendidos Hoy":
-            df = reporte_atendidos_hoy()
-
-            # — Debug: muestro qué columnas llegó a traer —
-            # st.write("👉 Columnas originales:", df.columns.tolist())
-
-            # 2) Normalizo columnas a minúsculas
-            df.columns = df.columns.str.lower()  # -> ahora tengo 'veterinario' y 'atendidos'
-
-            # — Debug: confirmo renombrado —
-            # st.write("👉 Columnas renombradas:", df.columns.tolist())
-
-            st.table(df)
-            st.bar_chart(df.set_index("veterinario")["atendidos"])
-
-        elif tipo == "Ingresos por Servicio (Mes)":
-            col1, col2 = st.columns(2)
-            with col1:
-                year = st.number_input("Año",  value=datetime.now(
-                ).year, min_value=2000, max_value=2100, key="rep_year")
-                month = st.number_input("Mes",  value=datetime.now(
-                ).month, min_value=1, max_value=12, key="rep_month")
-            if st.button("Generar"):
-                df = reporte_ingresos_servicio_mes(year, month)
-                df.columns = df.columns.str.lower()
-                st.table(df)
-                st.line_chart(df.set_index("servicio")["total"])
-
-        else:  # Vacunas Pendientes
-            df = reporte_vacunas_pendientes()
-            df.columns = df.columns.str.lower()
-            st.table(df)
-            csv = df.to_csv(index=False).encode()
-            st.download_button(
-                "⬇️ Descargar CSV",
-                data=csv,
-                file_name="vacunas_pendientes.csv",
-                mime="text/csv"
-            )
+        _panel()
+        st.divider()
+        _reportes()
+
+    # === DIAGNÓSTICO (sólo admin) ===
+    elif opcion == 'Diagnóstico':
+        st.header("🩺 Diagnóstico de consultas")
+        metrics = get_metrics()
+
+        reruns = metrics.reruns()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Consultas (último rerun)", reruns['last'])
+        c2.metric("Promedio por rerun", reruns['avg'])
+        c3.metric("p95 por rerun", reruns['p95'])
+        c4.metric("Reruns medidos", reruns['reruns'])
+
+        st.subheader("Latencia por consulta (ms)")
+        st.dataframe(pd.DataFrame(metrics.summary()))
+
+        st.subheader("Consultas recientes más lentas")
+        slow = pd.DataFrame(metrics.slowest(20))
+        if not slow.empty:
+            slow['ts'] = pd.to_datetime(slow['ts'], unit='s')
+        st.dataframe(slow)
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.subheader("Pool de conexiones")
+            st.json(pool_stats())
+        with c2:
+            st.subheader("Caché de consultas")
+            st.json(cache_stats())
+
+        st.subheader("Datos de referencia (selectbox)")
+        st.json(get_refdata().stats())
+
+        st.subheader("Índice de búsqueda")
+        st.json(get_search_index().stats())
+
+        st.subheader("Agregados de reportes")
+        st.json(get_rollups().stats())
+
+        st.subheader("Instantáneas de reportes")
+        with lazy_import('crud.reportes'):
+            import crud.reportes  # noqa: F401
+        from reporting import get_scheduler
+        scheduler = get_scheduler()
+        st.json(scheduler.stats())
+        st.dataframe(pd.DataFrame(scheduler.store.stats()), hide_index=True)
+        if st.button("Actualizar instantáneas ahora", key="btn_snapshots"):
+            for key in scheduler.schedules:
+                scheduler.run(key)
+            st.success("Instantáneas actualizadas")
+
+        st.subheader("Arranque del proceso")
+        st.json(startup.report())
+
+        if st.button("Reiniciar métricas", key="btn_reset_metrics"):
+            metrics.reset()
+            st.success("Métricas reiniciadas")
 
 
 if __name__ == '__main__':
-    app()
+    try:
+        app()
+    finally:
+        # st.stop() también pasa por aquí: la pantalla de login cuenta
+        startup.first_paint()
@@ -0,0 +1,312 @@
+# app/metrics.py
+"""
+Instrumentación de consultas: latencia, filas y query ID por sentencia.
+
+Las conexiones que entrega common.get_connection() van envueltas en
+InstrumentedConnection; cada cursor mide su execute() más los fetch*()
+posteriores y, al cerrarse o re-ejecutarse, registra la sentencia en
+QueryMetrics con la etiqueta de la función que la lanzó (list_citas,
+create_mascota, ...). QueryMetrics guarda ventanas móviles en
+memoria para calcular percentiles por etiqueta.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Módulos de infraestructura que no cuentan como "quién lanzó la consulta":
+# la etiqueta es la función de crud/ o de la UI que los usa (bulk.insert_rows
+# desde create_citas cuenta como create_citas). Las cargas propias
+# de refdata, search, rollups y los reportes SQL ya pasan su etiqueta a run_query.
+_SKIP_MODULES = ('common', 'metrics', 'pool', 'cache', 'paging', 'bulk', 'refdata',
+                 'search', 'rollups', 'reporting', 'snapshots', 'timeseries',
+                 'contextlib', 'functools', 'threading', 'concurrent.futures.thread')
+
+_local = threading.local()
+
+
+@contextmanager
+def tagged(tag: str, fallback: bool = False):
+    """
+    Fuerza la etiqueta de las consultas ejecutadas dentro del bloque (None
+    deja la que hubiera).
+
+    :param fallback: usarla sólo si en la pila no hay ninguna función fuera
+                     de la infraestructura; así common.submit() pasa a sus
+                     hilos la etiqueta de quien lanzó la tarea
+    """
+    attr = 'fallback' if fallback else 'tag'
+    previous = getattr(_local, attr, None)
+    if tag is not None:
+        setattr(_local, attr, tag)
+    try:
+        yield
+    finally:
+        setattr(_local, attr, previous)
+
+
+def caller_tag() -> str:
+    """
+    Etiqueta de la consulta en curso: la fijada con tagged() o, si no hay,
+    el nombre de la primera función fuera de los módulos de infraestructura
+    o, en un hilo de common.submit(), la de quien lanzó la tarea.
+    """
+    forced = getattr(_local, 'tag', None)
+    if forced:
+        return forced
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals.get('__name__') not in _SKIP_MODULES:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return getattr(_local, 'fallback', None) or '?'
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class QueryMetrics:
+    """
+    Registro en memoria de las sentencias ejecutadas.
+
+    :param window: muestras de latencia conservadas por etiqueta
+    :param recent: sentencias recientes conservadas (para "las más lentas")
+    :param reruns: conteos de reruns recientes conservados (todas las sesiones)
+    :param sessions: sesiones con conteo en curso conservadas (las menos
+                     recientes se olvidan)
+    :param session_idle: segundos sin reruns tras los que se olvida una
+                         sesión (pestaña cerrada o sesión vencida: Streamlit
+                         no avisa)
+    """
+
+    def __init__(self, window: int = 1000, recent: int = 500, reruns: int = 200,
+                 sessions: int = 1000, session_idle: float = 1800.0):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latency = defaultdict(lambda: deque(maxlen=self._window))
+        self._totals = defaultdict(lambda: {'count': 0, 'rows': 0, 'errors': 0})
+        self._recent = deque(maxlen=recent)
+        self._rerun_counts = deque(maxlen=reruns)
+        # session_id -> [consultas del rerun en curso, inicio del rerun],
+        # de la sesión con el rerun más antiguo a la más reciente
+        self._current_rerun = OrderedDict()
+        self._sessions = sessions
+        self._session_idle = session_idle
+
+    def record(self, tag: str, sql: str, seconds: float, rows: int = None,
+               query_id: str = None, error: str = None) -> None:
+        """Registra una sentencia ya terminada."""
+        ctx = get_script_run_ctx(suppress_warning=True)
+        entry = {
+            'ts': time.time(),
+            'tag': tag,
+            'ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'query_id': query_id,
+            'error': error,
+            'sql': ' '.join(sql.split())[:200],
+        }
+        with self._lock:
+            self._latency[tag].append(entry['ms'])
+            totals = self._totals[tag]
+            totals['count'] += 1
+            totals['rows'] += rows or 0
+            totals['errors'] += 1 if error else 0
+            self._recent.append(entry)
+            if ctx is not None and ctx.session_id in self._current_rerun:
+                self._current_rerun[ctx.session_id][0] += 1
+
+    def begin_rerun(self) -> None:
+        """
+        Marca el inicio de un rerun de la sesión actual; cierra el conteo
+        de consultas del rerun anterior.
+        """
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            previous = self._current_rerun.pop(ctx.session_id, None)
+            if previous is not None:
+                self._rerun_counts.append(previous[0])
+            self._current_rerun[ctx.session_id] = [0, now]
+            # Las sesiones que ya no vuelven (sólo end_session() las quita)
+            while self._current_rerun:
+                _, (_, started) = next(iter(self._current_rerun.items()))
+                if (len(self._current_rerun) <= self._sessions
+                        and now - started < self._session_idle):
+                    break
+                self._current_rerun.popitem(last=False)
+
+    def end_session(self) -> None:
+        """Olvida el conteo en curso de la sesión actual (p.ej. al salir)."""
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            with self._lock:
+                self._current_rerun.pop(ctx.session_id, None)
+
+    def summary(self) -> list[dict]:
+        """Percentiles de latencia (ms) y volumen por etiqueta."""
+        with self._lock:
+            snapshot = {t: sorted(v) for t, v in self._latency.items()}
+            totals = {t: dict(v) for t, v in self._totals.items()}
+        rows = []
+        for tag, values in snapshot.items():
+            t = totals[tag]
+            rows.append({
+                'tag': tag,
+                'count': t['count'],
+                'errors': t['errors'],
+                'p50_ms': _percentile(values, 0.50),
+                'p95_ms': _percentile(values, 0.95),
+                'p99_ms': _percentile(values, 0.99),
+                'max_ms': values[-1] if values else 0.0,
+                'avg_rows': round(t['rows'] / t['count'], 1) if t['count'] else 0,
+            })
+        return sorted(rows, key=lambda r: r['p95_ms'], reverse=True)
+
+    def slowest(self, n: int = 20) -> list[dict]:
+        """Las `n` sentencias recientes más lentas."""
+        with self._lock:
+            recent = list(self._recent)
+        return sorted(recent, key=lambda e: e['ms'], reverse=True)[:n]
+
+    def reruns(self) -> dict:
+        """Consultas por rerun: último, promedio, p95 y máximo."""
+        with self._lock:
+            counts = list(self._rerun_counts)
+        ordered = sorted(counts)
+        return {
+            'reruns': len(counts),
+            'last': counts[-1] if counts else 0,
+            'avg': round(sum(counts) / len(counts), 2) if counts else 0.0,
+            'p95': _percentile(ordered, 0.95),
+            'max': ordered[-1] if ordered else 0,
+        }
+
+    def reset(self) -> None:
+        """Descarta todas las muestras."""
+        with self._lock:
+            self._latency.clear()
+            self._totals.clear()
+            self._recent.clear()
+            self._rerun_counts.clear()
+
+
+class InstrumentedCursor:
+    """
+    Envoltorio de cursor que mide execute() + fetch*() de cada sentencia.
+    El resto de atributos se delega al cursor real.
+    """
+
+    _FETCHES = ('fetchall', 'fetchone', 'fetchmany',
+                'fetch_pandas_all', 'fetch_pandas_batches', 'fetch_arrow_all')
+
+    def __init__(self, cursor, metrics: QueryMetrics):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._pending = None
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        self._flush()
+        pending = {'tag': caller_tag(), 'sql': sql, 'seconds': 0.0, 'rows': None}
+        t0 = time.perf_counter()
+        try:
+            if params is None:
+                result = self._cursor.execute(sql, *args, **kwargs)
+            else:
+                result = self._cursor.execute(sql, params, *args, **kwargs)
+        except Exception as e:
+            pending['seconds'] = time.perf_counter() - t0
+            self._metrics.record(pending['tag'], sql, pending['seconds'],
+                                 query_id=self._query_id(), error=type(e).__name__)
+            raise
+        pending['seconds'] = time.perf_counter() - t0
+        self._pending = pending
+        return self if result is self._cursor else result
+
+    def executemany(self, sql, seq_of_params, *args, **kwargs):
+        self._flush()
+        t0 = time.perf_counter()
+        tag = caller_tag()
+        try:
+            result = self._cursor.executemany(sql, seq_of_params, *args, **kwargs)
+        except Exception as e:
+            self._metrics.record(tag, sql, time.perf_counter() - t0,
+                                 query_id=self._query_id(), error=type(e).__name__)
+            raise
+        self._metrics.record(tag, sql, time.perf_counter() - t0,
+                             rows=self._rowcount(), query_id=self._query_id())
+        return self if result is self._cursor else result
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in self._FETCHES and callable(attr):
+            return self._timed_fetch(attr)
+        return attr
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    # ------------------------------------------------------------------ #
+    def _timed_fetch(self, fetch):
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = fetch(*args, **kwargs)
+            if self._pending is not None:
+                self._pending['seconds'] += time.perf_counter() - t0
+                n = _row_count(result)
+                if n is not None:
+                    self._pending['rows'] = (self._pending['rows'] or 0) + n
+            return result
+        return wrapper
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        rows = pending['rows'] if pending['rows'] is not None else self._rowcount()
+        self._metrics.record(pending['tag'], pending['sql'], pending['seconds'],
+                             rows=rows, query_id=self._query_id())
+
+    def _rowcount(self):
+        n = getattr(self._cursor, 'rowcount', None)
+        return n if isinstance(n, int) and n >= 0 else None
+
+    def _query_id(self):
+        return getattr(self._cursor, 'sfqid', None)
+
+
+class InstrumentedConnection:
+    """Envoltorio de conexión cuyos cursores son InstrumentedCursor."""
+
+    def __init__(self, conn, metrics: QueryMetrics):
+        self._conn = conn
+        self._metrics = metrics
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, tuple):       # fetchone
+        return 1
+    try:
+        return len(result)              # fetchall/fetchmany/DataFrame/Table
+    except TypeError:
+        return None                     # generadores (fetch_pandas_batches)
@@ -0,0 +1,206 @@
+# app/paging.py
+"""
+Paginación por clave (keyset / seek) para los listados de los CRUD.
+
+En vez de LIMIT/OFFSET, cada página se pide a partir de la última fila
+vista: WHERE (orden, id) > (último orden, último id) ORDER BY orden, id
+LIMIT n. La base salta directo a esa posición por el índice, así que la
+página 10.000 cuesta lo mismo que la primera, y el id como desempate hace
+el orden estable aunque haya valores repetidos (p.ej. dos citas a la
+misma hora).
+
+Los cursores son opacos para la UI: base64 de [dirección, página, valores
+de la clave]. fetch_page() los devuelve en df.attrs['next_cursor'] y
+df.attrs['prev_cursor'] (None si no hay página en ese sentido), junto con
+el total de filas y el número de página (ver fetch_page).
+"""
+import base64
+import bisect
+import json
+from datetime import date, datetime
+
+import pandas as pd
+
+from cache import tables_in
+from common import run_query, get_query_cache
+
+NEXT = 'n'
+PREV = 'p'
+# Con filtro de búsqueda el total se cuenta hasta aquí ("más de 1.000"):
+# contar todas las coincidencias costaría más que la propia página
+COUNT_LIMIT = 1_000
+
+
+def _plain(value):
+    """Valor JSON de una clave (numpy -> Python, fechas -> texto)."""
+    if isinstance(value, datetime):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def encode_cursor(direction: str, values, page: int = None) -> str:
+    """
+    Cursor opaco que apunta después (NEXT) o antes (PREV) de `values`.
+
+    :param page: número de la página a la que lleva (para "página 3 de 412")
+    """
+    raw = json.dumps([direction, page, [_plain(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, int | None, list]:
+    """
+    :return: (dirección, número de página o None, valores de la clave)
+    :raises ValueError: si el cursor no es válido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, page, values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
+    if direction not in (NEXT, PREV) or not isinstance(values, list):
+        raise ValueError("Cursor de paginación inválido")
+    return direction, page, values
+
+
+def id_window(ids: list, cursor: str, limit: int) -> list:
+    """
+    IDs de la página pedida dentro de una lista ordenada de coincidencias
+    (search.SearchIndex.matching), para listados ordenados sólo por id
+    ascendente: la consulta lleva IN con estos IDs y no con todos. Trae el
+    doble de lo necesario por si alguno ya no está; fetch_page corta en
+    `limit`.
+    """
+    direction, _, values = decode_cursor(cursor) if cursor else (NEXT, 1, None)
+    span = 2 * int(limit) + 1
+    if values is None:
+        return ids[:span]
+    if direction == NEXT:
+        i = bisect.bisect_right(ids, values[-1])
+        return ids[i:i + span]
+    i = bisect.bisect_left(ids, values[-1])
+    return ids[max(0, i - span):i]
+
+
+def _seek(keys: list, values: list, op: str) -> tuple[str, list]:
+    """
+    Comparación lexicográfica (k1, k2) op (v1, v2) escrita sin tuplas
+    (Snowflake no las compara): k1 op v1 OR (k1 = v1 AND k2 op v2).
+    Va precedida de k1 op= v1, un rango simple sobre la primera clave: con
+    sólo el OR, SQLite recorre el índice entero en vez de saltar a v1.
+    """
+    terms, params = [], [values[0]]
+    for i, key in enumerate(keys):
+        parts = [f"{k} = %s" for k in keys[:i]] + [f"{key} {op} %s"]
+        terms.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    return f"{keys[0]} {op}= %s AND (" + " OR ".join(terms) + ")", params
+
+
+def _count_sql(count_from: str, where: list, estimate: bool) -> str:
+    """Subconsulta escalar con el total de filas (acotado si `estimate`)."""
+    cond = " WHERE " + " AND ".join(where) if where else ""
+    if estimate:
+        return f"(SELECT COUNT(*) FROM (SELECT 1 AS uno FROM {count_from}{cond} LIMIT {COUNT_LIMIT}) t)"
+    return f"(SELECT COUNT(*) FROM {count_from}{cond})"
+
+
+def fetch_page(select_sql: str,
+               where: list,
+               params: list,
+               order: list,
+               limit: int,
+               cursor: str = None,
+               descending: bool = False,
+               count_from: str = None,
+               estimate: bool = False,
+               total: int = None) -> pd.DataFrame:
+    """
+    Una página de `select_sql` ordenada por `order`, con el total de filas
+    en la misma sentencia.
+
+    :param select_sql: SELECT ... FROM ... JOIN ... (sin WHERE ni ORDER BY)
+    :param where: condiciones (filtros) que se unen con AND
+    :param params: parámetros de esas condiciones
+    :param order: [(expresión SQL, columna del resultado), ...]; la última
+                  debe ser única (el id)
+    :param cursor: cursor de una página anterior; None = primera página
+    :param descending: orden descendente (p.ej. citas más recientes primero)
+    :param count_from: tabla (con alias) sobre la que contar, sin los JOIN
+                       del listado; None = no contar
+    :param estimate: contar sólo hasta COUNT_LIMIT (búsquedas con filtro)
+    :param total: total ya conocido (p.ej. coincidencias del índice de
+                  búsqueda); no se cuenta en la base
+    :return: DataFrame con attrs next_cursor, prev_cursor, page, total,
+             total_exact y pages
+    """
+    direction, page, values = decode_cursor(cursor) if cursor else (NEXT, 1, None)
+    # Hacia atrás se recorre el orden inverso y luego se da la vuelta
+    reverse = direction == PREV
+    desc = descending != reverse
+    count_params = tuple(params)
+    page_where, params = list(where), list(params)
+    if values is not None:
+        cond, seek_params = _seek([expr for expr, _ in order], values, '<' if desc else '>')
+        page_where.append(cond)
+        params.extend(seek_params)
+
+    # El total no depende del cursor: se cuenta una vez y se guarda en la
+    # caché de consultas (se invalida con las escrituras en la tabla).
+    count_sql = None
+    if count_from and total is None:
+        count_sql = _count_sql(count_from, where, estimate)
+        qcache = get_query_cache()
+        count_key = qcache.key(count_sql, count_params)
+        total = qcache.get(count_key)
+        generation = qcache.generation
+        if total is None:
+            # Va como columna de la misma consulta: sin segundo viaje a la base
+            select_sql = f"SELECT {count_sql} AS total_rows, " + select_sql.lstrip()[len("SELECT"):].lstrip()
+            params = list(count_params) + params
+
+    sql = [select_sql]
+    if page_where:
+        sql.append("WHERE " + " AND ".join(page_where))
+    sql.append("ORDER BY " + ", ".join(f"{expr} {'DESC' if desc else 'ASC'}" for expr, _ in order))
+    # Una fila de más dice si hay otra página en este sentido
+    sql.append("LIMIT %s")
+    params.append(int(limit) + 1)
+    df = run_query("\n".join(sql), tuple(params))
+
+    if count_from and total is None:
+        counted = df.pop(df.columns[0])
+        if len(counted):
+            total = int(counted.iat[0])
+        elif values is None:
+            total = 0
+        if total is not None:
+            qcache.put(count_key, total, tables_in(count_sql), generation=generation)
+
+    more = len(df) > limit
+    df = df.iloc[:limit]
+    if reverse:
+        df = df.iloc[::-1]
+    df = df.reset_index(drop=True)
+
+    columns = [col for _, col in order]
+    prev_page, next_page = (page - 1, page + 1) if page else (None, None)
+    first = encode_cursor(PREV, df.loc[0, columns], prev_page) if len(df) else None
+    last = encode_cursor(NEXT, df.loc[len(df) - 1, columns], next_page) if len(df) else None
+    if reverse:
+        df.attrs['next_cursor'] = last
+        df.attrs['prev_cursor'] = first if more else None
+    else:
+        df.attrs['next_cursor'] = last if more else None
+        df.attrs['prev_cursor'] = first if values is not None else None
+
+    exact = total is not None and not (estimate and total >= COUNT_LIMIT)
+    df.attrs['page'] = page
+    df.attrs['total'] = total
+    df.attrs['total_exact'] = exact
+    df.attrs['pages'] = max(1, -(-total // int(limit))) if exact else None
+    return df
@@ -0,0 +1,205 @@
+# app/pool.py
+"""
+Pool de conexiones acotado y thread-safe.
+
+Cada checkout entrega una conexión de uso exclusivo, de modo que el
+commit()/rollback() de una sesión nunca afecta el trabajo de otra. Al
+devolverla (checkin) se hace rollback de cualquier transacción pendiente.
+Las conexiones ociosas por más de `idle_timeout` segundos se cierran.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones con checkout/checkin.
+
+    :param factory: callable sin argumentos que abre una conexión nueva
+    :param max_size: máximo de conexiones abiertas simultáneamente
+    :param min_size: conexiones ociosas que nunca se desalojan
+    :param idle_timeout: segundos de inactividad tras los cuales se cierra una conexión
+    :param checkout_timeout: segundos máximos de espera por una conexión libre
+    """
+
+    def __init__(self, factory, max_size: int = 10, min_size: int = 0,
+                 idle_timeout: float = 300.0, checkout_timeout: float = 30.0):
+        if max_size < 1:
+            raise ValueError("max_size debe ser al menos 1")
+        self._factory = factory
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        self._idle = []          # [(conexión, instante de devolución)], LIFO
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+        self._stats = {
+            'created': 0, 'closed': 0, 'evicted': 0, 'checkouts': 0,
+            'waits': 0, 'timeouts': 0, 'rollbacks': 0, 'discarded': 0,
+        }
+
+    # ------------------------------------------------------------------ #
+    def checkout(self, timeout: float = None):
+        """
+        Entrega una conexión exclusiva; abre una nueva si hay cupo o
+        espera a que otra sesión devuelva la suya.
+
+        :raises PoolTimeout: si no hay conexión libre tras `timeout` segundos
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("El pool de conexiones está cerrado")
+                self._evict_idle_locked()
+                while self._idle:
+                    conn, _ = self._idle.pop()
+                    if _is_closed(conn):
+                        self._stats['discarded'] += 1
+                        continue
+                    return self._hand_out_locked(conn)
+                if len(self._in_use) + self._opening < self.max_size:
+                    self._opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"Sin conexiones libres tras {timeout:.1f}s "
+                        f"(max_size={self.max_size})")
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+        # Abrimos fuera del lock: conectar puede tardar varios segundos.
+        try:
+            conn = self._factory()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._stats['created'] += 1
+            return self._hand_out_locked(conn)
+
+    def checkin(self, conn, discard: bool = False) -> None:
+        """
+        Devuelve una conexión al pool. Deshace cualquier transacción
+        pendiente para que la siguiente sesión reciba una conexión limpia.
+
+        :param discard: cierra la conexión en lugar de reutilizarla
+        """
+        if not discard:
+            try:
+                conn.rollback()
+                with self._cond:
+                    self._stats['rollbacks'] += 1
+            except Exception as e:
+                logger.warning(f"Rollback al devolver conexión falló, se descarta: {e}")
+                discard = True
+        with self._cond:
+            self._in_use.discard(id(conn))
+            if discard or self._closed or _is_closed(conn):
+                self._stats['discarded'] += 1
+                self._close_locked(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Context manager de checkout/checkin:
+
+            with pool.connection() as conn:
+                ...
+        """
+        conn = self.checkout(timeout)
+        broken = False
+        try:
+            yield conn
+        except BaseException:
+            broken = _is_closed(conn)
+            raise
+        finally:
+            self.checkin(conn, discard=broken)
+
+    # ------------------------------------------------------------------ #
+    def evict_idle(self) -> int:
+        """Cierra las conexiones ociosas vencidas. Devuelve cuántas cerró."""
+        with self._cond:
+            return self._evict_idle_locked()
+
+    def close(self) -> None:
+        """Cierra todas las conexiones ociosas y rechaza nuevos checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_locked(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Estado actual del pool y contadores acumulados."""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'in_use':   len(self._in_use),
+                'idle':     len(self._idle),
+                'opening':  self._opening,
+                **self._stats,
+            }
+
+    # ------------------------------------------------------------------ #
+    def _hand_out_locked(self, conn):
+        self._in_use.add(id(conn))
+        self._stats['checkouts'] += 1
+        return conn
+
+    def _evict_idle_locked(self) -> int:
+        if self.idle_timeout is None:
+            return 0
+        now = time.monotonic()
+        keep, evicted = [], 0
+        # _idle está ordenado de más antigua a más reciente
+        for i, (conn, since) in enumerate(self._idle):
+            spare = len(self._idle) - i - 1 + len(keep)
+            if now - since > self.idle_timeout and spare >= self.min_size:
+                self._close_locked(conn)
+                evicted += 1
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+        self._stats['evicted'] += evicted
+        return evicted
+
+    def _close_locked(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error al cerrar conexión del pool: {e}")
+        self._stats['closed'] += 1
+
+
+def _is_closed(conn) -> bool:
+    is_closed = getattr(conn, 'is_closed', None)
+    try:
+        return bool(is_closed()) if callable(is_closed) else False
+    except Exception:
+        return True
@@ -0,0 +1,254 @@
+# app/refdata.py
+"""
+Datos de referencia para los selectbox (veterinarios y sexos),
+compartidos por todas las sesiones del proceso. Los selectores de dueños
+y mascotas buscan en search.py.
+
+Cada dominio se guarda como dos arrays paralelos ordenados por ID
+(ids int64 y nombres) en vez de un DataFrame completo. Se mantiene al día
+de tres formas:
+
+  - incremental: trae sólo las filas con ID mayor que la marca de agua
+    (el mayor ID ya cargado), cada `refresh` segundos o cuando un CRUD
+    avisa con mark_stale() tras un alta
+  - write-through: los CRUD toman begin() antes de escribir y tras el
+    commit llaman a upsert()/remove(), así el cambio se ve en el siguiente
+    rerun sin consultar la base. Si entretanto se recargó el dominio (la
+    recarga pudo ver o no la escritura), upsert() lo descarta; si una
+    recarga que empezó antes termina después, queda vencida y la siguiente
+    lectura recarga
+  - recarga completa cada `full_reload` segundos, para cambios hechos por
+    otros procesos (las tablas no tienen columna de última modificación)
+
+El módulo no depende de Streamlit: recibe una función fetch(sql, params)
+que devuelve un DataFrame (common.get_refdata usa run_query).
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Domain:
+    """Origen de un dominio: vista/tabla, columna ID y columna a mostrar."""
+    table: str
+    key: str
+    label: str
+
+
+DOMAINS = {
+    'vets':     Domain('vw_veterinario_activo', 'vet_id', 'nombre'),
+    'sexos':    Domain('vet_sexo', 'sexo_id', 'descripcion'),
+}
+
+
+class _Entries:
+    """IDs ordenados y sus nombres; la marca de agua es el último ID."""
+
+    __slots__ = ('ids', 'names', 'loaded_at', 'checked_at', 'stale')
+
+    def __init__(self, ids: np.ndarray, names: np.ndarray, now: float):
+        self.ids = ids
+        self.names = names
+        self.loaded_at = now
+        self.checked_at = now
+        self.stale = False
+
+    @property
+    def watermark(self) -> int:
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+
+class RefData:
+    """
+    Almacén thread-safe de dominios id -> nombre.
+
+    :param fetch: función (sql, params) -> DataFrame con columnas (id, nombre)
+    :param refresh: segundos entre consultas incrementales
+    :param full_reload: segundos entre recargas completas
+    """
+
+    def __init__(self, fetch: Callable[[str, tuple], pd.DataFrame],
+                 refresh: float = 30.0, full_reload: float = 600.0):
+        self._fetch = fetch
+        self.refresh = refresh
+        self.full_reload = full_reload
+        self._lock = threading.Lock()
+        self._data = {}          # dominio -> _Entries
+        self._writes = {}        # dominio -> nº de write-through aplicados
+        self._stats = {'full_loads': 0, 'incremental': 0, 'rows_fetched': 0,
+                       'upserts': 0, 'removals': 0, 'discarded': 0}
+
+    # ------------------------------------------------------------------ #
+    # Lectura
+    def items(self, domain: str, limit: int = None) -> dict:
+        """
+        {id: nombre} del dominio en orden de ID, refrescándolo si toca.
+
+        :param limit: devolver sólo los primeros `limit` IDs
+        """
+        ids, names = self._snapshot(domain)
+        if limit is not None:
+            ids, names = ids[:limit], names[:limit]
+        return dict(zip(ids.tolist(), names.tolist()))
+
+    def name(self, domain: str, key: int) -> str | None:
+        """Nombre de un ID, o None si no está (inactivo o inexistente)."""
+        ids, names = self._snapshot(domain)
+        i = np.searchsorted(ids, key)
+        if i < len(ids) and ids[i] == key:
+            return names[i]
+        return None
+
+    # ------------------------------------------------------------------ #
+    # Avisos de los CRUD
+    def mark_stale(self, domain: str) -> None:
+        """Tras un alta: la siguiente lectura trae los IDs nuevos."""
+        with self._lock:
+            if domain in self._data:
+                self._data[domain].stale = True
+
+    def begin(self, domain: str) -> '_Entries | None':
+        """Antes de una escritura que terminará en upsert(): qué estaba cargado."""
+        with self._lock:
+            return self._data.get(domain)
+
+    def upsert(self, domain: str, key: int, name: str, since: '_Entries | None') -> None:
+        """
+        Tras editar una fila (ya con commit): cambia (o agrega) su nombre.
+
+        :param since: lo que devolvió begin() antes de la escritura; si
+                      entretanto hubo una recarga no se sabe si ya incluye
+                      el cambio: se descarta el dominio y se recarga
+        """
+        with self._lock:
+            # Aunque no haya nada que actualizar: una carga en curso lo ve (_load)
+            self._writes[domain] = self._writes.get(domain, 0) + 1
+            entries = self._data.get(domain)
+            if entries is None:
+                return
+            if entries is not since:
+                self._data.pop(domain)
+                self._stats['discarded'] += 1
+                logger.info(f"refdata {domain}: recargado durante una escritura, se descarta")
+                return
+            if key > entries.watermark:
+                # Aún no cargado: que lo traiga la consulta incremental
+                entries.stale = True
+                return
+            i = np.searchsorted(entries.ids, key)
+            if i < len(entries.ids) and entries.ids[i] == key:
+                entries.names[i] = name
+            else:
+                entries.ids = np.insert(entries.ids, i, key)
+                entries.names = np.insert(entries.names, i, name)
+            self._stats['upserts'] += 1
+
+    def remove(self, domain: str, key: int) -> None:
+        """Tras una baja lógica (ya con commit): quita el ID del dominio."""
+        with self._lock:
+            self._writes[domain] = self._writes.get(domain, 0) + 1
+            entries = self._data.get(domain)
+            if entries is None:
+                return
+            i = np.searchsorted(entries.ids, key)
+            if i < len(entries.ids) and entries.ids[i] == key:
+                entries.ids = np.delete(entries.ids, i)
+                entries.names = np.delete(entries.names, i)
+                self._stats['removals'] += 1
+
+    def clear(self) -> None:
+        """Descarta todo; la siguiente lectura recarga desde la base."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Filas por dominio, antigüedad y contadores de refresco."""
+        now = time.monotonic()
+        with self._lock:
+            domains = {
+                name: {'filas': len(e.ids), 'marca_de_agua': e.watermark,
+                       'cargado_hace_s': round(now - e.loaded_at, 1),
+                       'kb': round((e.ids.nbytes + sum(map(len, e.names))) / 1024, 1)}
+                for name, e in self._data.items()
+            }
+            return {**self._stats, 'dominios': domains}
+
+    # ------------------------------------------------------------------ #
+    def _snapshot(self, domain: str) -> tuple[np.ndarray, np.ndarray]:
+        """(ids, nombres) coherentes entre sí aunque otra sesión escriba."""
+        entries = self._ensure(domain)
+        with self._lock:
+            return entries.ids, entries.names
+
+    def _ensure(self, domain: str) -> _Entries:
+        spec = DOMAINS[domain]
+        now = time.monotonic()
+        with self._lock:
+            entries = self._data.get(domain)
+            if entries is not None:
+                if now - entries.loaded_at >= self.full_reload:
+                    entries = None
+                elif not entries.stale and now - entries.checked_at < self.refresh:
+                    return entries
+        if entries is None:
+            return self._load(domain, spec, now)
+        return self._load_since(domain, spec, entries, now)
+
+    def _query(self, spec: Domain, since: int = None) -> tuple[np.ndarray, np.ndarray]:
+        sql = f"SELECT {spec.key}, {spec.label} FROM {spec.table}"
+        params = None
+        if since is not None:
+            sql += f" WHERE {spec.key} > %s"
+            params = (since,)
+        df = self._fetch(sql + f" ORDER BY {spec.key}", params)
+        return (df.iloc[:, 0].to_numpy(dtype=np.int64),
+                df.iloc[:, 1].astype(str).to_numpy(dtype=object))
+
+    def _load(self, domain: str, spec: Domain, now: float) -> _Entries:
+        t0 = time.perf_counter()
+        with self._lock:
+            writes = self._writes.get(domain, 0)
+        ids, names = self._query(spec)
+        entries = _Entries(ids, names, now)
+        with self._lock:
+            if self._writes.get(domain, 0) != writes:
+                # Un write-through llegó durante la consulta y puede no estar
+                # en lo leído: sirve a quien lo pidió pero vence ya
+                entries.loaded_at = now - self.full_reload
+            self._data[domain] = entries
+            self._stats['full_loads'] += 1
+            self._stats['rows_fetched'] += len(ids)
+        logger.info(f"refdata {domain}: {len(ids)} filas en {time.perf_counter() - t0:.3f}s")
+        return entries
+
+    def _load_since(self, domain: str, spec: Domain, entries: _Entries, now: float) -> _Entries:
+        since = entries.watermark
+        ids, names = self._query(spec, since)
+        with self._lock:
+            current = self._data.get(domain) is entries
+            if current:
+                # Otra sesión pudo adelantarse con los mismos IDs
+                new = ids > entries.watermark
+                if new.any():
+                    entries.ids = np.concatenate([entries.ids, ids[new]])
+                    entries.names = np.concatenate([entries.names, names[new]])
+                entries.checked_at = now
+                entries.stale = False
+                self._stats['incremental'] += 1
+                self._stats['rows_fetched'] += len(ids)
+        if not current:
+            # clear() o upsert() lo descartaron mientras tanto: las filas
+            # nuevas solas no son el dominio, hace falta la carga completa
+            return self._load(domain, spec, now)
+        if len(ids):
+            logger.info(f"refdata {domain}: {len(ids)} filas nuevas desde id {since}")
+        return entries
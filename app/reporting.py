@@ -0,0 +1,285 @@
+# app/reporting.py
+"""
+Registro declarativo de reportes.
+
+Cada reporte se declara una vez con register(Report(...)): su SQL (o una
+función que lo calcula, p.ej. sobre los agregados de rollups.py), sus
+parámetros, las columnas que devuelve, el gráfico con que se muestra y su
+política de caché. La UI (main.py) pinta cualquier reporte registrado sin
+código propio: widgets para los parámetros, gráfico y tabla.
+
+Los resultados se guardan en la caché de consultas compartida por todas las
+sesiones (cache.QueryCache), con clave (reporte, parámetros): dos usuarios
+que piden el mismo mes comparten un único resultado. Cada entrada vence a
+los `ttl` segundos del reporte o cuando un CRUD escribe en alguna de sus
+`tables` (invalidate_tables).
+
+Los reportes con `schedule` (cron) además se guardan como instantáneas
+Parquet (snapshots.py) con sus parámetros por defecto. Mientras no toque la
+siguiente ejecución programada, run_report y el CSV leen la instantánea y
+no consultan la base; si la base falla, sirven la última que haya. Sección
+[snapshots] de los secrets:
+  enabled: false para consultar siempre la base (por defecto true)
+  dir:     carpeta de las instantáneas (o VETDB_SNAPSHOTS_DIR; por
+           defecto app/snapshots)
+  grace:   segundos que la instantánea sigue valiendo tras la hora de la
+           siguiente ejecución, mientras ésta termina (por defecto 120)
+  poll:    segundos entre revisiones del planificador (por defecto 30)
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+import streamlit as st
+
+import snapshots
+import timeseries
+from cache import tables_in
+from common import config, get_query_cache, get_snapshots, iter_csv, run_query
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+CHARTS = ('table', 'bar', 'line', 'metric')
+# Segundos que un resultado leído de una instantánea (o servido sin base)
+# queda en la caché de consultas antes de volver a mirar el disco
+SNAPSHOT_RECHECK = 30
+
+
+@dataclass(frozen=True)
+class Param:
+    """
+    Parámetro de un reporte.
+
+    :param kind: int, date o str (str con `options` = lista cerrada)
+    :param default: función sin argumentos con el valor por defecto (se
+                    evalúa en cada uso: "hoy", "este mes"...)
+    """
+    name: str
+    label: str
+    kind: type = int
+    default: Callable[[], Any] = None
+    min_value: Any = None
+    max_value: Any = None
+    options: dict = None     # valor -> texto a mostrar
+
+
+@dataclass(frozen=True)
+class Report:
+    """
+    Declaración de un reporte.
+
+    :param columns: columna del resultado -> etiqueta; fija el orden y las
+                    columnas que se devuelven (en minúsculas)
+    :param sql: SELECT con un %s por parámetro, en el orden de `params`
+    :param loader: alternativa a `sql`: loader(**parámetros) -> DataFrame
+    :param chart: 'table', 'bar', 'line' o 'metric'
+    :param x: columna del eje x (bar/line)
+    :param y: columna del valor (bar/line/metric)
+    :param ttl: segundos que vale un resultado en la caché compartida
+    :param tables: tablas cuyas escrituras invalidan el resultado; por
+                   defecto las que lee `sql`
+    :param daily: el resultado depende del día de hoy en la zona de la
+                  clínica (entra en la clave)
+    :param preview: filas a mostrar en la UI (None = todas)
+    :param csv: ofrecer el resultado completo como CSV (sólo con `sql`)
+    :param schedule: expresión cron para guardar instantáneas (ver snapshots.Cron)
+    """
+    key: str
+    title: str
+    columns: dict
+    sql: str = None
+    loader: Callable[..., pd.DataFrame] = None
+    params: tuple = ()
+    chart: str = 'table'
+    x: str = None
+    y: str = None
+    ttl: float = 300.0
+    tables: tuple = ()
+    daily: bool = False
+    preview: int = None
+    csv: bool = False
+    schedule: str = None
+
+    def depends_on(self) -> tuple:
+        """Tablas que invalidan el resultado."""
+        return tuple(self.tables) or tuple(sorted(tables_in(self.sql or '')))
+
+
+REPORTS: dict[str, Report] = {}
+
+
+def register(report: Report) -> Report:
+    """
+    Agrega un reporte al registro.
+
+    :raises ValueError: clave repetida o declaración incompleta
+    """
+    if report.key in REPORTS:
+        raise ValueError(f"Reporte ya registrado: {report.key}")
+    if (report.sql is None) == (report.loader is None):
+        raise ValueError(f"{report.key}: se declara sql o loader (uno de los dos)")
+    if report.chart not in CHARTS:
+        raise ValueError(f"{report.key}: gráfico no soportado: {report.chart}")
+    if report.csv and report.sql is None:
+        raise ValueError(f"{report.key}: el CSV completo requiere sql")
+    if report.schedule:
+        _cron(report.schedule)
+    REPORTS[report.key] = report
+    return report
+
+
+def defaults(key: str) -> dict:
+    """Valores por defecto de los parámetros del reporte."""
+    return {p.name: p.default() if p.default else None for p in REPORTS[key].params}
+
+
+def _values(report: Report, params: dict) -> dict:
+    """Parámetros completos (con defaults) en el orden declarado."""
+    params = dict(params or {})
+    unknown = set(params) - {p.name for p in report.params}
+    if unknown:
+        raise ValueError(f"{report.key}: parámetros desconocidos: {sorted(unknown)}")
+    return {p.name: params[p.name] if p.name in params else (p.default() if p.default else None)
+            for p in report.params}
+
+
+def run_report(key: str, params: dict = None, limit: int = None) -> pd.DataFrame:
+    """
+    Resultado de un reporte registrado, desde la caché compartida si otra
+    sesión ya lo pidió con los mismos parámetros, o desde su instantánea.
+
+    :param params: valores de los parámetros; los que falten toman su default
+    :param limit: máximo de filas (sólo reportes con sql); None = todas
+    :return: DataFrame con las columnas declaradas (no modificar: se comparte).
+             Si salió de una instantánea, attrs['snapshot'] tiene la hora en
+             que se tomó y attrs['offline'] indica que la base no respondió.
+    :raises ValueError: reporte o parámetros desconocidos
+    """
+    if key not in REPORTS:
+        raise ValueError(f"Reporte no registrado: {key}")
+    report = REPORTS[key]
+    values = _values(report, params)
+    qcache = get_query_cache()
+    # "Hoy" en la zona de la clínica, como las consultas del reporte
+    cache_key = ('report', key, tuple(values.items()), limit,
+                 timeseries.today()[0] if report.daily else None)
+    df = qcache.get(cache_key)
+    if df is not None:
+        return df
+
+    generation = qcache.generation
+    ttl, df = report.ttl, _snapshot(report, values, fresh=True)
+    if df is None:
+        try:
+            df = _compute(report, values, limit)
+        except ValueError:
+            raise
+        except Exception as e:
+            # Base caída o lenta: la última instantánea, aunque sea vieja
+            df = _snapshot(report, values, fresh=False)
+            if df is None:
+                raise
+            logger.warning(f"Reporte {key}: sin base ({e}); se sirve la instantánea "
+                           f"de {df.attrs['snapshot']:%Y-%m-%d %H:%M}")
+            df.attrs['offline'] = True
+    if 'snapshot' in df.attrs:
+        ttl = min(ttl, SNAPSHOT_RECHECK)
+        if limit is not None:
+            df = df.head(limit)
+    qcache.put(cache_key, df, report.depends_on(), ttl=ttl, generation=generation)
+    return df
+
+
+def _compute(report: Report, values: dict, limit: int = None) -> pd.DataFrame:
+    """Resultado del reporte consultando la base."""
+    if report.sql is not None:
+        sql, args = report.sql, tuple(values.values())
+        if limit is not None:
+            sql, args = sql + " LIMIT %s", args + (limit,)
+        df = run_query(sql, args, cache=False, tag=f"report:{report.key}")
+    else:
+        df = report.loader(**values)
+    return df.rename(columns=str.lower)[list(report.columns)]
+
+
+def export_csv_rows(key: str, params: dict = None) -> Iterator[bytes]:
+    """
+    Resultado completo de un reporte con csv=True, como CSV por fragmentos;
+    sale de la instantánea si está al día.
+    """
+    report = REPORTS[key]
+    if not report.csv:
+        raise ValueError(f"{key}: el reporte no ofrece CSV completo")
+    values = _values(report, params)
+    table = _snapshot_table(report, values, fresh=True)
+    if table is not None:
+        return snapshots.iter_csv(table[0])
+    return iter_csv(report.sql, tuple(values.values()))
+
+
+# ---------------------------------------------------------------------- #
+# Instantáneas
+@lru_cache(maxsize=None)
+def _cron(expr: str) -> snapshots.Cron:
+    return snapshots.Cron(expr)
+
+
+def _now() -> datetime:
+    """Hora actual con la zona de la clínica (las expresiones cron la usan)."""
+    clinic = timeseries.zones()[0]
+    return datetime.now(clinic) if clinic else datetime.now().astimezone()
+
+
+def _snapshots_enabled() -> bool:
+    return str(config('snapshots').get('enabled', True)).lower() not in ('false', '0')
+
+
+def _snapshot_table(report: Report, values: dict, fresh: bool):
+    """
+    (tabla Arrow, epoch) de la instantánea del reporte con esos parámetros.
+    Con fresh=True sólo si aún no pasó la ejecución programada siguiente
+    (más `grace`); None si no hay.
+    """
+    if not report.schedule or not _snapshots_enabled():
+        return None
+    store = get_snapshots()
+    taken = store.taken_at(report.key, values)
+    if taken is None:
+        return None
+    if fresh:
+        now = _now()
+        grace = timedelta(seconds=float(config('snapshots').get('grace', 120)))
+        if now >= _cron(report.schedule).next_after(
+                datetime.fromtimestamp(taken, now.tzinfo)) + grace:
+            return None
+    table = store.read(report.key, values)
+    return None if table is None else (table, taken)
+
+
+def _snapshot(report: Report, values: dict, fresh: bool) -> pd.DataFrame | None:
+    """Instantánea como DataFrame, con attrs['snapshot'] = momento en que se tomó."""
+    found = _snapshot_table(report, values, fresh)
+    if found is None:
+        return None
+    return snapshots.to_frame(*found, _now().tzinfo)
+
+
+@st.cache_resource
+def get_scheduler() -> snapshots.Scheduler:
+    """
+    Planificador de las instantáneas, uno por proceso. Toma los reportes
+    registrados al crearlo: llamar después de importar crud.reportes.
+    """
+    cfg = config('snapshots')
+    schedules = {key: _cron(r.schedule) for key, r in REPORTS.items()
+                 if r.schedule and _snapshots_enabled()}
+    return snapshots.Scheduler(
+        get_snapshots(), schedules,
+        params=lambda key: _values(REPORTS[key], None),
+        compute=lambda key, values: _compute(REPORTS[key], values),
+        clock=_now,
+        poll=float(cfg.get('poll', 30)),
+    )
@@ -0,0 +1,328 @@
+# app/rollups.py
+"""
+Agregados diarios para los reportes, compartidos por todas las sesiones
+del proceso:
+
+  - ingresos: monto y número de facturas por día de pago, servicio de la
+    cita y método de pago
+  - visitas: número de citas por día y veterinario
+
+Cada celda (día, dimensiones...) guarda sus medidas; un reporte de un mes
+o de varios años suma unas pocas miles de celdas en memoria en vez de
+recorrer vet_factura / vet_cita. Se mantienen al día como refdata.py:
+
+  - incremental: agrega sólo los hechos con ID mayor que la marca de agua,
+    cada `refresh` segundos o cuando un CRUD avisa con mark_stale() tras
+    un alta (la consulta agrupa en la base: vuelven celdas, no hechos)
+  - write-through: al editar o borrar, los CRUD toman begin() antes de
+    escribir, leen el hecho antes y después con read_facts() y tras el
+    commit llaman a add() con signo -1 / +1. Si mientras tanto se recargó
+    el agregado (la recarga pudo ver o no la escritura), add() lo descarta
+    y la siguiente lectura lo carga de nuevo
+  - recarga completa cada `full_reload` segundos, para cambios hechos por
+    otros procesos
+
+El módulo no depende de Streamlit: recibe una función fetch(sql, params)
+que devuelve un DataFrame (common.get_rollups usa run_query).
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Rollup:
+    """
+    Definición de un agregado.
+
+    :param dims: dimensiones además del día
+    :param measures: medidas que se suman; la última es el número de hechos
+    :param key: columna ID del hecho (marca de agua)
+    :param load_sql: SELECT día, dims..., medidas..., MAX(id) agrupado, con
+                     {where} para la carga incremental
+    :param facts_sql: SELECT id, día, dims..., medidas... de hechos sueltos
+                      (mismas columnas que una celda), con {cond}
+    """
+    dims: tuple
+    measures: tuple
+    key: str
+    load_sql: str
+    facts_sql: str
+
+
+ROLLUPS = {
+    'ingresos': Rollup(
+        dims=('servicio', 'metodo_pago'),
+        measures=('total', 'n'),
+        key='f.factura_id',
+        load_sql="""
+            SELECT TO_DATE(f.fecha_pago) AS dia, c.servicio, f.metodo_pago,
+                   SUM(f.monto) AS total, COUNT(*) AS n, MAX(f.factura_id) AS ultimo
+              FROM vet_factura f
+              JOIN vet_cita    c ON f.cita_id = c.cita_id
+             {where}
+             GROUP BY TO_DATE(f.fecha_pago), c.servicio, f.metodo_pago
+        """,
+        facts_sql="""
+            SELECT f.factura_id, TO_DATE(f.fecha_pago) AS dia, c.servicio, f.metodo_pago,
+                   f.monto AS total, 1 AS n
+              FROM vet_factura f
+              JOIN vet_cita    c ON f.cita_id = c.cita_id
+             WHERE {cond}
+        """),
+    'visitas': Rollup(
+        dims=('vet_id',),
+        measures=('n',),
+        key='c.cita_id',
+        load_sql="""
+            SELECT TO_DATE(c.fecha_hora) AS dia, c.vet_id,
+                   COUNT(*) AS n, MAX(c.cita_id) AS ultimo
+              FROM vet_cita c
+             {where}
+             GROUP BY TO_DATE(c.fecha_hora), c.vet_id
+        """,
+        facts_sql="""
+            SELECT c.cita_id, TO_DATE(c.fecha_hora) AS dia, c.vet_id, 1 AS n
+              FROM vet_cita c
+             WHERE {cond}
+        """),
+}
+
+
+def read_facts(cur, name: str, cond: str, params: tuple) -> list[tuple]:
+    """
+    Hechos de un agregado que cumplen `cond`, leídos con el cursor de la
+    transacción del CRUD (antes de borrar, o antes y después de editar).
+
+    :param cond: condición SQL sobre los alias del agregado (p.ej. "c.cita_id = %s")
+    :return: [(id, día, dims..., medidas...)] para Rollups.add()
+    """
+    cur.execute(ROLLUPS[name].facts_sql.format(cond=cond), params)
+    return cur.fetchall()
+
+
+def _day(value) -> date:
+    """Día de TO_DATE(): date en Snowflake, texto 'AAAA-MM-DD' en SQLite."""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class _Cells:
+    """Celdas (día, dims...) -> [medidas...] de un agregado."""
+
+    __slots__ = ('ndims', 'cells', 'watermark', 'frame', 'loaded_at', 'checked_at', 'stale')
+
+    def __init__(self, ndims: int, now: float):
+        self.ndims = ndims
+        self.cells = {}
+        self.watermark = 0
+        self.frame = None        # DataFrame ordenado por día; se arma al leer
+        self.loaded_at = now
+        self.checked_at = now
+        self.stale = False
+
+    def merge(self, rows, sign: int = 1) -> None:
+        """Suma filas (día, dims..., medidas...) con `sign`; quita las celdas sin hechos."""
+        for row in rows:
+            key = (_day(row[0]),) + tuple(row[1:1 + self.ndims])
+            values = [sign * float(v or 0) for v in row[1 + self.ndims:]]
+            cell = self.cells.get(key)
+            if cell is not None:
+                values = [a + b for a, b in zip(cell, values)]
+            if values[-1] > 0:
+                self.cells[key] = values
+            else:
+                self.cells.pop(key, None)
+        self.frame = None
+
+
+class Rollups:
+    """
+    Almacén thread-safe de los agregados de ROLLUPS.
+
+    :param fetch: función (sql, params) -> DataFrame
+    :param refresh: segundos entre consultas incrementales
+    :param full_reload: segundos entre recargas completas
+    """
+
+    def __init__(self, fetch: Callable[[str, tuple], pd.DataFrame],
+                 refresh: float = 30.0, full_reload: float = 600.0):
+        self._fetch = fetch
+        self.refresh = refresh
+        self.full_reload = full_reload
+        self._lock = threading.Lock()
+        # Una carga a la vez: dos incrementales con la misma marca de agua
+        # sumarían dos veces las mismas filas
+        self._load_lock = threading.Lock()
+        self._data = {}          # agregado -> _Cells
+        self._stats = {'full_loads': 0, 'incremental': 0, 'cells_fetched': 0,
+                       'facts_applied': 0, 'discarded': 0}
+
+    # ------------------------------------------------------------------ #
+    # Lectura
+    def query(self, name: str, start: date, end: date, by: tuple = ()) -> pd.DataFrame:
+        """
+        Medidas del agregado sumadas en [start, end).
+
+        :param by: columnas por las que agrupar ('dia' y/o dimensiones);
+                   () = una fila con los totales
+        :return: DataFrame con las columnas de `by` y las medidas
+        """
+        spec = ROLLUPS[name]
+        frame = self._frame(name)
+        dias = frame['dia'].to_numpy()
+        lo, hi = np.searchsorted(dias, [pd.Timestamp(start).to_datetime64(),
+                                        pd.Timestamp(end).to_datetime64()])
+        rows = frame.iloc[lo:hi]
+        measures = list(spec.measures)
+        if by:
+            return rows.groupby(list(by), dropna=False, sort=False)[measures].sum().reset_index()
+        return rows[measures].sum().to_frame().T
+
+    def warm(self, *names: str) -> None:
+        """Carga los agregados (p.ej. al iniciar sesión)."""
+        for name in names or ROLLUPS:
+            self._ensure(name)
+
+    # ------------------------------------------------------------------ #
+    # Avisos de los CRUD
+    def mark_stale(self, name: str) -> None:
+        """Tras un alta: la siguiente lectura agrega los hechos nuevos."""
+        with self._lock:
+            if name in self._data:
+                self._data[name].stale = True
+
+    def begin(self, name: str) -> tuple:
+        """
+        Antes de una escritura que terminará en add(): qué celdas estaban
+        cargadas y hasta qué ID. Tomarlo antes de leer los hechos.
+        """
+        with self._lock:
+            cells = self._data.get(name)
+            return cells, cells.watermark if cells is not None else 0
+
+    def add(self, name: str, facts: list[tuple], sign: int, since: tuple) -> None:
+        """
+        Tras editar o borrar (ya con commit): suma (sign=1) o resta
+        (sign=-1) hechos de read_facts().
+
+        :param since: lo que devolvió begin() antes de la escritura. Los
+                      hechos con ID hasta esa marca de agua se aplican; los
+                      posteriores aún no cargados los trae la consulta
+                      incremental. Si entretanto hubo una recarga completa,
+                      o una incremental que pudo leer esos hechos antes o
+                      después del commit, no se sabe si la escritura ya está
+                      incluida: se descarta el agregado y se recarga.
+        """
+        cells_then, watermark = since
+        with self._lock:
+            cells = self._data.get(name)
+            if cells is None:       # no cargado, o ya descartado
+                return
+            pending = [f for f in facts if f[0] > watermark]
+            if cells is not cells_then or (pending and cells.watermark > watermark):
+                self._data.pop(name, None)
+                self._stats['discarded'] += 1
+                logger.info(f"Agregado {name}: recargado durante una escritura, se descarta")
+                return
+            loaded = [f[1:] for f in facts if f[0] <= watermark]
+            if pending:
+                cells.stale = True
+            cells.merge(loaded, sign)
+            self._stats['facts_applied'] += len(loaded)
+
+    def clear(self) -> None:
+        """Descarta todo; la siguiente lectura recarga desde la base."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Celdas por agregado, antigüedad y contadores de refresco."""
+        now = time.monotonic()
+        with self._lock:
+            rollups = {
+                name: {'celdas': len(c.cells), 'marca_de_agua': c.watermark,
+                       'cargado_hace_s': round(now - c.loaded_at, 1)}
+                for name, c in self._data.items()
+            }
+            return {**self._stats, 'agregados': rollups}
+
+    # ------------------------------------------------------------------ #
+    def _frame(self, name: str) -> pd.DataFrame:
+        """Celdas como DataFrame ordenado por día (se rearma tras cada cambio)."""
+        cells = self._ensure(name)
+        with self._lock:
+            if cells.frame is None:
+                spec = ROLLUPS[name]
+                frame = pd.DataFrame.from_records(
+                    [key + tuple(values) for key, values in cells.cells.items()],
+                    columns=['dia', *spec.dims, *spec.measures])
+                frame['dia'] = pd.to_datetime(frame['dia'])
+                cells.frame = frame.sort_values('dia', ignore_index=True)
+            return cells.frame
+
+    def _ensure(self, name: str) -> _Cells:
+        spec = ROLLUPS[name]
+        with self._load_lock:
+            now = time.monotonic()
+            with self._lock:
+                cells = self._data.get(name)
+                if cells is not None:
+                    if now - cells.loaded_at >= self.full_reload:
+                        cells = None
+                    elif not cells.stale and now - cells.checked_at < self.refresh:
+                        return cells
+            if cells is None:
+                return self._load(name, spec, now)
+            return self._load_since(name, spec, cells, now)
+
+    def _query(self, spec: Rollup, since: int = None) -> tuple[list, int]:
+        """(filas día, dims..., medidas...) agrupadas y mayor ID leído."""
+        where, params = "", None
+        if since is not None:
+            where, params = f"WHERE {spec.key} > %s", (since,)
+        df = self._fetch(spec.load_sql.format(where=where), params)
+        last = int(df.iloc[:, -1].max()) if len(df) else 0
+        return list(df.iloc[:, :-1].itertuples(index=False, name=None)), last
+
+    def _load(self, name: str, spec: Rollup, now: float) -> _Cells:
+        t0 = time.perf_counter()
+        rows, last = self._query(spec)
+        cells = _Cells(len(spec.dims), now)
+        cells.merge(rows)
+        cells.watermark = last
+        with self._lock:
+            self._data[name] = cells
+            self._stats['full_loads'] += 1
+            self._stats['cells_fetched'] += len(rows)
+        logger.info(f"Agregado {name}: {len(cells.cells)} celdas en {time.perf_counter() - t0:.3f}s")
+        return cells
+
+    def _load_since(self, name: str, spec: Rollup, cells: _Cells, now: float) -> _Cells:
+        rows, last = self._query(spec, cells.watermark)
+        with self._lock:
+            current = self._data.get(name) is cells
+            if current:
+                cells.merge(rows)
+                cells.watermark = max(cells.watermark, last)
+                cells.checked_at = now
+                cells.stale = False
+                self._stats['incremental'] += 1
+                self._stats['cells_fetched'] += len(rows)
+        if not current:
+            # clear() o add() lo descartaron mientras tanto: las filas nuevas
+            # solas no alcanzan, hace falta la historia completa
+            return self._load(name, spec, now)
+        if rows:
+            logger.info(f"Agregado {name}: {len(rows)} celdas nuevas desde id {cells.watermark}")
+        return cells
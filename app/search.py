@@ -0,0 +1,497 @@
+# app/search.py
+"""
+Índice de búsqueda por trigramas para dueños y mascotas, en memoria y
+compartido por todas las sesiones del proceso.
+
+Un LIKE '%texto%' no puede usar índices: cada búsqueda recorre la tabla.
+Aquí cada fila se normaliza (minúsculas, sin tildes) y se parte en
+trigramas; para cada trigrama se guarda la lista ordenada de filas que lo
+contienen. Una búsqueda sólo toca las listas de los trigramas de la
+consulta:
+
+  - matching(): subcadena exacta (intersección de listas + verificación),
+    la usan los filtros de list_duenos / list_mascotas; mientras el índice
+    no está listo, sql_like() aplica el mismo criterio en SQL
+  - search(): coincidencia por prefijo, subcadena o aproximada (tolera
+    erratas) con resultados ordenados por relevancia, para los selectores
+
+Se indexan, por dueño: nombre, teléfono y documento; por mascota: nombre,
+especie y microchip.
+
+Las listas se guardan en formato CSR (trigramas ordenados + desplazamientos
++ filas int32) y se construyen vectorizadas con numpy. Las altas y
+ediciones posteriores van a un índice delta pequeño; las filas editadas o
+dadas de baja se marcan como muertas. Igual que refdata.RefData, las altas
+se traen por marca de agua (id > último id), los CRUD avisan con
+mark_stale()/upsert()/remove(), y el índice se reconstruye en segundo
+plano cada `full_reload` segundos o cuando el delta crece demasiado.
+"""
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+# Fracción mínima de trigramas de la consulta que debe compartir un
+# candidato en search() (cada errata cambia hasta 3 trigramas)
+MIN_SHARED = 0.3
+# Candidatos que se ordenan con detalle en search()
+RERANK = 200
+
+
+@dataclass(frozen=True)
+class Entity:
+    """Origen de una entidad: consulta (id + campos) y cómo mostrarla."""
+    sql: str
+    key: str
+    label: Callable[[tuple], str]
+
+
+ENTITIES = {
+    'duenos': Entity(
+        "SELECT dueno_id, nombre, telefono, documento_id FROM vw_dueno_activo",
+        'dueno_id',
+        lambda f: f"{f[0]} · {f[2]}"),
+    'mascotas': Entity(
+        "SELECT mascota_id, nombre, especie, microchip FROM vw_mascota_activa",
+        'mascota_id',
+        lambda f: f"{f[0]} ({f[1]})"),
+}
+
+
+# Marcas diacríticas que quedan sueltas tras la descomposición NFKD
+_ACCENTS = re.compile('[\u0300-\u036f]')
+# Espacios a colapsar (no toca los espacios simples, que son la mayoría)
+_SPACES = re.compile(r'\s{2,}|[^\S ]')
+
+
+def normalize(value) -> str:
+    """Minúsculas, sin tildes y con espacios simples."""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(value).lower())
+    return _SPACES.sub(' ', _ACCENTS.sub('', text)).strip()
+
+
+# Letras que normalize() pliega, para el mismo criterio en SQL (sql_like)
+_FOLD_FROM = 'áàâäãåéèêëíìîïóòôöõúùûüñçý'
+_FOLD_TO = ''.join(normalize(c) for c in _FOLD_FROM)
+
+
+def _document(fields) -> str:
+    """Texto indexado de una fila: campos normalizados; el espacio inicial marca inicio de palabra."""
+    return ' ' + ' '.join(t for t in map(normalize, fields) if t)
+
+
+def _documents(frame: pd.DataFrame) -> list:
+    """
+    _document() de todas las filas. En vez de normalizar valor por valor,
+    se normaliza un único texto con todas las filas (\\0 entre filas, \\x01
+    entre campos) y luego se parte.
+    """
+    text = None
+    for col in frame.columns:
+        values = frame[col].astype(str).where(frame[col].notna(), '')
+        text = values if text is None else text + '\x01' + values
+    big = unicodedata.normalize('NFKD', '\0'.join(text.tolist()).lower())
+    big = _SPACES.sub(' ', _ACCENTS.sub('', big)).strip()
+    # Espacios en los bordes de cada campo y fila, y campos vacíos fuera
+    for sep in ('\x01', '\0'):
+        big = big.replace(' ' + sep, sep).replace(sep + ' ', sep)
+    while '\x01\x01' in big:
+        big = big.replace('\x01\x01', '\x01')
+    big = big.replace('\0\x01', '\0').replace('\x01\0', '\0').strip('\x01')
+    return (' ' + big.replace('\x01', ' ').replace('\0', '\0 ')).split('\0')
+
+
+def _codes(text: str) -> np.ndarray:
+    """Trigramas de `text` como enteros (21 bits por carácter)."""
+    if len(text) < 3:
+        return np.empty(0, dtype=np.uint64)
+    chars = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    return np.unique((chars[:-2] << 42) | (chars[1:-1] << 21) | chars[2:])
+
+
+def _postings(docs: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Listas invertidas de todos los documentos, sin bucles por fila.
+
+    :return: (trigramas ordenados, desplazamientos, filas) en formato CSR:
+             las filas del trigrama codes[i] son rows[offsets[i]:offsets[i+1]]
+    """
+    if not docs:
+        return (np.empty(0, dtype=np.uint64), np.zeros(1, dtype=np.int64),
+                np.empty(0, dtype=np.int32))
+    # Todos los documentos en un solo array, separados por \0
+    joined = '\0'.join(docs) + '\0'
+    chars = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs)) + 1
+    row_of = np.repeat(np.arange(len(docs), dtype=np.int64), lengths)[:-2]
+    # Caracteres -> rango en el alfabeto de los documentos (respeta el orden)
+    present = np.bincount(chars)
+    alphabet = np.flatnonzero(present)
+    rank = np.cumsum(present > 0, dtype=np.int64)[chars] - 1
+    size = len(alphabet)
+    valid = (chars[:-2] != 0) & (chars[1:-1] != 0) & (chars[2:] != 0)
+    dense = ((rank[:-2] * size + rank[1:-1]) * size + rank[2:])[valid]
+    # Trigrama y fila en una sola clave: un np.sort ordena por trigrama y,
+    # dentro de cada uno, por fila (mucho más rápido que un argsort estable)
+    n = len(docs)
+    if size ** 3 * n < 2 ** 62:
+        keys = np.sort(dense * n + row_of[valid])
+        keys = keys[np.append(True, keys[1:] != keys[:-1])]
+        dense, rows = np.divmod(keys, n)
+    else:
+        order = np.lexsort((row_of[valid], dense))
+        dense, rows = dense[order], row_of[valid][order]
+        keep = np.append(True, (dense[1:] != dense[:-1]) | (rows[1:] != rows[:-1]))
+        dense, rows = dense[keep], rows[keep]
+    starts = np.flatnonzero(np.append(True, dense[1:] != dense[:-1]))
+    first = dense[starts]
+    c1, rest = np.divmod(first, size * size)
+    c2, c3 = np.divmod(rest, size)
+    chars64 = alphabet.astype(np.uint64)
+    codes = (chars64[c1] << np.uint64(42)) | (chars64[c2] << np.uint64(21)) | chars64[c3]
+    return codes, np.append(starts, len(rows)).astype(np.int64), rows.astype(np.int32)
+
+
+def sql_in(column: str, ids: list) -> tuple[str, list]:
+    """Condición `column IN (...)` para los IDs de matching() y sus parámetros."""
+    if not ids:
+        return "1 = 0", []
+    return f"{column} IN ({', '.join(['%s'] * len(ids))})", list(ids)
+
+
+def sql_like(columns: list, query: str) -> tuple[str, list]:
+    """
+    Condición LIKE '%query%' sobre `columns` con el criterio de matching()
+    (sin distinguir mayúsculas ni tildes), para cuando el índice no puede
+    responder: consulta de menos de 3 caracteres o índice aún sin construir.
+    """
+    term = f"%{normalize(query)}%"
+    conds = [f"TRANSLATE(LOWER({col}), '{_FOLD_FROM}', '{_FOLD_TO}') LIKE %s" for col in columns]
+    return "(" + " OR ".join(conds) + ")", [term] * len(columns)
+
+
+class _Index:
+    """Índice de una entidad: base CSR inmutable + delta de filas nuevas."""
+
+    def __init__(self, entity: Entity, frame: pd.DataFrame, now: float):
+        self.entity = entity
+        ids = frame.iloc[:, 0].to_numpy(dtype=np.int64)
+        fields = frame.iloc[:, 1:]
+        docs = _documents(fields) if len(frame) else []
+        self.codes, self.offsets, self.rows = _postings(docs)
+        self.base_ids = ids                  # ordenados: fila base de un id
+        self.ids = ids.tolist()              # fila -> id
+        self.docs = docs                     # fila -> texto normalizado
+        # Campos originales para el texto a mostrar: columnas de la base y
+        # tuplas de las filas del delta
+        self.columns = [fields[c].to_numpy(dtype=object) for c in fields.columns]
+        self.delta_fields = {}               # fila del delta -> campos
+        self.alive = np.ones(len(docs), dtype=bool)
+        self.base_rows = len(docs)
+        self.delta = {}                      # trigrama -> [filas nuevas]
+        self.delta_rows = {}                 # id -> fila nueva vigente
+        self.watermark = int(ids[-1]) if len(ids) else 0
+        self.loaded_at = now
+        self.checked_at = now
+        self.stale = False
+
+    def label(self, row: int) -> str:
+        if row < self.base_rows:
+            return self.entity.label(tuple(col[row] for col in self.columns))
+        return self.entity.label(self.delta_fields[row])
+
+    @property
+    def delta_size(self) -> int:
+        return len(self.docs) - self.base_rows
+
+    def add(self, key: int, fields: tuple) -> None:
+        """Agrega (o reemplaza) la fila de `key` en el delta."""
+        self.kill(key)
+        row = len(self.docs)
+        doc = _document(fields)
+        self.ids.append(key)
+        self.docs.append(doc)
+        self.delta_fields[row] = tuple(fields)
+        self.alive = np.append(self.alive, True)
+        for code in _codes(doc).tolist():
+            self.delta.setdefault(code, []).append(row)
+        self.delta_rows[key] = row
+        self.watermark = max(self.watermark, key)
+
+    def row_of(self, key: int) -> int | None:
+        """Fila vigente de `key`, o None si no está (o se dio de baja)."""
+        row = self.delta_rows.get(key)
+        if row is None:
+            i = np.searchsorted(self.base_ids, key)
+            if i < len(self.base_ids) and self.base_ids[i] == key and self.alive[i]:
+                row = int(i)
+        return row
+
+    def kill(self, key: int) -> None:
+        """Marca como muerta la fila vigente de `key`, si la hay."""
+        row = self.row_of(key)
+        self.delta_rows.pop(key, None)
+        if row is not None:
+            self.alive[row] = False
+
+    def lookup(self, code: int) -> np.ndarray:
+        """Filas (vivas o no) que contienen el trigrama, ordenadas."""
+        i = np.searchsorted(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            base = self.rows[self.offsets[i]:self.offsets[i + 1]]
+        else:
+            base = self.rows[:0]
+        extra = self.delta.get(code)
+        return np.concatenate([base, np.array(extra, dtype=np.int32)]) if extra else base
+
+    def matching(self, query: str) -> list:
+        """IDs cuyo texto contiene `query` (ya normalizada), ordenados."""
+        codes = _codes(query).tolist()
+        lists = sorted((self.lookup(c) for c in codes), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        rows = rows[self.alive[rows]]
+        if len(query) == 3:
+            # Un único trigrama: contenerlo es contener la consulta
+            return sorted(self.ids[r] for r in rows.tolist())
+        return sorted(self.ids[r] for r in rows.tolist() if query in self.docs[r])
+
+    def search(self, query: str, limit: int) -> list:
+        """[(id, texto, puntaje)] por relevancia: prefijo, subcadena, aproximada."""
+        codes = _codes(' ' + query).tolist()
+        if not codes:
+            return []
+        shared = np.bincount(np.concatenate([self.lookup(c) for c in codes]),
+                             minlength=len(self.docs))
+        shared[~self.alive] = 0
+        needed = max(1, int(np.ceil(len(codes) * MIN_SHARED)))
+        candidates = np.flatnonzero(shared >= needed)
+        if len(candidates) > RERANK:
+            top = np.argpartition(shared[candidates], -RERANK)[-RERANK:]
+            candidates = candidates[top]
+        ranked = []
+        for row in candidates.tolist():
+            doc = self.docs[row]
+            kind = 0 if (' ' + query) in doc else 1 if query in doc else 2
+            score = shared[row] / len(codes)
+            ranked.append((kind, -score, len(doc), row))
+        ranked.sort()
+        return [(self.ids[row], self.label(row), round(float(-neg), 3))
+                for _, neg, _, row in ranked[:limit]]
+
+
+class SearchIndex:
+    """
+    Índices de búsqueda por entidad, thread-safe.
+
+    :param fetch: función (sql, params) -> DataFrame (id + campos)
+    :param refresh: segundos entre consultas incrementales (id > marca de agua)
+    :param full_reload: segundos entre reconstrucciones completas
+    """
+
+    def __init__(self, fetch: Callable[[str, tuple], pd.DataFrame],
+                 refresh: float = 30.0, full_reload: float = 600.0):
+        self._fetch = fetch
+        self.refresh = refresh
+        self.full_reload = full_reload
+        self._lock = threading.Lock()
+        self._indexes = {}           # entidad -> _Index
+        self._building = set()       # entidades con reconstrucción en curso
+        self._versions = {}          # entidad -> nº de cambios (ver version())
+        self._stats = {'builds': 0, 'incremental': 0, 'searches': 0, 'fallbacks': 0}
+
+    # ------------------------------------------------------------------ #
+    # Consultas
+    def matching(self, entity: str, query: str) -> list | None:
+        """
+        IDs cuyo texto contiene `query` (sin distinguir mayúsculas ni
+        tildes), ordenados. Pueden ser muchos: el listado pide a la base
+        sólo los de la página (paging.id_window). None si el índice aún no
+        está listo o la consulta es muy corta para usar trigramas (< 3
+        caracteres): el llamador usa sql_like(), con el mismo criterio.
+        """
+        query = normalize(query)
+        if len(query) < 3:
+            return None
+        index = self._ensure(entity, wait=False)
+        if index is None:
+            with self._lock:
+                self._stats['fallbacks'] += 1
+            return None
+        with self._lock:
+            self._stats['searches'] += 1
+            return index.matching(query)
+
+    def search(self, entity: str, query: str, limit: int = 20) -> list:
+        """
+        Búsqueda para selectores: primero las filas con una palabra que
+        empieza por `query`, luego las que la contienen y por último las
+        parecidas (erratas), cada grupo por trigramas compartidos.
+
+        :return: [(id, texto a mostrar, puntaje 0..1)]; vacío si la
+                 consulta tiene menos de 2 caracteres
+        """
+        query = normalize(query)
+        if len(query) < 2:
+            return []
+        index = self._ensure(entity, wait=True)
+        if index is None:        # otra sesión lo está construyendo
+            return []
+        with self._lock:
+            self._stats['searches'] += 1
+            return index.search(query, limit)
+
+    def label(self, entity: str, key: int) -> str | None:
+        """Texto a mostrar de un ID (como en search()), o None si no está."""
+        index = self._ensure(entity, wait=True)
+        if index is None:
+            return None
+        with self._lock:
+            row = index.row_of(key)
+            return None if row is None else index.label(row)
+
+    def version(self, entity: str) -> int:
+        """
+        Cambia cada vez que cambia el contenido del índice de la entidad
+        (altas, ediciones, bajas, reconstrucciones): sirve de clave para
+        cachear resultados de search().
+        """
+        with self._lock:
+            return self._versions.get(entity, 0)
+
+    def warm(self, *entities: str) -> None:
+        """Construye ya los índices que falten (p.ej. durante el arranque)."""
+        for entity in entities:
+            self._ensure(entity, wait=True)
+
+    # ------------------------------------------------------------------ #
+    # Avisos de los CRUD
+    def mark_stale(self, entity: str) -> None:
+        """Tras un alta: la siguiente búsqueda trae los IDs nuevos."""
+        with self._lock:
+            if entity in self._indexes:
+                self._indexes[entity].stale = True
+
+    def upsert(self, entity: str, key: int, fields: tuple) -> None:
+        """Tras editar una fila: reindexa sus campos (en el orden de ENTITIES)."""
+        with self._lock:
+            index = self._indexes.get(entity)
+            if index is None:
+                return
+            if key > index.watermark:
+                index.stale = True
+                return
+            index.add(key, fields)
+            self._bump(entity)
+
+    def remove(self, entity: str, key: int) -> None:
+        """Tras una baja lógica."""
+        with self._lock:
+            index = self._indexes.get(entity)
+            if index is not None:
+                index.kill(key)
+                self._bump(entity)
+
+    def stats(self) -> dict:
+        """Filas, delta y antigüedad por entidad, y contadores."""
+        now = time.monotonic()
+        with self._lock:
+            entities = {
+                name: {'filas': int(ix.alive.sum()), 'trigramas': len(ix.codes),
+                       'delta': ix.delta_size, 'marca_de_agua': ix.watermark,
+                       'construido_hace_s': round(now - ix.loaded_at, 1),
+                       'mb': round((ix.codes.nbytes + ix.offsets.nbytes + ix.rows.nbytes
+                                    + sum(map(len, ix.docs))) / 2**20, 1)}
+                for name, ix in self._indexes.items()
+            }
+            return {**self._stats, 'entidades': entities,
+                    'reconstruyendo': sorted(self._building)}
+
+    # ------------------------------------------------------------------ #
+    def _ensure(self, entity: str, wait: bool) -> _Index | None:
+        """
+        Índice vigente de la entidad. Si no existe, lo construye (wait) o
+        lo encarga a un hilo y devuelve None. Si toca reconstruirlo, sigue
+        sirviendo el actual mientras un hilo arma el nuevo.
+        """
+        now = time.monotonic()
+        with self._lock:
+            index = self._indexes.get(entity)
+            rebuild = index is not None and (
+                now - index.loaded_at >= self.full_reload
+                or index.delta_size > max(1_000, index.base_rows // 20))
+            incremental = index is not None and (index.stale or now - index.checked_at >= self.refresh)
+            start = (index is None or rebuild) and entity not in self._building
+            if start:
+                self._building.add(entity)
+        if index is None:
+            if start and wait:
+                return self._build(entity)
+            if start:
+                threading.Thread(target=self._build, args=(entity,), daemon=True,
+                                 name=f"search-{entity}").start()
+            return None
+        if start:
+            threading.Thread(target=self._build, args=(entity,), daemon=True,
+                             name=f"search-{entity}").start()
+        if incremental:
+            self._load_since(entity, index)
+        return index
+
+    def _bump(self, entity: str) -> None:
+        # Con self._lock tomado
+        self._versions[entity] = self._versions.get(entity, 0) + 1
+
+    def _query(self, spec: Entity, since: int = None) -> pd.DataFrame:
+        sql, params = spec.sql, None
+        if since is not None:
+            sql += f" WHERE {spec.key} > %s"
+            params = (since,)
+        return self._fetch(sql + f" ORDER BY {spec.key}", params)
+
+    def _build(self, entity: str) -> _Index:
+        try:
+            t0 = time.perf_counter()
+            frame = self._query(ENTITIES[entity])
+            index = _Index(ENTITIES[entity], frame, time.monotonic())
+            with self._lock:
+                self._indexes[entity] = index
+                self._stats['builds'] += 1
+                self._bump(entity)
+            logger.info(f"Índice de búsqueda {entity}: {len(frame)} filas, "
+                        f"{len(index.codes)} trigramas en {time.perf_counter() - t0:.2f}s")
+            return index
+        except Exception as e:
+            logger.error(f"Error al construir el índice de búsqueda {entity}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._building.discard(entity)
+
+    def _load_since(self, entity: str, index: _Index) -> None:
+        frame = self._query(ENTITIES[entity], index.watermark)
+        frame = frame.astype(object).where(frame.notna(), None)
+        with self._lock:
+            for key, *fields in frame.itertuples(index=False, name=None):
+                if key > index.watermark:
+                    index.add(int(key), fields)
+                    self._bump(entity)
+            index.checked_at = time.monotonic()
+            index.stale = False
+            self._stats['incremental'] += 1
+        if len(frame):
+            logger.info(f"Índice de búsqueda {entity}: {len(frame)} filas nuevas")
@@ -0,0 +1,329 @@
+# app/snapshots.py
+"""
+Instantáneas de reportes en Parquet, en disco local.
+
+Un planificador (Scheduler) corre los reportes con `schedule` (expresión
+tipo cron) con sus parámetros por defecto y guarda el resultado en
+<dir>/<reporte>/<parámetros>.parquet. La UI y el CSV leen el archivo con
+memory map en vez de consultar la base: cualquier cantidad de usuarios
+cuesta una consulta por ejecución programada, y si la base no responde
+se sigue mostrando la última instantánea.
+
+Cada archivo se escribe aparte y se reemplaza con os.replace(): quien lo
+está leyendo conserva la versión anterior (mismo inodo) hasta terminar.
+
+Con varios procesos de Streamlit sobre el mismo directorio cada uno corre
+su planificador; el resultado es el mismo, sólo se repite la consulta.
+
+El módulo no depende de Streamlit (reporting.py arma el planificador).
+pyarrow se importa al leer o escribir la primera instantánea: no suma al
+arranque.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, tzinfo
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import pandas as pd
+
+from logging_config import logging
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------- #
+# Expresiones cron
+def _field(spec: str, lo: int, hi: int) -> frozenset:
+    """Valores de un campo cron: *, n, a-b, lista con comas y /paso."""
+    values = set()
+    for item in spec.split(','):
+        base, _, step = item.partition('/')
+        if base == '*':
+            start, end = lo, hi
+        elif '-' in base:
+            start, end = (int(v) for v in base.split('-', 1))
+        else:
+            start = end = int(base)
+            if step:
+                end = hi
+        step = int(step) if step else 1
+        if step < 1 or not lo <= start <= end <= hi:
+            raise ValueError(f"Campo cron fuera de rango [{lo}-{hi}]: {item}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class Cron:
+    """
+    Expresión cron de 5 campos: minuto hora día-del-mes mes día-de-la-semana
+    (0 o 7 = domingo). Como en cron, si se restringen el día del mes y el de
+    la semana basta con que se cumpla uno.
+
+        Cron("*/5 * * * *")      cada 5 minutos
+        Cron("0 7-19 * * 1-6")   a la hora en punto, de 7 a 19, lunes a sábado
+
+    :raises ValueError: expresión mal formada
+    """
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Expresión cron inválida (5 campos): {expr!r}")
+        try:
+            self.minutes = _field(parts[0], 0, 59)
+            self.hours = _field(parts[1], 0, 23)
+            self.days = _field(parts[2], 1, 31)
+            self.months = _field(parts[3], 1, 12)
+            self.weekdays = frozenset(d % 7 for d in _field(parts[4], 0, 7))
+        except ValueError as e:
+            raise ValueError(f"Expresión cron inválida {expr!r}: {e}") from None
+        self.expr = expr
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    def _day_ok(self, t: datetime) -> bool:
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, t: datetime) -> datetime:
+        """Primer minuto posterior a `t` que cumple la expresión (misma zona de `t`)."""
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"La expresión cron nunca se cumple: {self.expr!r}")
+
+    def __repr__(self) -> str:
+        return f"Cron({self.expr!r})"
+
+
+# ---------------------------------------------------------------------- #
+# Archivos
+class SnapshotStore:
+    """
+    Instantáneas en <directory>/<reporte>/<digest de parámetros>.parquet.
+
+    :param directory: carpeta local (se crea al escribir)
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, key: str, params: dict) -> str:
+        """Archivo de la instantánea del reporte con esos parámetros."""
+        text = json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(text.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, key, f"{digest}.parquet")
+
+    def taken_at(self, key: str, params: dict) -> float | None:
+        """Momento (epoch) en que se escribió la instantánea; None si no hay."""
+        try:
+            return os.stat(self.path(key, params)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def read(self, key: str, params: dict) -> 'pa.Table | None':
+        """Instantánea como tabla Arrow, leída con memory map; None si no hay."""
+        import pyarrow.parquet as pq
+        try:
+            return pq.read_table(self.path(key, params), memory_map=True)
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, params: dict, df: pd.DataFrame) -> int:
+        """
+        Guarda el resultado (reemplaza la instantánea anterior de una vez).
+
+        :return: tamaño del archivo en bytes
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        path = self.path(key, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'vetdb.report': key.encode(),
+            b'vetdb.params': json.dumps(params, sort_keys=True, default=str).encode(),
+        })
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return os.path.getsize(path)
+
+    def stats(self) -> list[dict]:
+        """Instantáneas en disco: reporte, parámetros, filas, tamaño y antigüedad."""
+        if not os.path.isdir(self.directory):
+            return []
+        import pyarrow.parquet as pq
+        now, files = time.time(), []
+        for folder in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if not entry.name.endswith('.parquet'):
+                    continue
+                meta = pq.read_metadata(entry.path)
+                info = entry.stat()
+                files.append({
+                    'reporte': folder.name,
+                    'parametros': (meta.metadata or {}).get(b'vetdb.params', b'').decode(),
+                    'filas': meta.num_rows,
+                    'bytes': info.st_size,
+                    'antiguedad_s': round(now - info.st_mtime, 1),
+                })
+        return files
+
+
+def to_frame(table: 'pa.Table', taken_at: float, zone: tzinfo = None) -> pd.DataFrame:
+    """DataFrame de una instantánea, con el momento en que se tomó en attrs['snapshot']."""
+    df = table.to_pandas()
+    df.attrs['snapshot'] = datetime.fromtimestamp(taken_at, zone)
+    return df
+
+
+def iter_csv(table: 'pa.Table', batch_size: int = 50_000) -> Iterator[bytes]:
+    """Instantánea como CSV (UTF-8) por fragmentos, con el formato de common.iter_csv."""
+    header = True
+    for batch in table.to_batches(max_chunksize=batch_size):
+        yield batch.to_pandas().to_csv(index=False, header=header).encode()
+        header = False
+    if header:
+        yield table.schema.empty_table().to_pandas().to_csv(index=False).encode()
+
+
+# ---------------------------------------------------------------------- #
+# Planificador
+class Scheduler:
+    """
+    Hilo que mantiene al día las instantáneas de los reportes programados.
+    Las ejecuciones son de a una: una única conexión ocupada a la vez.
+
+    :param store: dónde se guardan
+    :param schedules: reporte -> Cron
+    :param params: reporte -> parámetros con que se ejecuta (los por defecto,
+                   evaluados en cada ejecución: "este mes")
+    :param compute: (reporte, parámetros) -> DataFrame, siempre contra la base
+    :param clock: hora actual con zona (la de la clínica)
+    :param poll: segundos entre revisiones
+    """
+
+    def __init__(self, store: SnapshotStore, schedules: dict[str, Cron],
+                 params: Callable[[str], dict],
+                 compute: Callable[[str, dict], pd.DataFrame],
+                 clock: Callable[[], datetime], poll: float = 30.0):
+        self.store = store
+        self.schedules = schedules
+        self._params = params
+        self._compute = compute
+        self._clock = clock
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._jobs = {key: {'proxima': None, 'ultima': None, 'filas': None,
+                            'segundos': None, 'error': None}
+                      for key in schedules}
+        self._stats = {'runs': 0, 'errors': 0}
+
+    def start(self) -> None:
+        """Arranca el hilo (una sola vez)."""
+        with self._lock:
+            if self._thread is not None or not self.schedules:
+                return
+            self._thread = threading.Thread(target=self._loop, name='vetdb-snapshots',
+                                            daemon=True)
+            self._thread.start()
+        logger.info(f"Instantáneas programadas: "
+                    f"{ {k: c.expr for k, c in self.schedules.items()} }")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_due(self) -> int:
+        """Ejecuta los reportes a los que les toca; devuelve cuántos corrió."""
+        ran = 0
+        for key, cron in self.schedules.items():
+            now = self._clock()
+            with self._lock:
+                due = self._jobs[key]['proxima']
+            if due is None:
+                due = self._next_from_disk(key, cron, now)
+            if now >= due:
+                self.run(key)
+                ran += 1
+            else:
+                with self._lock:
+                    self._jobs[key]['proxima'] = due
+        return ran
+
+    def run(self, key: str) -> None:
+        """Ejecuta ya un reporte programado y guarda su instantánea."""
+        cron = self.schedules[key]
+        t0 = time.perf_counter()
+        job = {'error': None}
+        try:
+            params = self._params(key)
+            df = self._compute(key, params)
+            size = self.store.write(key, params, df)
+            job.update(filas=len(df), ultima=self._clock().isoformat(timespec='seconds'))
+            logger.info(f"Instantánea {key}: {len(df)} filas, {size} bytes "
+                        f"en {time.perf_counter() - t0:.3f}s")
+        except Exception as e:
+            # La instantánea anterior sigue sirviendo
+            job['error'] = str(e)
+            logger.error(f"Instantánea {key} falló: {e}")
+        job.update(segundos=round(time.perf_counter() - t0, 3),
+                   proxima=cron.next_after(self._clock()))
+        with self._lock:
+            self._jobs[key].update(job)
+            self._stats['runs'] += 1
+            self._stats['errors'] += job['error'] is not None
+
+    def stats(self) -> dict:
+        """Próxima y última ejecución, filas y error de cada reporte."""
+        with self._lock:
+            jobs = {key: {'cron': self.schedules[key].expr, **job,
+                          'proxima': job['proxima'] and job['proxima'].isoformat(timespec='seconds')}
+                    for key, job in self._jobs.items()}
+            return {**self._stats, 'activo': self._thread is not None, 'reportes': jobs}
+
+    # ------------------------------------------------------------------ #
+    def _next_from_disk(self, key: str, cron: Cron, now: datetime) -> datetime:
+        """Al arrancar: la instantánea en disco vale hasta la ejecución que le sigue."""
+        taken = self.store.taken_at(key, self._params(key))
+        if taken is None:
+            return now
+        return cron.next_after(datetime.fromtimestamp(taken, now.tzinfo))
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_due()
+            except Exception as e:
+                logger.error(f"Planificador de instantáneas: {e}")
+            if self._stop.wait(self.poll):
+                return
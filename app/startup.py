@@ -0,0 +1,111 @@
+# app/startup.py
+"""
+Tiempos de arranque del proceso: cuánto tarda cada import diferido y cuánto
+pasa hasta el primer pintado de la app.
+
+Streamlit re-ejecuta main.py en cada rerun, pero este módulo queda en
+sys.modules: lo que registra vale para todo el proceso. Sólo usa la
+biblioteca estándar para poder importarse antes que nada.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()
+_STARTED = time.time()
+_lock = threading.Lock()
+_imports = {}          # módulo -> segundos del primer import
+_first_paint = None    # segundos desde el primer script hasta el primer pintado
+_warm_up = {'started': False, 'seconds': None, 'error': None}
+
+
+def _process_start() -> float | None:
+    """Instante (epoch) en que arrancó el proceso, si el sistema lo expone (Linux)."""
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return btime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        return None
+
+
+@contextmanager
+def lazy_import(name: str):
+    """
+    Mide el primer import de `name` hecho dentro del bloque:
+
+        with lazy_import('crud.duenos'):
+            from crud.duenos import list_duenos
+
+    Si el módulo ya estaba cargado no registra nada.
+    """
+    if name in sys.modules:
+        yield
+        return
+    t0 = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - t0
+    with _lock:
+        _imports.setdefault(name, elapsed)
+    logger.info(f"import {name}: {elapsed * 1000:.0f} ms")
+
+
+def first_paint() -> None:
+    """Marca el final del primer rerun (la primera página ya se envió al navegador)."""
+    global _first_paint
+    with _lock:
+        if _first_paint is not None:
+            return
+        _first_paint = time.perf_counter() - _T0
+    boot = _process_start()
+    since_boot = f", {time.time() - boot:.2f}s desde el arranque del proceso" if boot else ""
+    logger.info(f"Primer pintado: {_first_paint:.2f}s desde el primer script{since_boot}")
+
+
+def warm_up(fn) -> None:
+    """
+    Ejecuta `fn` una sola vez por proceso en un hilo de fondo, p.ej. para
+    cargar dependencias y abrir la primera conexión mientras el usuario
+    escribe sus credenciales.
+    """
+    with _lock:
+        if _warm_up['started']:
+            return
+        _warm_up['started'] = True
+
+    def run():
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            _warm_up['error'] = str(e)
+            logger.warning(f"Calentamiento fallido: {e}")
+        _warm_up['seconds'] = round(time.perf_counter() - t0, 3)
+        logger.info(f"Calentamiento en segundo plano: {_warm_up['seconds']}s")
+
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
+
+
+def report() -> dict:
+    """Resumen de arranque para la página Diagnóstico."""
+    boot = _process_start()
+    with _lock:
+        imports = sorted(_imports.items(), key=lambda kv: kv[1], reverse=True)
+        first = _first_paint
+    return {
+        'proceso_iniciado': datetime.fromtimestamp(boot).isoformat(timespec='seconds') if boot else None,
+        'primer_script': datetime.fromtimestamp(_STARTED).isoformat(timespec='seconds'),
+        'arranque_a_primer_script_s': round(_STARTED - boot, 3) if boot else None,
+        'primer_pintado_s': round(first, 3) if first is not None else None,
+        'calentamiento': dict(_warm_up),
+        'imports_ms': {name: round(sec * 1000, 1) for name, sec in imports},
+    }
@@ -0,0 +1,194 @@
+# app/timeseries.py
+"""
+Consultas por rango de fechas para los reportes: [inicio, fin) en la zona
+horaria de la clínica, en totales o como serie por día, semana o mes.
+
+Los filtros se escriben como rango sobre la columna, sin envolverla en
+funciones (col >= %s AND col < %s): Snowflake descarta las micro-particiones
+fuera del rango y SQLite usa el índice. Con YEAR(col) = ... o
+TO_DATE(col) = ... habría que leer la tabla entera.
+
+Zonas horarias (sección [reports] de los secrets):
+  timezone:    zona de la clínica (IANA, p.ej. "America/Bogota"); los días,
+               semanas y meses de los reportes son los de esa zona. Sin
+               configurar, la hora local del servidor.
+  db_timezone: zona de las fechas guardadas en la base (TIMESTAMP sin zona);
+               por defecto la misma de la clínica.
+
+Con la misma zona, los totales salen de los agregados diarios de rollups.py.
+Si difieren, se agrupa por hora en la base (sólo el rango pedido) y las
+horas se reparten en los días de la clínica.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from common import config, get_rollups, run_query
+from rollups import ROLLUPS
+
+# Granularidad -> periodo de pandas (semanas de lunes a domingo)
+GRAINS = {'day': 'D', 'week': 'W-SUN', 'month': 'M'}
+
+
+@dataclass(frozen=True)
+class Measure:
+    """
+    Hechos que se pueden sumar por rango de fechas.
+
+    :param from_sql: FROM ... JOIN ... (sin WHERE)
+    :param column: columna de fecha/hora por la que se filtra
+    :param values: medida -> agregado SQL
+    :param dims: dimensión -> expresión SQL
+    :param rollup: agregado diario de rollups.py con las mismas medidas
+    """
+    from_sql: str
+    column: str
+    values: dict
+    dims: dict
+    rollup: str = None
+
+
+MEASURES = {
+    'ingresos': Measure(
+        from_sql="vet_factura f JOIN vet_cita c ON f.cita_id = c.cita_id",
+        column='f.fecha_pago',
+        values={'total': 'SUM(f.monto)', 'n': 'COUNT(*)'},
+        dims={'servicio': 'c.servicio', 'metodo_pago': 'f.metodo_pago'},
+        rollup='ingresos'),
+    'visitas': Measure(
+        from_sql="vet_cita c",
+        column='c.fecha_hora',
+        values={'n': 'COUNT(*)'},
+        dims={'vet_id': 'c.vet_id', 'servicio': 'c.servicio'},
+        rollup='visitas'),
+}
+
+
+def zones() -> tuple[ZoneInfo | None, ZoneInfo | None]:
+    """(zona de la clínica, zona de la base); None = hora local del servidor."""
+    cfg = config('reports')
+    clinic = ZoneInfo(cfg['timezone']) if cfg.get('timezone') else None
+    db = ZoneInfo(cfg['db_timezone']) if cfg.get('db_timezone') else clinic
+    return clinic, db
+
+
+def _same_zone(clinic, db) -> bool:
+    return clinic is None or db is None or clinic.key == db.key
+
+
+def today() -> tuple[date, date]:
+    """Rango [hoy, mañana) en la zona de la clínica."""
+    start = datetime.now(zones()[0]).date()
+    return start, start + timedelta(days=1)
+
+
+def month(year: int, month: int) -> tuple[date, date]:
+    """Rango [primer día del mes, primer día del mes siguiente)."""
+    start = date(year, month, 1)
+    return start, date(year + month // 12, month % 12 + 1, 1)
+
+
+def to_db(value: date) -> datetime:
+    """Fecha (medianoche) u hora de la clínica como TIMESTAMP de la base."""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    clinic, db = zones()
+    if _same_zone(clinic, db):
+        return value
+    return value.replace(tzinfo=clinic).astimezone(db).replace(tzinfo=None)
+
+
+def range_filter(column: str, start: date, end: date) -> tuple[str, list]:
+    """
+    Condición sargable column en [start, end) con las fechas de la clínica
+    pasadas a la zona de la base.
+
+    :return: (condición SQL, parámetros)
+    :raises ValueError: si el rango está vacío
+    """
+    if end <= start:
+        raise ValueError(f"Rango de fechas vacío: [{start}, {end})")
+    return f"{column} >= %s AND {column} < %s", [to_db(start), to_db(end)]
+
+
+def _rollup(name: str, by: tuple) -> str | None:
+    """Agregado diario que responde `name` por `by`, si las zonas coinciden."""
+    spec = MEASURES[name]
+    unknown = set(by) - set(spec.dims)
+    if unknown:
+        raise ValueError(f"Dimensiones no disponibles para {name}: {sorted(unknown)}")
+    if spec.rollup and _same_zone(*zones()) and set(by) <= set(ROLLUPS[spec.rollup].dims):
+        return spec.rollup
+    return None
+
+
+def _facts(name: str, start: date, end: date, by: tuple) -> pd.DataFrame:
+    """Medidas en [start, end) por día ('dia') y `by`, en días de la clínica."""
+    rollup = _rollup(name, by)
+    if rollup:
+        return get_rollups().query(rollup, start, end, by=('dia', *by))
+
+    # Por hora en la base: una fila por hora y dimensión, no por hecho
+    spec = MEASURES[name]
+    clinic, db = zones()
+    cond, params = range_filter(spec.column, start, end)
+    hour = f"DATE_TRUNC('hour', {spec.column})"
+    dims = [f"{spec.dims[d]} AS {d}" for d in by]
+    sql = (f"SELECT {', '.join([f'{hour} AS hora', *dims])}, "
+           + ", ".join(f"{agg} AS {m}" for m, agg in spec.values.items())
+           + f" FROM {spec.from_sql} WHERE {cond} GROUP BY "
+           + ", ".join([hour, *(spec.dims[d] for d in by)]))
+    df = run_query(sql, tuple(params)).rename(columns=str.lower)
+    hours = pd.to_datetime(df.pop('hora'))
+    if not _same_zone(clinic, db):
+        hours = (hours.dt.tz_localize(db, ambiguous=False, nonexistent='shift_forward')
+                      .dt.tz_convert(clinic).dt.tz_localize(None))
+    df.insert(0, 'dia', hours.dt.normalize())
+    return df
+
+
+def totals(name: str, start: date, end: date, by: tuple = ()) -> pd.DataFrame:
+    """
+    Medidas de `name` (ver MEASURES) sumadas en [start, end).
+
+    :param by: dimensiones por las que agrupar; () = una fila con los totales
+    :return: DataFrame con las columnas de `by` y las medidas
+    :raises ValueError: dimensión desconocida o rango vacío
+    """
+    if end <= start:
+        raise ValueError(f"Rango de fechas vacío: [{start}, {end})")
+    rollup = _rollup(name, by)
+    if rollup:
+        return get_rollups().query(rollup, start, end, by=by)
+    values = list(MEASURES[name].values)
+    df = _facts(name, start, end, by)
+    if by:
+        return df.groupby(list(by), dropna=False, sort=False)[values].sum().reset_index()
+    return df[values].sum().to_frame().T
+
+
+def series(name: str, start: date, end: date, grain: str = 'day', by: tuple = ()) -> pd.DataFrame:
+    """
+    Serie temporal de `name` en [start, end).
+
+    :param grain: 'day', 'week' o 'month'
+    :param by: dimensiones por las que separar la serie
+    :return: DataFrame con 'periodo' (inicio del día/semana/mes), las
+             columnas de `by` y las medidas. Sin `by` trae todos los
+             periodos del rango, con cero donde no hubo hechos.
+    :raises ValueError: granularidad o dimensión desconocida, rango vacío
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Granularidad no soportada: {grain}")
+    if end <= start:
+        raise ValueError(f"Rango de fechas vacío: [{start}, {end})")
+    values = list(MEASURES[name].values)
+    df = _facts(name, start, end, by)
+    df['periodo'] = pd.to_datetime(df['dia']).dt.to_period(GRAINS[grain]).dt.start_time
+    df = df.groupby(['periodo', *by], dropna=False)[values].sum().reset_index()
+    if not by:
+        periods = pd.period_range(start, end - timedelta(days=1), freq=GRAINS[grain]).start_time
+        df = df.set_index('periodo').reindex(periods, fill_value=0).rename_axis('periodo').reset_index()
+    return df
@@ -0,0 +1,308 @@
+# benchmarks/bench_crud.py
+"""
+Benchmark de los caminos calientes de CRUD y reportes sobre el backend local.
+
+Para cada tamaño (filas de vet_cita) siembra una base SQLite en
+benchmarks/data/, y mide:
+
+  - list_duenos / list_mascotas / list_citas / list_facturas con varios
+    tamaños de página, en el inicio, el medio y el final del listado (el
+    cursor de esa posición se calcula antes de medir; el parámetro
+    `offset` del resultado es la posición, para comparar con corridas
+    anteriores a la paginación por clave)
+  - los filtros de dueños/mascotas que resuelve el índice de trigramas y
+    search() (prefijo, con erratas, microchip)
+  - create_mascota y create_cita (validación e inserción en una sola sentencia)
+  - cada función de crud/reportes.py y crud/analisis.py (leen los
+    agregados diarios de rollups.py, cargados antes de medir) y una
+    consulta de ingresos de un año sobre esos agregados, total y como
+    serie semanal (timeseries.py)
+  - los reportes programados servidos desde su instantánea Parquet
+    (parámetro `instantanea`), después de medirlos en vivo
+
+La caché de consultas se vacía antes de cada llamada: se mide el viaje a la
+base, no la caché. Imprime p50/p95/p99, operaciones por segundo y pico de
+memoria, y guarda un JSON comparable entre corridas:
+
+    python benchmarks/bench_crud.py --sizes 10000 100000 --json antes.json
+    python benchmarks/bench_crud.py --sizes 10000 100000 --json despues.json --compare antes.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..', 'app')
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+
+
+def _seed(path: str, n_citas: int, seed: int = 42) -> None:
+    """Siembra la base con el generador de datos sintéticos (app/datagen.py)."""
+    sys.path.insert(0, APP_DIR)
+    from backends.sqlite_backend import SQLiteBackend
+    from datagen import DEMO_PASSWORD, generate
+    conn = SQLiteBackend({'path': path}).connect()
+    try:
+        # Historia hasta hoy: los reportes del día y del mes en curso deben
+        # tener datos (la base se reutiliza entre corridas; --reseed la rehace)
+        generate(conn, n_citas, seed=seed, end=date.today(), password=DEMO_PASSWORD)
+    finally:
+        conn.close()
+
+
+def _database(size: int, reseed: bool) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"vetdb_{size}.sqlite")
+    if reseed or not os.path.exists(path):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        t0 = time.perf_counter()
+        _seed(path, size)
+        print(f"  sembrada {os.path.basename(path)} en {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+# Clave de orden de cada listado, en el mismo orden que usa la paginación
+_KEY_SQL = {
+    'list_duenos':   "SELECT dueno_id FROM vw_dueno_activo ORDER BY dueno_id",
+    'list_mascotas': "SELECT mascota_id FROM vw_mascota_activa ORDER BY mascota_id",
+    'list_citas':    "SELECT fecha_hora, cita_id FROM vet_cita ORDER BY fecha_hora DESC, cita_id DESC",
+    'list_facturas': "SELECT fecha_pago, factura_id FROM vet_factura ORDER BY fecha_pago DESC, factura_id DESC",
+}
+
+
+def _cursor_at(name: str, position: int):
+    """Cursor de la página que empieza en `position` (None = primera)."""
+    import paging
+    from common import run_query
+    if position == 0:
+        return None
+    row = run_query(_KEY_SQL[name] + " LIMIT 1 OFFSET %s", (position - 1,), cache=False)
+    return paging.encode_cursor(paging.NEXT, row.iloc[0].tolist())
+
+
+def _cases(size: int) -> list:
+    """(nombre, parámetros, callable) de cada caso a medir."""
+    from crud.duenos import list_duenos
+    from crud.mascotas import list_mascotas, create_mascota
+    from crud.citas import list_citas, create_cita
+    from crud.facturas import list_facturas
+    from crud import reportes, analisis
+    import timeseries
+
+    from common import run_query, get_search_index, get_rollups
+
+    def count(table: str) -> int:
+        return int(run_query(f"SELECT COUNT(*) AS n FROM {table}", cache=False).iat[0, 0])
+
+    today = date.today()
+    cases = []
+    for name, fn, total in (('list_duenos', list_duenos, count('vw_dueno_activo')),
+                            ('list_mascotas', list_mascotas, count('vw_mascota_activa')),
+                            ('list_citas', list_citas, count('vet_cita')),
+                            ('list_facturas', list_facturas, count('vet_factura'))):
+        for limit in (5, 50, 100):
+            for offset in sorted({0, total // 2, max(total - limit, 0)}):
+                cursor = _cursor_at(name, offset)
+                cases.append((name, {'limit': limit, 'offset': offset},
+                              lambda fn=fn, l=limit, c=cursor: fn(limit=l, cursor=c)))
+        cases.append((name, {'limit': 50, 'offset': 0, 'filtro': 'ar'},
+                      lambda fn=fn: fn(limit=50, filtro='ar')))
+
+    # Filtros que resuelve el índice de trigramas (construido antes de medir)
+    index = get_search_index()
+    for entity in ('duenos', 'mascotas'):
+        index.search(entity, 'xx')
+    cases += [
+        ('list_duenos', {'limit': 50, 'offset': 0, 'filtro': 'gutierrez'},
+         lambda: list_duenos(limit=50, filtro='gutierrez')),
+        ('list_mascotas', {'limit': 50, 'offset': 0, 'filtro': 'kira'},
+         lambda: list_mascotas(limit=50, filtro='kira')),
+        ('search_duenos', {'q': 'lucia moreno'}, lambda: index.search('duenos', 'lucia moreno')),
+        ('search_duenos', {'q': 'lucai morneo'}, lambda: index.search('duenos', 'lucai morneo')),
+        ('search_mascotas', {'q': '98500000000'}, lambda: index.search('mascotas', '98500000000')),
+    ]
+
+    counter = iter(range(10**9))
+    cases.append(('create_mascota', {}, lambda: create_mascota(
+        1, 'Bench', 'Perro', 'Mestizo', 1, '2021-05-05', 12.0, 'negro',
+        f"BENCH-{time.time_ns()}-{next(counter)}")))
+    cases.append(('create_cita', {}, lambda: create_cita(
+        1, 1, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'Consulta', 'bench')))
+
+    # Agregados de los reportes (cargados antes de medir)
+    totals = get_rollups()
+    totals.warm()
+    year_ago = date(today.year - 1, today.month, 1)
+    cases += [
+        ('rollup_ingresos', {'meses': 12, 'by': 'servicio'},
+         lambda: totals.query('ingresos', year_ago, today, by=('servicio',))),
+        ('series_ingresos', {'meses': 12, 'grain': 'week'},
+         lambda: timeseries.series('ingresos', year_ago, today, 'week')),
+        ('reporte_atendidos_hoy', {}, reportes.reporte_atendidos_hoy),
+        ('reporte_ingresos_servicio_mes', {'year': today.year, 'month': today.month},
+         lambda: reportes.reporte_ingresos_servicio_mes(today.year, today.month)),
+        ('reporte_vacunas_pendientes', {}, reportes.reporte_vacunas_pendientes),
+        ('reporte_vacunas_pendientes', {'limit': 500},
+         lambda: reportes.reporte_vacunas_pendientes(500)),
+        ('csv_vacunas_pendientes', {}, lambda: sum(map(len, reportes.csv_vacunas_pendientes()))),
+        ('reporte_mascotas_hoy', {}, analisis.reporte_mascotas_hoy),
+        ('reporte_ingresos_mes', {'ano': today.year, 'mes': today.month},
+         lambda: analisis.reporte_ingresos_mes(today.year, today.month)),
+    ]
+    return cases
+
+
+def _snapshot_cases(size: int) -> list:
+    """Los mismos reportes servidos desde su instantánea Parquet (se mide después de los en vivo)."""
+    from crud import reportes
+    from reporting import get_scheduler
+
+    today = date.today()
+    scheduler = get_scheduler()
+    for key in ('ingresos_servicio_mes', 'vacunas_pendientes'):
+        scheduler.run(key)
+    return [
+        ('reporte_ingresos_servicio_mes', {'year': today.year, 'month': today.month,
+                                           'instantanea': True},
+         lambda: reportes.reporte_ingresos_servicio_mes(today.year, today.month)),
+        ('reporte_vacunas_pendientes', {'instantanea': True}, reportes.reporte_vacunas_pendientes),
+        ('csv_vacunas_pendientes', {'instantanea': True},
+         lambda: sum(map(len, reportes.csv_vacunas_pendientes()))),
+    ]
+
+
+def _measure(fn, iterations: int, warmup: int) -> dict:
+    from common import get_query_cache
+    qcache = get_query_cache()
+    for _ in range(warmup):
+        qcache.invalidate()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        qcache.invalidate()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    qcache.invalidate()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    samples.sort()
+    q = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        'iterations': iterations,
+        'p50_ms': round(q[49], 3),
+        'p95_ms': round(q[94], 3),
+        'p99_ms': round(q[98], 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'ops_per_sec': round(1000 / statistics.fmean(samples), 1),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _run_size(size: int, path: str, iterations: int, warmup: int) -> list:
+    # Cada tamaño usa su propia base: se recrea backend, pool y caché.
+    import common
+    os.environ['VETDB_SQLITE_PATH'] = path
+    # Instantáneas propias y vacías: los casos en vivo no deben leer las de otra corrida
+    os.environ['VETDB_SNAPSHOTS_DIR'] = path + '.snapshots'
+    shutil.rmtree(os.environ['VETDB_SNAPSHOTS_DIR'], ignore_errors=True)
+    import reporting
+    for resource in (common.get_executor, common.get_prefetch_executor, common.get_pool,
+                     common.get_backend, common.get_query_cache, common.get_refdata,
+                     common.get_search_index, common.get_rollups, common.get_snapshots,
+                     reporting.get_scheduler):
+        resource.clear()
+    results = []
+    for cases in (_cases, _snapshot_cases):
+        for name, params, fn in cases(size):
+            r = _measure(fn, iterations, warmup)
+            results.append({'case': name, 'size': size, 'params': params, **r})
+            shown = ', '.join(f"{k}={v}" for k, v in params.items())
+            print(f"  {name:<32}{shown:<34}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                  f"{r['p99_ms']:>9.2f}{r['ops_per_sec']:>10.1f}{r['peak_kb']:>10.1f}")
+    return results
+
+
+def _key(r: dict) -> tuple:
+    return (r['case'], r['size'], json.dumps(r['params'], sort_keys=True))
+
+
+def _compare(results: list, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)['results']}
+    print(f"\nComparación contra {baseline_path} (p50, negativo = mejora)")
+    for r in results:
+        old = baseline.get(_key(r))
+        if not old or not old['p50_ms']:
+            continue
+        delta = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        shown = ', '.join(f"{k}={v}" for k, v in r['params'].items())
+        print(f"  {r['case']:<32}{r['size']:>9}  {shown:<34}"
+              f"{old['p50_ms']:>9.2f} -> {r['p50_ms']:>9.2f}  {delta:+7.1f}%")
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BENCH_DIR, text=True).strip()
+    except Exception:
+        return 'desconocida'
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                    help='filas de vet_cita por base sembrada')
+    ap.add_argument('--iterations', type=int, default=30, help='mediciones por caso')
+    ap.add_argument('--warmup', type=int, default=3, help='llamadas previas sin medir')
+    ap.add_argument('--reseed', action='store_true', help='volver a sembrar aunque exista la base')
+    ap.add_argument('--json', help='guardar resultados en este archivo')
+    ap.add_argument('--compare', help='JSON de una corrida anterior para comparar')
+    args = ap.parse_args()
+
+    os.environ['VETDB_BACKEND'] = 'sqlite'
+    sys.path.insert(0, APP_DIR)
+    # Los INFO de los CRUD (una línea por alta) ensuciarían la tabla.
+    logging.disable(logging.INFO)
+
+    results = []
+    for size in args.sizes:
+        print(f"\n== {size:,} citas ==")
+        path = _database(size, args.reseed)
+        print(f"  {'caso':<32}{'parámetros':<34}{'p50':>9}{'p95':>9}{'p99':>9}{'ops/s':>10}{'pico KB':>10}")
+        results += _run_size(size, path, args.iterations, args.warmup)
+
+    if args.json:
+        meta = {
+            'revision': _git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'backend': 'sqlite',
+            'sizes': args.sizes,
+            'iterations': args.iterations,
+        }
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_fetch.py
+"""
+Compara los dos caminos para convertir un resultado en DataFrame:
+
+  - fetchall: tuplas de Python fila a fila + pd.DataFrame(rows, columns)
+  - arrow:    lotes Arrow convertidos por columnas (fetch_pandas_all)
+
+Modo sintético (por defecto, sin conexión): genera un resultado Arrow con
+la forma de list_citas y mide sólo la conversión del lado cliente, que es
+la parte que cambia entre ambos caminos.
+
+Modo en vivo (--live): ejecuta la consulta indicada contra Snowflake con
+las credenciales de .streamlit/secrets.toml.
+
+Cada medición corre en un proceso aparte para que el pico de memoria de
+una no contamine a la otra. El tiempo se mide sin tracemalloc (que frena
+mucho la creación de objetos) y la memoria en una corrida adicional.
+
+    python benchmarks/bench_fetch.py --rows 1000 100000 1000000
+    python benchmarks/bench_fetch.py --live --sql "SELECT * FROM vet_cita"
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import tracemalloc
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+
+def _synthetic_table(rows: int):
+    import numpy as np
+    import pyarrow as pa
+    rng = np.random.default_rng(42)
+    servicios = np.array(['Consulta', 'Vacunación', 'Cirugía', 'Baño', 'Control'])
+    base = np.datetime64('2024-01-01T08:00:00')
+    return pa.table({
+        'CITA_ID':            pa.array(np.arange(1, rows + 1, dtype=np.int64)),
+        'MASCOTA_ID':         pa.array(rng.integers(1, 50_000, rows)),
+        'MASCOTA_NOMBRE':     pa.array([f'Mascota {i % 9973}' for i in range(rows)]),
+        'VET_ID':             pa.array(rng.integers(1, 40, rows)),
+        'VETERINARIO_NOMBRE': pa.array([f'Vet {i % 40}' for i in range(rows)]),
+        'FECHA_HORA':         pa.array(base + rng.integers(0, 3e7, rows).astype('timedelta64[s]')),
+        'SERVICIO':           pa.array(servicios[rng.integers(0, len(servicios), rows)]),
+        'MOTIVO':             pa.array([None if i % 3 else 'Control anual' for i in range(rows)]),
+    })
+
+
+def _convert(table, path: str):
+    import pandas as pd
+    if path == 'arrow':
+        return table.to_pandas()
+    # El conector entrega cada fila como tupla de objetos Python
+    cols = table.column_names
+    rows = list(zip(*(col.to_pylist() for col in table.columns)))
+    return pd.DataFrame(rows, columns=cols)
+
+
+def _measure_synthetic(path: str, trace: bool, rows: int) -> dict:
+    import pyarrow as pa
+    table = _synthetic_table(rows)
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    df = _convert(table, path)
+    elapsed = time.perf_counter() - t0
+    py_peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+    arrow_peak = max(pool.max_memory() - arrow_before, 0)
+    return _result(path, len(df), elapsed, py_peak + arrow_peak)
+
+
+def _measure_live(path: str, trace: bool, sql: str) -> dict:
+    import pyarrow as pa
+    sys.path.insert(0, APP_DIR)
+    import pandas as pd
+    from common import create_connection, fetch_dataframe
+    conn = create_connection()
+    cur = conn.cursor()
+    try:
+        pool = pa.default_memory_pool()
+        arrow_before = pool.bytes_allocated()
+        if trace:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        if path == 'arrow':
+            df = fetch_dataframe(cur)
+        else:
+            cols = [c[0] for c in cur.description]
+            df = pd.DataFrame(cur.fetchall(), columns=cols)
+        elapsed = time.perf_counter() - t0
+        py_peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        tracemalloc.stop()
+        arrow_peak = max(pool.max_memory() - arrow_before, 0)
+    finally:
+        cur.close()
+        conn.close()
+    return _result(path, len(df), elapsed, py_peak + arrow_peak)
+
+
+def _result(path: str, rows: int, elapsed: float, peak: int) -> dict:
+    return {
+        'path': path,
+        'rows': rows,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(rows / elapsed) if elapsed else None,
+        'peak_mb': round(peak / 2**20, 1),
+    }
+
+
+def _in_subprocess(fn, *args) -> dict:
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(1) as p:
+        return p.apply(fn, args)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000],
+                    help='tamaños del resultado sintético')
+    ap.add_argument('--live', action='store_true', help='medir contra Snowflake')
+    ap.add_argument('--sql', default='SELECT * FROM vet_cita', help='consulta para --live')
+    ap.add_argument('--repeat', type=int, default=3, help='repeticiones por medición (se toma la mejor)')
+    ap.add_argument('--json', help='guardar resultados en este archivo')
+    args = ap.parse_args()
+
+    results = []
+    cases = [(args.sql,)] if args.live else [(n,) for n in args.rows]
+    fn = _measure_live if args.live else _measure_synthetic
+    for case in cases:
+        for path in ('fetchall', 'arrow'):
+            runs = [_in_subprocess(fn, path, False, *case) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['seconds'])
+            best['peak_mb'] = _in_subprocess(fn, path, True, *case)['peak_mb']
+            results.append(best)
+
+    print(f"{'camino':<10}{'filas':>12}{'seg':>10}{'filas/s':>14}{'pico MB':>10}")
+    for r in results:
+        print(f"{r['path']:<10}{r['rows']:>12,}{r['seconds']:>10.3f}"
+              f"{(r['rows_per_sec'] or 0):>14,}{r['peak_mb']:>10.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
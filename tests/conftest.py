@@ -0,0 +1,55 @@
+# tests/conftest.py
+"""
+Fixtures comunes: una base SQLite sembrada con datagen una vez por sesión
+y, para cada test, una copia propia con los recursos compartidos de common
+(pool, cachés, índices, agregados) recién creados.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path.insert(0, APP_DIR)
+os.environ['VETDB_BACKEND'] = 'sqlite'
+
+CITAS = 20_000
+SEED = 7
+
+
+def reset_resources() -> None:
+    """Descarta los recursos de st.cache_resource: el siguiente uso los crea de nuevo."""
+    import common
+    import reporting
+    for resource in (common.get_executor, common.get_prefetch_executor, common.get_pool,
+                     common.get_backend, common.get_metrics, common.get_query_cache,
+                     common.get_refdata, common.get_search_index, common.get_rollups,
+                     common.get_snapshots, reporting.get_scheduler):
+        resource.clear()
+
+
+@pytest.fixture(scope='session')
+def seeded(tmp_path_factory) -> str:
+    """Base sembrada (sólo lectura: los tests usan una copia, ver vetdb)."""
+    from backends.sqlite_backend import SQLiteBackend
+    from datagen import DEMO_PASSWORD, generate
+    path = str(tmp_path_factory.mktemp('seed') / 'vetdb.sqlite')
+    conn = SQLiteBackend({'path': path}).connect()
+    try:
+        generate(conn, CITAS, seed=SEED, password=DEMO_PASSWORD)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def vetdb(seeded, tmp_path, monkeypatch) -> str:
+    """Copia de la base sembrada para un test, con recursos nuevos."""
+    path = str(tmp_path / 'vetdb.sqlite')
+    shutil.copy(seeded, path)
+    monkeypatch.setenv('VETDB_SQLITE_PATH', path)
+    monkeypatch.setenv('VETDB_SNAPSHOTS_DIR', str(tmp_path / 'snapshots'))
+    reset_resources()
+    yield path
+    reset_resources()
@@ -0,0 +1,73 @@
+# tests/test_cache.py
+"""QueryCache: invalidación por tabla (y vista), guardia de generación y run_query."""
+from cache import QueryCache, tables_in
+from common import get_connection, get_query_cache, invalidate_tables, run_query, table_versions
+
+
+def test_invalidate_sólo_las_dependientes():
+    qc = QueryCache()
+    citas = qc.key("SELECT * FROM vet_cita WHERE cita_id = %s", (1,))
+    duenos = qc.key("SELECT * FROM vw_dueno_activo", None)
+    qc.put(citas, 'citas', tables_in("SELECT * FROM vet_cita"))
+    qc.put(duenos, 'duenos', tables_in("SELECT * FROM vw_dueno_activo"))
+
+    assert qc.invalidate('vet_cita') == 1
+    assert qc.get(citas) is None
+    assert qc.get(duenos) == 'duenos'
+
+    # La vista depende de su tabla base
+    assert qc.invalidate('VET_DUENO') == 1
+    assert qc.get(duenos) is None
+
+
+def test_invalidate_sin_tablas_vacía_todo():
+    qc = QueryCache()
+    for i in range(3):
+        qc.put(qc.key(f"SELECT {i} FROM vet_cita", None), i, {'vet_cita'})
+    before = qc.versions('vet_cita')
+    assert qc.invalidate() == 3
+    assert qc.stats()['size'] == 0
+    assert qc.versions('vet_cita') != before
+
+
+def test_put_con_generación_vieja_no_guarda():
+    qc = QueryCache()
+    key = qc.key("SELECT COUNT(*) FROM vet_cita", None)
+    generation = qc.generation
+    qc.invalidate('vet_factura')              # escritura durante la consulta
+    qc.put(key, 41, {'vet_cita'}, generation=generation)
+    assert qc.get(key) is None
+
+    qc.put(key, 42, {'vet_cita'}, generation=qc.generation)
+    assert qc.get(key) == 42
+
+
+def test_versions_cambian_con_invalidate():
+    qc = QueryCache()
+    before = qc.versions('vet_cita', 'vw_mascota_activa')
+    qc.invalidate('vet_mascota')
+    after = qc.versions('vet_cita', 'vw_mascota_activa')
+    assert after[:2] == before[:2]
+    assert after[2] == before[2] + 1
+
+
+def test_run_query_cachea_hasta_invalidar(vetdb):
+    sql = "SELECT COUNT(*) AS n FROM vet_veterinario WHERE is_active"
+    first = int(run_query(sql).iat[0, 0])
+    hits = get_query_cache().stats()['hits']
+    assert int(run_query(sql).iat[0, 0]) == first
+    assert get_query_cache().stats()['hits'] == hits + 1
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO vet_veterinario(nombre, especialidad) VALUES (%s, %s)",
+                    ('Dr. Nuevo', 'General'))
+        conn.commit()
+        cur.close()
+    # Sin invalidar, la caché todavía sirve el valor anterior
+    assert int(run_query(sql).iat[0, 0]) == first
+
+    version = table_versions('vw_veterinario_activo')
+    assert invalidate_tables('vet_veterinario') >= 1
+    assert table_versions('vw_veterinario_activo') != version
+    assert int(run_query(sql).iat[0, 0]) == first + 1
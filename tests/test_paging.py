@@ -0,0 +1,79 @@
+# tests/test_paging.py
+"""Paginación por clave: ida y vuelta con next/prev_cursor, también con empates."""
+import pytest
+
+import paging
+from common import get_connection, invalidate_tables, run_query
+from crud.citas import list_citas
+from crud.duenos import list_duenos
+
+TIE = '2030-01-01 10:00:00'
+
+
+def _forward(list_fn, limit: int, pages: int) -> list:
+    """Las primeras `pages` páginas siguiendo next_cursor."""
+    out = [list_fn(limit=limit)]
+    while len(out) < pages and out[-1].attrs['next_cursor']:
+        out.append(list_fn(limit=limit, cursor=out[-1].attrs['next_cursor']))
+    return out
+
+
+def _backward(list_fn, limit: int, last) -> list:
+    """Desde `last` hasta la primera página siguiendo prev_cursor."""
+    out = [last]
+    while out[-1].attrs['prev_cursor']:
+        out.append(list_fn(limit=limit, cursor=out[-1].attrs['prev_cursor']))
+    return out[::-1]
+
+
+def _ids(pages: list, column: str) -> list:
+    return [int(i) for df in pages for i in df[column]]
+
+
+def test_cursor_ida_y_vuelta():
+    cursor = paging.encode_cursor(paging.NEXT, ['2024-05-01 09:00:00', 17], page=3)
+    assert paging.decode_cursor(cursor) == (paging.NEXT, 3, ['2024-05-01 09:00:00', 17])
+
+
+@pytest.mark.parametrize('cursor', ['no-es-base64!', 'W10', paging.encode_cursor('X', [1])])
+def test_cursor_inválido(cursor):
+    with pytest.raises(ValueError):
+        paging.decode_cursor(cursor)
+
+
+def test_citas_con_fecha_repetida(vetdb):
+    # 8 citas a la misma hora encabezan el listado y caen en varias páginas de 3
+    ids = run_query("SELECT cita_id FROM vet_cita ORDER BY cita_id LIMIT 8 OFFSET 100",
+                    cache=False)['CITA_ID'].tolist()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany("UPDATE vet_cita SET fecha_hora = %s WHERE cita_id = %s",
+                        [(TIE, int(i)) for i in ids])
+        conn.commit()
+        cur.close()
+    invalidate_tables('vet_cita')
+
+    limit, pages = 3, 6
+    forward = _forward(list_citas, limit, pages)
+    expected = run_query("SELECT cita_id FROM vet_cita ORDER BY fecha_hora DESC, cita_id DESC "
+                         "LIMIT %s", (limit * pages,), cache=False)['CITA_ID'].tolist()
+    assert _ids(forward, 'CITA_ID') == expected
+    assert _ids(forward, 'CITA_ID')[:8] == sorted(ids, reverse=True)
+    assert [df.attrs['page'] for df in forward] == list(range(1, pages + 1))
+
+    backward = _backward(list_citas, limit, forward[-1])
+    assert [df['CITA_ID'].tolist() for df in backward] == [df['CITA_ID'].tolist() for df in forward]
+    assert backward[0].attrs['prev_cursor'] is None
+
+
+def test_duenos_ida_y_vuelta(vetdb):
+    limit = 50
+    forward = _forward(list_duenos, limit, pages=10_000)
+    expected = run_query("SELECT dueno_id FROM vw_dueno_activo ORDER BY dueno_id",
+                         cache=False)['DUENO_ID'].tolist()
+    assert _ids(forward, 'DUENO_ID') == expected
+    assert forward[-1].attrs['next_cursor'] is None
+    assert forward[0].attrs['total'] == len(expected)
+
+    backward = _backward(list_duenos, limit, forward[-1])
+    assert _ids(backward, 'DUENO_ID') == expected
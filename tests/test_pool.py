@@ -0,0 +1,74 @@
+# tests/test_pool.py
+"""ConnectionPool sobre el backend SQLite: límite de conexiones y checkin limpio."""
+import threading
+
+import pytest
+
+from backends.sqlite_backend import SQLiteBackend
+from pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(vetdb):
+    backend = SQLiteBackend({'path': vetdb})
+    pool = ConnectionPool(backend.connect, max_size=1, checkout_timeout=0.1)
+    yield pool
+    pool.close()
+
+
+def _count(conn, nombre: str) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM vet_veterinario WHERE nombre = %s", (nombre,))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+def test_checkout_agota_el_pool(pool):
+    conn = pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['in_use'] == 1
+
+    pool.checkin(conn)
+    again = pool.checkout()
+    assert again is conn                      # se reutiliza, no se abre otra
+    assert pool.stats()['created'] == 1
+    pool.checkin(again)
+
+
+def test_checkout_espera_a_un_checkin(pool):
+    conn = pool.checkout()
+    timer = threading.Timer(0.02, pool.checkin, (conn,))
+    timer.start()
+    try:
+        with pool.connection(timeout=5) as again:
+            assert again is conn
+    finally:
+        timer.join()
+    assert pool.stats()['waits'] == 1
+    assert pool.stats()['timeouts'] == 0
+
+
+def test_checkin_deshace_lo_no_confirmado(pool):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO vet_veterinario(nombre, especialidad) VALUES (%s, %s)",
+                    ('Dra. Sin Commit', 'General'))
+        cur.close()
+        assert _count(conn, 'Dra. Sin Commit') == 1
+    assert pool.stats()['rollbacks'] == 1
+
+    with pool.connection() as conn:
+        assert _count(conn, 'Dra. Sin Commit') == 0
+
+
+def test_error_en_el_bloque_devuelve_la_conexion(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("fallo del llamador")
+    assert pool.stats()['in_use'] == 0
+    with pool.connection() as conn:
+        assert _count(conn, 'nadie') == 0
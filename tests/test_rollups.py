@@ -0,0 +1,95 @@
+# tests/test_rollups.py
+"""Agregados en memoria frente a la base tras update_cita / delete_cita."""
+from datetime import date
+
+import pytest
+
+from common import get_rollups, run_query
+from crud.citas import delete_cita, update_cita
+
+DAY = date(2024, 2, 3)
+
+
+def _month(d: date) -> tuple[date, date]:
+    start = d.replace(day=1)
+    return start, (start.replace(year=start.year + 1, month=1) if start.month == 12
+                   else start.replace(month=start.month + 1))
+
+
+def _ingresos_sql(start: date, end: date) -> dict:
+    df = run_query("""
+        SELECT c.servicio, SUM(f.monto) AS total, COUNT(*) AS n
+          FROM vet_factura f
+          JOIN vet_cita    c ON f.cita_id = c.cita_id
+         WHERE TO_DATE(f.fecha_pago) >= %s AND TO_DATE(f.fecha_pago) < %s
+         GROUP BY c.servicio""", (start, end), cache=False)
+    return {s: (round(t, 2), int(n)) for s, t, n in df.itertuples(index=False)}
+
+
+def _ingresos_rollup(start: date, end: date) -> dict:
+    df = get_rollups().query('ingresos', start, end, by=('servicio',))
+    return {s: (round(t, 2), int(n)) for s, t, n in df[['servicio', 'total', 'n']].itertuples(index=False)
+            if n}
+
+
+def _visitas_sql(d: date) -> dict:
+    df = run_query("SELECT vet_id, COUNT(*) AS n FROM vet_cita WHERE TO_DATE(fecha_hora) = %s "
+                   "GROUP BY vet_id", (d,), cache=False)
+    return {int(v): int(n) for v, n in df.itertuples(index=False)}
+
+
+def _visitas_rollup(d: date) -> dict:
+    df = get_rollups().query('visitas', d, date.fromordinal(d.toordinal() + 1), by=('vet_id',))
+    return {int(v): int(n) for v, n in df[['vet_id', 'n']].itertuples(index=False) if n}
+
+
+def _cita(with_facturas: bool):
+    cond = "" if with_facturas else "NOT "
+    return run_query(f"""
+        SELECT c.cita_id, c.mascota_id, c.vet_id, c.fecha_hora, c.servicio, c.motivo
+          FROM vet_cita c
+         WHERE {cond}EXISTS (SELECT 1 FROM vet_factura f WHERE f.cita_id = c.cita_id)
+         ORDER BY c.cita_id DESC LIMIT 1""", cache=False).iloc[0]
+
+
+def test_update_cita_mueve_visitas_e_ingresos(vetdb):
+    get_rollups().warm()
+    cita = _cita(with_facturas=True)
+    old_day = date.fromisoformat(str(cita.FECHA_HORA)[:10])
+    pagos = run_query("SELECT fecha_pago FROM vet_factura WHERE cita_id = %s",
+                      (int(cita.CITA_ID),), cache=False)['FECHA_PAGO']
+    months = {_month(date.fromisoformat(str(p)[:10])) for p in pagos}
+    new_vet = 2 if int(cita.VET_ID) != 2 else 3
+
+    assert update_cita(int(cita.CITA_ID), int(cita.MASCOTA_ID), new_vet,
+                       f'{DAY} 10:00:00', 'Cirugía de prueba', cita.MOTIVO) == 1
+
+    for start, end in months:
+        ingresos = _ingresos_rollup(start, end)
+        assert ingresos == _ingresos_sql(start, end)
+        assert 'Cirugía de prueba' in ingresos
+    assert _visitas_rollup(DAY) == _visitas_sql(DAY)
+    assert _visitas_rollup(old_day) == _visitas_sql(old_day)
+
+
+def test_delete_cita_descuenta_la_visita(vetdb):
+    get_rollups().warm()
+    cita = _cita(with_facturas=False)
+    day = date.fromisoformat(str(cita.FECHA_HORA)[:10])
+    before = _visitas_rollup(day)
+
+    assert delete_cita(int(cita.CITA_ID)) == 1
+    after = _visitas_rollup(day)
+    assert after == _visitas_sql(day)
+    assert sum(after.values()) == sum(before.values()) - 1
+
+
+def test_delete_cita_con_facturas_no_toca_los_agregados(vetdb):
+    get_rollups().warm()
+    cita = _cita(with_facturas=True)
+    day = date.fromisoformat(str(cita.FECHA_HORA)[:10])
+    before = _visitas_rollup(day)
+
+    with pytest.raises(ValueError):
+        delete_cita(int(cita.CITA_ID))
+    assert _visitas_rollup(day) == before == _visitas_sql(day)
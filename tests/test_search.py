@@ -0,0 +1,75 @@
+# tests/test_search.py
+"""Filtros de list_duenos / list_mascotas: mismo resultado con el índice frío o listo."""
+import time
+
+import search
+from common import get_search_index, run_query
+from crud.duenos import list_duenos
+from crud.mascotas import list_mascotas
+
+
+def _wait_ready(entity: str) -> None:
+    deadline = time.monotonic() + 30
+    while get_search_index().matching(entity, 'xyz') is None:
+        assert time.monotonic() < deadline, f"el índice {entity} no terminó de construirse"
+        time.sleep(0.05)
+
+
+def _walk(list_fn, filtro: str, limit: int) -> tuple[list, int]:
+    """IDs de todas las páginas (siguiendo next_cursor) y el total de la primera."""
+    df = list_fn(limit=limit, filtro=filtro)
+    total, ids = df.attrs['total'], df.iloc[:, 0].tolist()
+    while df.attrs['next_cursor']:
+        df = list_fn(limit=limit, cursor=df.attrs['next_cursor'], filtro=filtro)
+        ids += df.iloc[:, 0].tolist()
+    return ids, total
+
+
+def _expected(sql: str, query: str) -> list:
+    """IDs cuyos campos contienen `query` normalizada, calculado en Python."""
+    df = run_query(sql, cache=False)
+    return sorted(int(row[0]) for row in df.itertuples(index=False)
+                  if any(search.normalize(query) in search.normalize(v) for v in row[1:]))
+
+
+def test_duenos_indice_frio_y_listo(vetdb):
+    cold = list_duenos(limit=500, filtro='garcia')
+    assert get_search_index().stats()['fallbacks'] >= 1     # respondió SQL
+    _wait_ready('duenos')
+    warm = list_duenos(limit=500, filtro='garcia')
+
+    expected = _expected("SELECT dueno_id, nombre, telefono, documento_id FROM vw_dueno_activo",
+                         'garcia')
+    assert expected
+    assert cold['DUENO_ID'].tolist() == warm['DUENO_ID'].tolist() == expected
+    assert cold.attrs['total'] == warm.attrs['total'] == len(expected)
+    assert all('García' in nombre for nombre in warm['NOMBRE'])
+
+
+def test_mascotas_indice_frio_y_listo(vetdb):
+    cold = list_mascotas(limit=500, filtro='HAMSTER')
+    _wait_ready('mascotas')
+    warm = list_mascotas(limit=500, filtro='HAMSTER')
+    assert len(cold) > 0
+    assert cold['MASCOTA_ID'].tolist() == warm['MASCOTA_ID'].tolist()
+    assert set(warm['ESPECIE']) == {'Hámster'}
+
+
+def test_paginas_de_coincidencias_iguales_a_sql(vetdb, monkeypatch):
+    _wait_ready('duenos')
+    warm_ids, warm_total = _walk(list_duenos, 'garcía', limit=7)
+
+    # Índice "sin construir": todas las páginas salen de sql_like()
+    monkeypatch.setattr(search.SearchIndex, 'matching', lambda self, entity, query: None)
+    cold_ids, cold_total = _walk(list_duenos, 'garcía', limit=7)
+
+    assert len(warm_ids) > 7 * 3
+    assert warm_ids == cold_ids == sorted(warm_ids)
+    assert warm_total == cold_total == len(warm_ids)
+
+
+def test_consulta_corta_sin_tildes(vetdb):
+    # Menos de 3 caracteres: siempre SQL, con el mismo criterio que el índice
+    df = list_duenos(limit=500, filtro='ál')
+    assert len(df) > 0
+    assert all('al' in search.normalize(nombre) for nombre in df['NOMBRE'])